@@ -0,0 +1,434 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+from urllib.parse import parse_qs
+
+from server import (execute_statements, prepare_statement, execute_prepared_statement,
+                    ndjson_stream, NDJSON_MIMETYPE, requested_page_size, fetch_cursor, close_cursor,
+                    open_session, close_session, session_manager, cursor_manager, DEFAULT_FETCH_ROWS,
+                    render_metrics, METRICS_CONTENT_TYPE, get_traces)
+from metrics import REGISTRY
+
+# 同时执行的请求数（工作线程数）、排队请求数上限和排队超时时间（秒）
+MAX_WORKERS = int(os.environ.get('SQL_MAX_WORKERS', min(32, (os.cpu_count() or 1) * 4)))
+MAX_QUEUE = int(os.environ.get('SQL_MAX_QUEUE', 256))
+QUEUE_TIMEOUT = float(os.environ.get('SQL_QUEUE_TIMEOUT', 30))
+
+# 请求体大小上限；流式响应每次发送的数据块大小
+MAX_BODY_SIZE = 16 * 1024 * 1024
+STREAM_CHUNK_SIZE = 64 * 1024
+
+TEMPLATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'templates', 'a.html')
+
+
+class ServerBusy(Exception):
+    """请求队列已满或排队超时"""
+    pass
+
+
+class WorkerPool:
+    """
+    有界工作线程池
+    最多 max_workers 个请求同时执行，最多 max_queue 个请求排队等待；
+    队列满时立即拒绝新请求（背压），排队超过 queue_timeout 秒的请求也会被拒绝，
+    这样大量并发客户端只占用固定数量的线程，排队时间也有上限
+    执行器的缓存、锁和事务状态都在进程内共享，因此使用线程池而不是进程池
+    """
+    def __init__(self, max_workers: int = MAX_WORKERS, max_queue: int = MAX_QUEUE,
+                 queue_timeout: float = QUEUE_TIMEOUT):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers, thread_name_prefix='sql-worker')
+        self._slots = asyncio.Semaphore(max_workers)
+        self._pending = 0   # 排队中和执行中的请求数（只在事件循环线程中修改）
+        # 统计信息
+        self.completed = 0
+        self.rejected = 0
+
+    @property
+    def running(self) -> int:
+        return self.max_workers - self._slots._value
+
+    @property
+    def queued(self) -> int:
+        return self._pending - self.running
+
+    @asynccontextmanager
+    async def _slot(self):
+        """排队获取一个工作线程名额"""
+        if self._pending >= self.max_workers + self.max_queue:
+            self.rejected += 1
+            raise ServerBusy("请求队列已满")
+        self._pending += 1
+        try:
+            try:
+                await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                self.rejected += 1
+                raise ServerBusy("排队等待超时")
+            try:
+                yield
+                self.completed += 1
+            finally:
+                self._slots.release()
+        finally:
+            self._pending -= 1
+
+    async def run(self, func: Callable, *args) -> Any:
+        """在工作线程中执行 func(*args)"""
+        async with self._slot():
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def stream(self, func: Callable[..., Iterator[Union[str, bytes]]], *args) -> AsyncIterator[bytes]:
+        """
+        在工作线程中迭代 func(*args) 返回的文本（或字节）迭代器，按块异步产生编码后的数据
+        整个流只占用一个工作线程名额；小结果一次取完，不需要额外切换线程；
+        客户端断开时在工作线程中关闭迭代器
+        """
+        async with self._slot():
+            loop = asyncio.get_running_loop()
+            iterator = func(*args)
+            finished = False
+            try:
+                while not finished:
+                    chunk, finished = await loop.run_in_executor(self._executor, _next_chunk, iterator)
+                    if chunk is not None:
+                        yield chunk
+            finally:
+                if not finished:
+                    await loop.run_in_executor(self._executor, iterator.close)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+            'running': self.running,
+            'queued': self.queued,
+            'completed': self.completed,
+            'rejected': self.rejected
+        }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+
+def _next_chunk(iterator: Iterator[Union[str, bytes]]) -> Tuple[Optional[bytes], bool]:
+    """
+    从迭代器中取出至少 STREAM_CHUNK_SIZE 字节（或剩余的全部）数据，
+    返回 (数据, 迭代器是否已结束)，没有数据时数据为None
+    """
+    parts = []
+    size = 0
+    for text in iterator:
+        data = text if isinstance(text, bytes) else text.encode('utf-8')
+        parts.append(data)
+        size += len(data)
+        if size >= STREAM_CHUNK_SIZE:
+            return b''.join(parts), False
+    return (b''.join(parts) if parts else None), True
+
+
+pool = WorkerPool()
+
+
+def _collect_pool_metrics() -> list:
+    stats = pool.stats()
+    return [
+        ('minidb_workers_running', 'gauge', '正在执行请求的工作线程数', stats['running']),
+        ('minidb_requests_queued', 'gauge', '排队等待的请求数', stats['queued']),
+        ('minidb_requests_completed_total', 'counter', '执行完成的请求数', stats['completed']),
+        ('minidb_requests_rejected_total', 'counter', '因队列已满或排队超时被拒绝的请求数', stats['rejected']),
+    ]
+
+
+REGISTRY.add_collector(_collect_pool_metrics)
+
+
+async def _read_body(receive) -> bytes:
+    """读取完整的请求体"""
+    body = b''
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            raise ConnectionError("客户端已断开")
+        body += message.get('body', b'')
+        if len(body) > MAX_BODY_SIZE:
+            raise ValueError("请求体过大")
+        if not message.get('more_body', False):
+            return body
+
+
+async def _send_response(send, status: int, body: bytes, content_type: str,
+                         extra_headers: Optional[List[Tuple[bytes, bytes]]] = None):
+    headers = [(b'content-type', content_type.encode('latin-1')),
+               (b'content-length', str(len(body)).encode('latin-1'))]
+    if extra_headers:
+        headers.extend(extra_headers)
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _send_json(send, status: int, payload: Any, extra_headers=None):
+    body = json.dumps(payload, ensure_ascii=False, default=str).encode('utf-8')
+    await _send_response(send, status, body, 'application/json; charset=utf-8', extra_headers)
+
+
+async def _send_stream(send, sql: str, session_id: Optional[str] = None,
+                       trace_level: Optional[str] = None):
+    """流式模式：以分块传输发送NDJSON事件，结果行边执行边发送"""
+    stream = pool.stream(ndjson_stream, sql, session_id, trace_level)
+    try:
+        first = await stream.__anext__()
+    except ServerBusy as e:
+        await _send_json(send, 503, {'success': False, 'result': f"服务器繁忙: {str(e)}"},
+                         [(b'retry-after', b'1')])
+        return
+    except StopAsyncIteration:
+        first = b''
+
+    await send({'type': 'http.response.start', 'status': 200,
+                'headers': [(b'content-type', NDJSON_MIMETYPE.encode('latin-1'))]})
+    try:
+        chunk = first
+        while True:
+            await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            try:
+                chunk = await stream.__anext__()
+            except StopAsyncIteration:
+                break
+    finally:
+        await stream.aclose()
+    await send({'type': 'http.response.body', 'body': b'', 'more_body': False})
+
+
+# POST 接口：路径 -> 从请求JSON得到 (处理函数, 参数)
+_POST_ROUTES: Dict[str, Callable[[Dict[str, Any]], Tuple[Callable, tuple]]] = {
+    '/execute': lambda data: (execute_statements, (data.get('sql', ''), requested_page_size(data),
+                                                   data.get('session'), data.get('trace'))),
+    '/prepare': lambda data: (prepare_statement, (data.get('sql', ''), data.get('session'))),
+    '/execute_prepared': lambda data: (execute_prepared_statement,
+                                       (data.get('statement_id', ''), data.get('params', []),
+                                        data.get('session'))),
+    '/close_cursor': lambda data: (close_cursor, (data.get('cursor', ''),)),
+    '/session': lambda data: (open_session, ()),
+    '/close_session': lambda data: (close_session, (data.get('session', ''),)),
+}
+
+
+async def _run_and_send(send, func: Callable, *args):
+    """在线程池中执行请求并返回JSON；队列已满时返回503"""
+    try:
+        payload = await pool.run(func, *args)
+    except ServerBusy as e:
+        await _send_json(send, 503, {'success': False, 'result': f"服务器繁忙: {str(e)}"},
+                         [(b'retry-after', b'1')])
+        return
+    await _send_json(send, 200, payload)
+
+
+async def app(scope, receive, send):
+    """ASGI应用，接口与Flask服务器相同；解析和执行在有界线程池中进行，不阻塞事件循环"""
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await asyncio.get_running_loop().run_in_executor(None, pool.shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+    if scope['type'] != 'http':
+        return
+
+    method, path = scope['method'], scope['path']
+
+    if method == 'GET' and path == '/':
+        with open(TEMPLATE_FILE, 'rb') as f:
+            await _send_response(send, 200, f.read(), 'text/html; charset=utf-8')
+        return
+    if method == 'GET' and path == '/status':
+        await _send_json(send, 200, dict(pool.stats(), sessions=session_manager.stats(),
+                                         cursors=cursor_manager.stats()))
+        return
+    if method == 'GET' and path == '/metrics':
+        # 只读取计数器，直接在事件循环中生成，队列已满时也能抓取
+        await _send_response(send, 200, render_metrics().encode('utf-8'), METRICS_CONTENT_TYPE)
+        return
+    if method == 'GET' and path == '/traces':
+        # /traces?limit=20 最近的跟踪概要，/traces?id=<跟踪ID> 一个跟踪的所有事件
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        try:
+            limit = int(query.get('limit', [20])[0])
+        except ValueError:
+            await _send_json(send, 400, {'success': False, 'result': "参数 limit 必须是整数"})
+            return
+        await _send_json(send, 200, get_traces(query.get('id', [''])[0], limit))
+        return
+    if method == 'GET' and path == '/fetch':
+        # 游标翻页：/fetch?cursor=...&n=500
+        query = parse_qs(scope.get('query_string', b'').decode('latin-1'))
+        try:
+            n = int(query.get('n', [DEFAULT_FETCH_ROWS])[0])
+        except ValueError:
+            await _send_json(send, 400, {'success': False, 'result': "参数 n 必须是整数"})
+            return
+        await _run_and_send(send, fetch_cursor, query.get('cursor', [''])[0], n)
+        return
+
+    route = _POST_ROUTES.get(path)
+    if route is None:
+        await _send_json(send, 404, {'success': False, 'result': f"路径 {path} 不存在"})
+        return
+    if method != 'POST':
+        await _send_json(send, 405, {'success': False, 'result': f"不支持的请求方法: {method}"})
+        return
+
+    try:
+        data = json.loads(await _read_body(receive) or b'{}')
+        if not isinstance(data, dict):
+            raise ValueError("请求体必须是JSON对象")
+    except ConnectionError:
+        return
+    except ValueError as e:
+        await _send_json(send, 400, {'success': False, 'result': f"请求格式错误: {str(e)}"})
+        return
+
+    if path == '/execute' and data.get('stream'):
+        await _send_stream(send, data.get('sql', ''), data.get('session'), data.get('trace'))
+        return
+
+    try:
+        func, args = route(data)
+    except (TypeError, ValueError) as e:
+        await _send_json(send, 400, {'success': False, 'result': f"请求格式错误: {str(e)}"})
+        return
+    await _run_and_send(send, func, *args)
+
+
+# ---------------------------------------------------------------------------
+# 无第三方依赖的HTTP/1.1服务器：没有安装 uvicorn 等ASGI服务器时使用
+# ---------------------------------------------------------------------------
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+            413: 'Payload Too Large', 500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """处理一个连接上的请求（支持 keep-alive），并转换为ASGI调用"""
+    try:
+        while True:
+            request_line = await reader.readline()
+            if not request_line:
+                return
+            try:
+                method, target, version = request_line.decode('latin-1').split()
+            except ValueError:
+                return
+
+            headers = []
+            content_length = 0
+            keep_alive = version == 'HTTP/1.1'
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                name, value = name.strip().lower(), value.strip()
+                headers.append((name.encode('latin-1'), value.encode('latin-1')))
+                if name == 'content-length':
+                    content_length = int(value)
+                elif name == 'connection':
+                    keep_alive = value.lower() == 'keep-alive' or (keep_alive and value.lower() != 'close')
+
+            if content_length > MAX_BODY_SIZE:
+                writer.write(b'HTTP/1.1 413 Payload Too Large\r\ncontent-length: 0\r\nconnection: close\r\n\r\n')
+                await writer.drain()
+                return
+            body = await reader.readexactly(content_length) if content_length else b''
+
+            path, _, query = target.partition('?')
+            scope = {
+                'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': version[5:],
+                'method': method.upper(), 'path': path, 'raw_path': path.encode('latin-1'),
+                'query_string': query.encode('latin-1'), 'headers': headers,
+            }
+            body_sent = False
+            chunked = False
+
+            async def receive():
+                nonlocal body_sent
+                if body_sent:
+                    return {'type': 'http.disconnect'}
+                body_sent = True
+                return {'type': 'http.request', 'body': body, 'more_body': False}
+
+            async def send(message):
+                nonlocal chunked
+                if message['type'] == 'http.response.start':
+                    status = message['status']
+                    response_headers = message.get('headers', [])
+                    # 没有 content-length 的响应（流式响应）使用分块传输编码
+                    chunked = not any(name.lower() == b'content-length' for name, _ in response_headers)
+                    head = f"HTTP/1.1 {status} {_REASONS.get(status, '')}\r\n"
+                    for name, value in response_headers:
+                        head += f"{name.decode('latin-1')}: {value.decode('latin-1')}\r\n"
+                    if chunked:
+                        head += "transfer-encoding: chunked\r\n"
+                    head += f"connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+                    writer.write(head.encode('latin-1'))
+                elif message['type'] == 'http.response.body':
+                    data = message.get('body', b'')
+                    more_body = message.get('more_body', False)
+                    if chunked:
+                        if data:
+                            writer.write(f"{len(data):x}\r\n".encode('latin-1') + data + b'\r\n')
+                        if not more_body:
+                            writer.write(b'0\r\n\r\n')
+                    else:
+                        writer.write(data)
+                    # 等待发送缓冲区排空，客户端读取慢时形成背压
+                    await writer.drain()
+
+            await app(scope, receive, send)
+            if not keep_alive:
+                return
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host: str = '127.0.0.1', port: int = 5000):
+    """启动内置的异步HTTP服务器"""
+    server = await asyncio.start_server(_handle_connection, host, port, backlog=1024)
+    print(f"异步服务器已启动: http://{host}:{port} "
+          f"(工作线程 {pool.max_workers}, 排队上限 {pool.max_queue})")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='SQL执行器异步服务器')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=5000)
+    arg_parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='工作线程数')
+    arg_parser.add_argument('--queue', type=int, default=MAX_QUEUE, help='排队请求数上限')
+    args = arg_parser.parse_args()
+
+    pool = WorkerPool(args.workers, args.queue)
+    try:
+        import uvicorn
+        uvicorn.run(app, host=args.host, port=args.port)
+    except ImportError:
+        try:
+            asyncio.run(serve(args.host, args.port))
+        except KeyboardInterrupt:
+            sys.exit(0)
@@ -0,0 +1,118 @@
+import os
+import csv
+import random
+import argparse
+from typing import Dict, Iterator, List, Optional, Tuple
+
+# 表结构：[(列名, 类型), ...]
+SCHEMAS: Dict[str, List[Tuple[str, str]]] = {
+    'Students': [('id', 'INT'), ('name', 'CHAR'), ('age', 'INT'), ('major', 'CHAR'), ('gpa', 'FLOAT')],
+    'Products': [('productID', 'INT'), ('productName', 'CHAR'), ('category', 'CHAR'),
+                 ('price', 'FLOAT'), ('quantity', 'INT')],
+    'Orders': [('orderID', 'INT'), ('studentID', 'INT'), ('productID', 'INT'),
+               ('quantity', 'INT'), ('amount', 'FLOAT')],
+}
+
+# 比例因子为1时各表的行数，其他比例因子按比例缩放
+# （多表连接是嵌套循环，连接的开销随比例因子平方增长）
+BASE_ROWS = {'Students': 200, 'Products': 40, 'Orders': 1000}
+
+MAJORS = ['Math', 'Physics', 'Chemistry', 'Biology', 'History', 'Economics', 'Law', 'Music',
+          'Art', 'Medicine']
+CATEGORIES = ['Fruit', 'Dairy', 'Bakery', 'Drinks', 'Snacks', 'Frozen', 'Household', 'Stationery']
+SYLLABLES = ['an', 'bo', 'chen', 'da', 'fei', 'gu', 'hua', 'jun', 'kai', 'li', 'ming', 'ning',
+             'qing', 'rui', 'shan', 'tao', 'wei', 'xin', 'yu', 'zhi']
+
+# 订单中80%的行集中在20%的学生和商品上
+HOT_FRACTION = 0.2
+HOT_SHARE = 0.8
+
+
+def row_count(table: str, scale: float) -> int:
+    return max(1, int(BASE_ROWS[table] * scale))
+
+
+def _rng(table: str, seed: int) -> random.Random:
+    # 每张表使用独立的随机数序列，一张表的行数不影响其他表的内容
+    return random.Random(f"{seed}:{table}")
+
+
+def _name(rng: random.Random) -> str:
+    return ''.join(rng.choice(SYLLABLES) for _ in range(2)).capitalize()
+
+
+def _skewed_id(rng: random.Random, count: int) -> int:
+    hot = max(1, int(count * HOT_FRACTION))
+    if rng.random() < HOT_SHARE:
+        return rng.randint(1, hot)
+    return rng.randint(1, count)
+
+
+def _price(product_id: int, seed: int) -> float:
+    """商品价格只由商品ID和种子决定，订单金额可以不依赖商品表的内容计算"""
+    return round(random.Random(f"{seed}:price:{product_id}").uniform(0.5, 200.0), 2)
+
+
+def generate_students(scale: float, seed: int) -> Iterator[tuple]:
+    rng = _rng('Students', seed)
+    for student_id in range(1, row_count('Students', scale) + 1):
+        yield (student_id, f"{_name(rng)}_{student_id}", rng.randint(17, 30), rng.choice(MAJORS),
+               round(rng.uniform(1.0, 4.0), 2))
+
+
+def generate_products(scale: float, seed: int) -> Iterator[tuple]:
+    rng = _rng('Products', seed)
+    for product_id in range(1, row_count('Products', scale) + 1):
+        yield (product_id, f"{_name(rng)}_{product_id}", rng.choice(CATEGORIES),
+               _price(product_id, seed), rng.randint(0, 500))
+
+
+def generate_orders(scale: float, seed: int, start_id: int = 1,
+                    count: Optional[int] = None) -> Iterator[tuple]:
+    """订单表的行；start_id/count 用于生成追加的订单（批量插入测试）"""
+    rng = _rng(f'Orders:{start_id}', seed)
+    students, products = row_count('Students', scale), row_count('Products', scale)
+    if count is None:
+        count = row_count('Orders', scale)
+    for order_id in range(start_id, start_id + count):
+        product_id = _skewed_id(rng, products)
+        quantity = rng.randint(1, 5)
+        yield (order_id, _skewed_id(rng, students), product_id, quantity,
+               round(_price(product_id, seed) * quantity, 2))
+
+
+GENERATORS = {
+    'Students': generate_students,
+    'Products': generate_products,
+    'Orders': generate_orders,
+}
+
+
+def create_table_sql(table: str) -> str:
+    columns = ', '.join(f"{name} {type_name}" for name, type_name in SCHEMAS[table])
+    return f"CREATE TABLE {table} ({columns})"
+
+
+def write_csv(table: str, path: str, scale: float, seed: int) -> int:
+    """把一张表的数据写成CSV文件（第一行为列名），可以用 COPY 导入；返回行数"""
+    count = 0
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow([name for name, _ in SCHEMAS[table]])
+        for row in GENERATORS[table](scale, seed):
+            writer.writerow(row)
+            count += 1
+    return count
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='生成基准测试数据（CSV文件，可用 COPY 导入）')
+    arg_parser.add_argument('output_dir', help='输出目录')
+    arg_parser.add_argument('--scale', type=float, default=1.0, help='比例因子')
+    arg_parser.add_argument('--seed', type=int, default=42, help='随机数种子')
+    args = arg_parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    for table in SCHEMAS:
+        path = os.path.join(args.output_dir, f"{table.lower()}.csv")
+        print(f"{table}: {write_csv(table, path, args.scale, args.seed)} 行 -> {path}")
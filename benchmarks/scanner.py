@@ -0,0 +1,161 @@
+import os
+import sys
+import json
+import random
+import argparse
+import statistics
+import time
+import tracemalloc
+from itertools import zip_longest
+from typing import Callable, Dict, Iterator, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sql_parser import SQLLexer
+from sql_scanner import scan_script
+
+
+def legacy_split_sql_statements(sql: str) -> list:
+    """原来的 server.split_sql_statements（逐字符拼接），作为对照"""
+    sql = sql.replace('\n', ' ').replace('\r', ' ')
+    statements = []
+    current_stmt = ''
+    in_quotes = False
+    quote_char = None
+    for char in sql:
+        if char in ["'", '"']:
+            if not in_quotes:
+                in_quotes = True
+                quote_char = char
+            elif quote_char == char:
+                in_quotes = False
+            current_stmt += char
+        elif char == ';' and not in_quotes:
+            current_stmt = current_stmt.strip()
+            if current_stmt:
+                statements.append(current_stmt)
+            current_stmt = ''
+        else:
+            current_stmt += char
+    current_stmt = current_stmt.strip()
+    if current_stmt:
+        statements.append(current_stmt)
+    if not statements and sql.strip():
+        statements.append(sql.strip())
+    return statements
+
+
+def legacy_path(sql: str) -> Iterator[list]:
+    """原来的路径：先分割出所有语句，再用 SQLLexer 逐条做词法分析"""
+    lexer = SQLLexer()
+    for stmt in legacy_split_sql_statements(sql):
+        yield list(lexer.tokenize(stmt))
+
+
+def scanner_path(sql: str) -> Iterator[list]:
+    """一次扫描完成分割和词法分析"""
+    for statement in scan_script(sql):
+        yield statement.tokens
+
+
+def generate_script(size: int, seed: int = 0) -> str:
+    """生成约 size 字节的批量脚本：以多行 INSERT 为主，夹杂查询、更新和注释"""
+    rng = random.Random(seed)
+    parts = ["CREATE TABLE Orders (id INT, customer CHAR, amount FLOAT, note CHAR);\n"]
+    total = len(parts[0])
+    row_id = 0
+    while total < size:
+        kind = rng.random()
+        if kind < 0.7:
+            rows = []
+            for _ in range(rng.randint(1, 20)):
+                row_id += 1
+                rows.append(f"({row_id}, 'customer_{rng.randint(1, 5000)}', "
+                            f"{rng.uniform(1, 1000):.2f}, 'note; with \"quotes\" {row_id}')")
+            stmt = "INSERT INTO Orders VALUES\n    " + ",\n    ".join(rows) + ";\n"
+        elif kind < 0.85:
+            stmt = (f"SELECT Orders.id, Orders.amount FROM Orders\n"
+                    f"WHERE amount >= {rng.uniform(1, 500):.1f} AND id != {rng.randint(1, row_id + 1)};\n")
+        elif kind < 0.95:
+            stmt = f"UPDATE Orders SET amount = amount * 2 WHERE id = {rng.randint(1, row_id + 1)};\n"
+        else:
+            stmt = f"# batch {row_id}\nDELETE FROM Orders WHERE customer = 'customer_{rng.randint(1, 5000)}';\n"
+        parts.append(stmt)
+        total += len(stmt)
+    return ''.join(parts)
+
+
+def consume(func: Callable[[str], Iterator[list]], sql: str) -> int:
+    """像服务器一样逐条取出语句的词法单元（取出后即丢弃），返回词法单元个数"""
+    count = 0
+    for tokens in func(sql):
+        count += len(tokens)
+    return count
+
+
+def measure(func: Callable[[str], Iterator[list]], sql: str, repeat: int) -> Dict[str, float]:
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        consume(func, sql)
+        times.append(time.perf_counter() - start)
+    median = statistics.median(times)
+
+    # 峰值内存单独测量一次（tracemalloc 会明显拖慢执行）
+    tracemalloc.start()
+    consume(func, sql)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {
+        'median_ms': round(median * 1000, 2),
+        'min_ms': round(min(times) * 1000, 2),
+        'mb_per_s': round(len(sql) / median / 1e6, 2),
+        'peak_mb': round(peak / 1e6, 2),
+    }
+
+
+def run(sizes_mb: List[float], repeat: int) -> Dict[str, Dict]:
+    results = {}
+    for size_mb in sizes_mb:
+        sql = generate_script(int(size_mb * 1024 * 1024))
+        # 两条路径的结果必须相同
+        statements = 0
+        for expected, tokens in zip_longest(legacy_path(sql), scanner_path(sql)):
+            assert [(t.type, t.value, t.index, t.end) for t in expected] == \
+                   [(t.type, t.value, t.index, t.end) for t in tokens]
+            statements += 1
+        legacy = measure(legacy_path, sql, repeat)
+        scanner = measure(scanner_path, sql, repeat)
+        results[f'{size_mb:g}MB'] = {
+            'bytes': len(sql),
+            'statements': statements,
+            'tokens': consume(scanner_path, sql),
+            'legacy': legacy,
+            'scanner': scanner,
+            'speedup': round(legacy['median_ms'] / scanner['median_ms'], 2),
+        }
+    return results
+
+
+def print_table(results: Dict[str, Dict]):
+    print(f"{'脚本':<8}{'语句数':>10}{'词法单元':>12}{'原路径(ms)':>14}{'单遍扫描(ms)':>16}{'加速比':>10}"
+          f"{'原路径峰值内存(MB)':>22}{'单遍扫描峰值内存(MB)':>24}")
+    for name, result in results.items():
+        print(f"{name:<8}{result['statements']:>10}{result['tokens']:>12}"
+              f"{result['legacy']['median_ms']:>14.1f}{result['scanner']['median_ms']:>16.1f}"
+              f"{result['speedup']:>10.2f}{result['legacy']['peak_mb']:>22.1f}"
+              f"{result['scanner']['peak_mb']:>24.1f}")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='批量脚本的语句分割和词法分析基准测试')
+    arg_parser.add_argument('--size', type=float, nargs='+', default=[1, 4], help='脚本大小（MB）')
+    arg_parser.add_argument('--repeat', type=int, default=5, help='每项重复次数')
+    arg_parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+    args = arg_parser.parse_args()
+
+    results = run(args.size, args.repeat)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+import argparse
+import tempfile
+import statistics
+import subprocess
+import time
+from typing import Dict, Tuple
+
+# 项目根目录（本脚本位于 benchmarks/ 下）
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 冷启动时导入的模块：语法分析器、执行器、进程内接口和各个服务器
+MODULES = ['sql_parser', 'sql_executor', 'dbapi', 'server', 'async_server', 'wire_server']
+
+# 子进程中测量导入耗时的代码，输出毫秒数
+IMPORT_SCRIPT = """
+import time
+start = time.perf_counter()
+import {module}
+print((time.perf_counter() - start) * 1000)
+"""
+
+# 新进程中从导入到第一条查询返回结果的耗时
+FIRST_QUERY_SCRIPT = """
+import time
+start = time.perf_counter()
+import dbapi
+conn = dbapi.connect({data_dir!r}, autocommit=True)
+conn.execute("SELECT * FROM T WHERE id = 1").fetchall()
+print((time.perf_counter() - start) * 1000)
+"""
+
+
+def _run(script: str, env: Dict[str, str]) -> Tuple[float, float]:
+    """在新的解释器进程中运行脚本，返回 (进程总耗时, 脚本输出的耗时)，单位毫秒"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', script], cwd=ROOT, env=env,
+                            capture_output=True, text=True, check=True)
+    wall = (time.perf_counter() - start) * 1000
+    return wall, float(result.stdout.strip().splitlines()[-1])
+
+
+def measure(script: str, env: Dict[str, str], repeat: int) -> Dict[str, float]:
+    """先运行一次（生成字节码和分析表缓存），再重复运行取中位数和最小值"""
+    _run(script, env)
+    walls, inner = zip(*(_run(script, env) for _ in range(repeat)))
+    return {
+        'process_median_ms': round(statistics.median(walls), 2),
+        'median_ms': round(statistics.median(inner), 2),
+        'min_ms': round(min(inner), 2),
+    }
+
+
+def _child_env(parser_cache: bool) -> Dict[str, str]:
+    env = dict(os.environ)
+    # 冷启动应使用已编译的字节码
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    if not parser_cache:
+        env['SQL_PARSER_CACHE_DIR'] = ''
+    return env
+
+
+def run(repeat: int) -> Dict[str, Dict[str, Dict[str, float]]]:
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    for parser_cache in (True, False):
+        env = _child_env(parser_cache)
+        label = 'parser_cache' if parser_cache else 'no_parser_cache'
+        results[label] = {module: measure(IMPORT_SCRIPT.format(module=module), env, repeat)
+                          for module in MODULES}
+
+        with tempfile.TemporaryDirectory() as data_dir:
+            setup = (f"import dbapi\nconn = dbapi.connect({data_dir!r}, autocommit=True)\n"
+                     f"conn.execute('CREATE TABLE T (id INT, name CHAR)')\n"
+                     f"conn.execute(\"INSERT INTO T VALUES (1, 'a')\")\nprint(0)")
+            _run(setup, env)
+            results[label]['first_query'] = measure(FIRST_QUERY_SCRIPT.format(data_dir=data_dir),
+                                                    env, repeat)
+    return results
+
+
+def print_table(results: Dict[str, Dict[str, Dict[str, float]]]):
+    cached, uncached = results['parser_cache'], results['no_parser_cache']
+    print(f"{'':<16}{'缓存分析表(ms)':>16}{'不缓存(ms)':>14}{'进程总耗时(ms)':>18}")
+    for name in cached:
+        print(f"{name:<16}{cached[name]['median_ms']:>16.1f}{uncached[name]['median_ms']:>14.1f}"
+              f"{cached[name]['process_median_ms']:>18.1f}")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='冷启动耗时基准测试（每次测量都启动新的解释器进程）')
+    arg_parser.add_argument('--repeat', type=int, default=10, help='每项重复次数')
+    arg_parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+    args = arg_parser.parse_args()
+
+    results = run(args.repeat)
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        print_table(results)
@@ -0,0 +1,299 @@
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import contextlib
+import subprocess
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+# 项目根目录（本脚本位于 benchmarks/ 下）
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import dbapi
+from datagen import SCHEMAS, MAJORS, CATEGORIES, row_count, create_table_sql, write_csv, generate_orders
+
+# 报告的延迟百分位
+PERCENTILES = (50, 90, 95, 99)
+
+# 批量插入每次操作插入的行数（比例因子为1时）
+BULK_INSERT_ROWS = 200
+
+# 与基线比较时，中位延迟变化超过该比例才算退化或改进
+DEFAULT_THRESHOLD = 0.10
+
+
+@dataclass
+class BenchmarkContext:
+    """一次基准测试运行的状态：连接、数据规模，以及写操作之间共享的订单ID"""
+    conn: dbapi.Connection
+    scale: float
+    seed: int
+    rows: Dict[str, int]
+    next_order_id: int = 0
+    inserted_orders: List[int] = field(default_factory=list)  # 批量插入的订单，删除测试按顺序删除
+
+
+@dataclass
+class Workload:
+    """一种操作：operation 执行一次操作并返回处理的行数"""
+    name: str
+    description: str
+    ops: int                                                   # 默认操作次数
+    operation: Callable[[BenchmarkContext, random.Random], int]
+
+
+def point_select(ctx: BenchmarkContext, rng: random.Random) -> int:
+    student_id = rng.randint(1, ctx.rows['Students'])
+    return len(ctx.conn.execute("SELECT * FROM Students WHERE id = ?", (student_id,)).fetchall())
+
+
+def range_scan(ctx: BenchmarkContext, rng: random.Random) -> int:
+    # 每次扫描约5%的学生
+    count = ctx.rows['Students']
+    width = max(1, count // 20)
+    low = rng.randint(1, max(1, count - width + 1))
+    return len(ctx.conn.execute("SELECT id, name, gpa FROM Students WHERE id >= ? AND id < ?",
+                                (low, low + width)).fetchall())
+
+
+def join_two(ctx: BenchmarkContext, rng: random.Random) -> int:
+    return len(ctx.conn.execute(
+        "SELECT Orders.orderID, Students.name, Orders.amount FROM Orders, Students "
+        "WHERE Orders.studentID = Students.id AND Students.major = ?",
+        (rng.choice(MAJORS),)).fetchall())
+
+
+def join_three(ctx: BenchmarkContext, rng: random.Random) -> int:
+    return len(ctx.conn.execute(
+        "SELECT Orders.orderID, Students.name, Products.productName FROM Orders, Students, Products "
+        "WHERE Orders.studentID = Students.id AND Orders.productID = Products.productID "
+        "AND Products.category = ?",
+        (rng.choice(CATEGORIES),)).fetchall())
+
+
+def bulk_insert(ctx: BenchmarkContext, rng: random.Random) -> int:
+    count = max(1, int(BULK_INSERT_ROWS * ctx.scale))
+    rows = list(generate_orders(ctx.scale, ctx.seed, start_id=ctx.next_order_id, count=count))
+    ctx.conn.cursor().executemany("INSERT INTO Orders VALUES (?, ?, ?, ?, ?)", rows)
+    ctx.inserted_orders.extend(row[0] for row in rows)
+    ctx.next_order_id += count
+    return count
+
+
+def update(ctx: BenchmarkContext, rng: random.Random) -> int:
+    product_id = rng.randint(1, ctx.rows['Products'])
+    ctx.conn.execute("UPDATE Products SET quantity = quantity + 1 WHERE productID = ?", (product_id,))
+    return 1
+
+
+def delete(ctx: BenchmarkContext, rng: random.Random) -> int:
+    # 优先删除批量插入的订单，基础数据保持不变
+    if ctx.inserted_orders:
+        order_id = ctx.inserted_orders.pop()
+    else:
+        order_id = rng.randint(1, ctx.rows['Orders'])
+    ctx.conn.execute("DELETE FROM Orders WHERE orderID = ?", (order_id,))
+    return 1
+
+
+# 按顺序执行：先读后写，删除测试删除的是批量插入的订单
+WORKLOADS = [
+    Workload('point_select', '按主键查询一个学生', 200, point_select),
+    Workload('range_scan', '按ID范围扫描约5%的学生', 100, range_scan),
+    Workload('join_2', '订单和学生两表连接（按专业过滤）', 5, join_two),
+    Workload('join_3', '订单、学生和商品三表连接（按类别过滤）', 3, join_three),
+    Workload('bulk_insert', f'批量插入订单（每次 {BULK_INSERT_ROWS} x 比例因子 行）', 10, bulk_insert),
+    Workload('update', '按主键更新商品库存', 100, update),
+    Workload('delete', '按主键删除订单', 100, delete),
+]
+
+
+def percentile(sorted_values: List[float], p: float) -> float:
+    """线性插值的百分位数"""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * p / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(latencies: List[float], rows: int, elapsed: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    result = {
+        'ops': len(values),
+        'rows': rows,
+        'mean_ms': round(sum(values) / len(values) * 1000, 3),
+    }
+    for p in PERCENTILES:
+        result[f'p{p}_ms'] = round(percentile(values, p) * 1000, 3)
+    result['max_ms'] = round(values[-1] * 1000, 3)
+    result['ops_per_s'] = round(len(values) / elapsed, 2)
+    result['rows_per_s'] = round(rows / elapsed, 2)
+    return result
+
+
+def run_workload(ctx: BenchmarkContext, workload: Workload, ops_factor: float,
+                 warmup: int) -> Dict[str, Any]:
+    # 每种操作使用独立的随机数序列，只运行部分操作时参数不变
+    rng = random.Random(f"{ctx.seed}:{workload.name}")
+    ops = max(1, int(round(workload.ops * ops_factor)))
+    for _ in range(min(warmup, ops)):
+        workload.operation(ctx, rng)
+
+    latencies = []
+    rows = 0
+    started = time.perf_counter()
+    for _ in range(ops):
+        op_start = time.perf_counter()
+        rows += workload.operation(ctx, rng)
+        latencies.append(time.perf_counter() - op_start)
+    return summarize(latencies, rows, time.perf_counter() - started)
+
+
+def load(ctx: BenchmarkContext, data_dir: str) -> float:
+    """建表并用 COPY 导入生成的数据，然后收集统计信息；返回耗时（秒）"""
+    started = time.perf_counter()
+    for table in SCHEMAS:
+        ctx.conn.execute(create_table_sql(table))
+        file_name = f"{table.lower()}.csv"
+        write_csv(table, os.path.join(data_dir, file_name), ctx.scale, ctx.seed)
+        ctx.conn.execute(f"COPY {table} FROM '{file_name}'")
+        os.remove(os.path.join(data_dir, file_name))
+    ctx.conn.execute("ANALYZE")
+    return time.perf_counter() - started
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(scale: float, seed: int, ops_factor: float = 1.0, warmup: int = 1,
+        names: Optional[List[str]] = None) -> Dict[str, Any]:
+    """在临时数据目录中生成数据并依次运行各项测试，返回可写入JSON的结果"""
+    workloads = [w for w in WORKLOADS if names is None or w.name in names]
+    rows = {table: row_count(table, scale) for table in SCHEMAS}
+    results: Dict[str, Any] = {
+        'meta': {
+            'scale': scale,
+            'seed': seed,
+            'ops_factor': ops_factor,
+            'workloads': [w.name for w in workloads],
+            'rows': rows,
+            'commit': _git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'workloads': {},
+    }
+    with tempfile.TemporaryDirectory(prefix='sql_bench_') as data_dir, \
+            open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # 执行器的调试输出不计入终端开销
+        conn = dbapi.connect(data_dir, autocommit=True)
+        ctx = BenchmarkContext(conn, scale, seed, rows, next_order_id=rows['Orders'] + 1)
+        try:
+            results['meta']['load_seconds'] = round(load(ctx, data_dir), 3)
+            for workload in workloads:
+                results['workloads'][workload.name] = run_workload(ctx, workload, ops_factor, warmup)
+        finally:
+            conn.close()
+    return results
+
+
+def compare(results: Dict[str, Any], baseline: Dict[str, Any],
+            threshold: float = DEFAULT_THRESHOLD) -> List[Dict[str, Any]]:
+    """按中位延迟与基线比较，返回每项测试的变化；比例 > 1 表示变慢"""
+    comparison = []
+    for name, current in results['workloads'].items():
+        base = baseline.get('workloads', {}).get(name)
+        if base is None:
+            continue
+        ratio = current['p50_ms'] / base['p50_ms'] if base['p50_ms'] else float('inf')
+        if ratio > 1 + threshold:
+            status = 'regression'
+        elif ratio < 1 - threshold:
+            status = 'improvement'
+        else:
+            status = 'unchanged'
+        comparison.append({
+            'workload': name,
+            'baseline_p50_ms': base['p50_ms'],
+            'p50_ms': current['p50_ms'],
+            'p50_ratio': round(ratio, 3),
+            'throughput_ratio': round(current['ops_per_s'] / base['ops_per_s'], 3)
+                                if base['ops_per_s'] else None,
+            'status': status,
+        })
+    return comparison
+
+
+def comparable(results: Dict[str, Any], baseline: Dict[str, Any]) -> bool:
+    """数据规模、随机数种子和运行的测试都相同的结果才能比较（写操作会改变之后的测试看到的数据）"""
+    keys = ('scale', 'seed', 'ops_factor', 'workloads')
+    return all(results['meta'].get(key) == baseline.get('meta', {}).get(key) for key in keys)
+
+
+def print_results(results: Dict[str, Any]):
+    meta = results['meta']
+    rows = ', '.join(f"{table} {count}" for table, count in meta['rows'].items())
+    print(f"比例因子 {meta['scale']}（{rows}），种子 {meta['seed']}，导入耗时 {meta['load_seconds']:.2f}s")
+    header = f"{'测试':<14}{'次数':>6}" + ''.join(f"{f'p{p}(ms)':>11}" for p in PERCENTILES)
+    print(header + f"{'max(ms)':>11}{'ops/s':>10}{'rows/s':>12}")
+    for name, result in results['workloads'].items():
+        print(f"{name:<14}{result['ops']:>6}" +
+              ''.join(f"{result[f'p{p}_ms']:>11.2f}" for p in PERCENTILES) +
+              f"{result['max_ms']:>11.2f}{result['ops_per_s']:>10.1f}{result['rows_per_s']:>12.1f}")
+
+
+def print_comparison(comparison: List[Dict[str, Any]]):
+    print(f"{'测试':<14}{'基线p50(ms)':>13}{'p50(ms)':>11}{'p50比例':>10}{'吞吐比例':>10}  结论")
+    labels = {'regression': '变慢', 'improvement': '变快', 'unchanged': '无明显变化'}
+    for item in comparison:
+        throughput = item['throughput_ratio']
+        print(f"{item['workload']:<14}{item['baseline_p50_ms']:>13.2f}{item['p50_ms']:>11.2f}"
+              f"{item['p50_ratio']:>10.2f}{throughput if throughput is not None else '-':>10}  "
+              f"{labels[item['status']]}")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='SQL执行器基准测试（确定性的合成数据，结果可与基线比较）')
+    arg_parser.add_argument('--scale', type=float, default=1.0, help='比例因子（数据行数按比例缩放）')
+    arg_parser.add_argument('--seed', type=int, default=42, help='随机数种子')
+    arg_parser.add_argument('--ops-factor', type=float, default=1.0, help='各项测试操作次数的倍数')
+    arg_parser.add_argument('--warmup', type=int, default=1, help='每项测试正式计时前的预热次数')
+    arg_parser.add_argument('--workload', nargs='+', choices=[w.name for w in WORKLOADS],
+                            help='只运行指定的测试（默认全部）')
+    arg_parser.add_argument('--output', help='把结果写入JSON文件（可作为之后的基线）')
+    arg_parser.add_argument('--baseline', help='与基线JSON文件比较')
+    arg_parser.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD,
+                            help='中位延迟变化超过该比例时判定为变慢或变快')
+    arg_parser.add_argument('--fail-on-regression', action='store_true', help='有测试变慢时以状态码1退出')
+    args = arg_parser.parse_args()
+
+    results = run(args.scale, args.seed, args.ops_factor, args.warmup, args.workload)
+    print_results(results)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        print()
+        if not comparable(results, baseline):
+            print("警告: 基线的比例因子、种子、操作次数或运行的测试与本次不同，比较结果仅供参考")
+        comparison = compare(results, baseline, args.threshold)
+        print_comparison(comparison)
+        if args.fail_on_regression and any(item['status'] == 'regression' for item in comparison):
+            sys.exit(1)
@@ -0,0 +1,451 @@
+import io
+import sys
+import csv
+import json
+import zlib
+import struct
+import bisect
+import importlib
+from array import array
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# 分块压缩格式（data.blk）：文件由帧组成，每帧为 类型 u8 + 元数据长度 u32 + 数据长度 u32（大端），
+# 之后是元数据（JSON）和数据
+#   'H' 文件头  元数据为 {"version", "codec", "columns", "id"}，没有数据；id 在每次重写文件时重新生成
+#   'B' 数据块  元数据为 {"rows", "crc", "chunks", "zones"}，数据为各列独立压缩的列块
+# 数据块只追加到文件末尾。各块的元数据就是块索引：建立索引只读取帧头和元数据，不解压数据；
+# zones 为数值列在块内的 [最小值, 最大值]，扫描时跳过不可能满足过滤条件的块
+BLOCK_FILE = 'data.blk'
+FRAME_HEADER = struct.Struct('>BII')
+FRAME_FILE_HEADER = ord('H')
+FRAME_BLOCK = ord('B')
+FORMAT_VERSION = 1
+
+# 每块最多的行数
+BLOCK_ROWS = 8192
+
+# 支持的压缩算法（标准库模块名），'none' 表示不压缩的CSV格式
+CODECS = ('zlib', 'lzma', 'bz2')
+NO_COMPRESSION = 'none'
+
+# 列块编码
+ENCODING_CSV = 'csv'     # 所有值为一条CSV记录
+ENCODING_DICT = 'dict'   # 字典长度 u32 + 字典（一条CSV记录）+ 以逗号分隔的编号
+ENCODING_RUNS = 'runs'   # INT列：游程个数 u32 + 每个游程的 起始值 i64、差值 i64、长度 u32
+ENCODING_FOR = 'for'     # INT列：基准值 i64 + 每个值的宽度 u8 + 各值与基准值之差（小端无符号整数）
+
+# 块内不同值不超过行数的这一比例时，CHAR列使用字典编码
+DICT_MAX_FRACTION = 0.5
+
+_U32 = struct.Struct('>I')
+_RUN = struct.Struct('>qqI')
+_FOR_HEADER = struct.Struct('>qB')
+
+_INT64_MIN = -2 ** 63
+_INT64_MAX = 2 ** 63 - 1
+
+# 各宽度（字节）对应的 array 类型码
+_ARRAY_TYPES = {}
+for _code in 'BHILQ':
+    _ARRAY_TYPES.setdefault(array(_code).itemsize, _code)
+
+# 有最小/最大值的列类型
+_ZONE_TYPES = ('INT', 'FLOAT')
+
+
+class BlockFormatError(Exception):
+    """数据块文件格式错误"""
+    pass
+
+
+def get_codec(name: str) -> Tuple[Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+    """返回压缩算法的 (压缩函数, 解压函数)；压缩模块在第一次使用时才导入"""
+    if name not in CODECS:
+        raise BlockFormatError(f"不支持的压缩算法: {name}（可选 {', '.join(CODECS)}, {NO_COMPRESSION}）")
+    try:
+        module = importlib.import_module(name)
+    except ImportError:
+        raise BlockFormatError(f"当前Python环境不支持压缩算法 {name}")
+    return module.compress, module.decompress
+
+
+@dataclass
+class BlockInfo:
+    """块索引项"""
+    offset: int                               # 数据在文件中的位置
+    size: int                                 # 数据长度
+    rows: int
+    crc: int
+    chunks: List[Tuple[str, int]]             # 每列的 (编码, 压缩后长度)
+    zones: Dict[int, Tuple[float, float]]     # 列序号 -> (最小值, 最大值)
+
+
+def _frame(kind: int, meta: dict, data: bytes = b'') -> bytes:
+    meta_bytes = json.dumps(meta, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+    return FRAME_HEADER.pack(kind, len(meta_bytes), len(data)) + meta_bytes + data
+
+
+def encode_file_header(codec: str, columns: List[str], file_id: str) -> bytes:
+    return _frame(FRAME_FILE_HEADER, {'version': FORMAT_VERSION, 'codec': codec,
+                                      'columns': columns, 'id': file_id})
+
+
+def read_file_header(f) -> Tuple[dict, int]:
+    """读取文件头，返回 (文件头元数据, 文件头帧的结束位置)"""
+    f.seek(0)
+    frame = f.read(FRAME_HEADER.size)
+    if len(frame) < FRAME_HEADER.size:
+        raise BlockFormatError("数据块文件缺少文件头")
+    kind, meta_len, data_len = FRAME_HEADER.unpack(frame)
+    if kind != FRAME_FILE_HEADER:
+        raise BlockFormatError("数据块文件缺少文件头")
+    meta = json.loads(f.read(meta_len).decode('utf-8'))
+    if meta.get('version') != FORMAT_VERSION:
+        raise BlockFormatError(f"不支持的数据块文件版本: {meta.get('version')}")
+    return meta, FRAME_HEADER.size + meta_len + data_len
+
+
+def _csv_record(values: Sequence[str]) -> bytes:
+    buf = io.StringIO()
+    csv.writer(buf).writerow(values)
+    return buf.getvalue().encode('utf-8')
+
+
+def _parse_record(data: bytes) -> List[str]:
+    return next(csv.reader(io.StringIO(data.decode('utf-8'))), [])
+
+
+def _zone(values: Sequence[str]) -> Optional[List[float]]:
+    """数值列的 [最小值, 最大值]，有无法解析的值时返回None"""
+    try:
+        numbers = [float(v) for v in values]
+    except ValueError:
+        return None
+    if any(n != n for n in numbers):
+        return None
+    return [min(numbers), max(numbers)]
+
+
+def _int_runs(numbers: List[int]) -> List[Tuple[int, int, int]]:
+    """把整数序列切分为等差的游程 [(起始值, 差值, 长度), ...]（常量序列的差值为0）"""
+    runs = []
+    k = 0
+    n = len(numbers)
+    while k < n:
+        start = numbers[k]
+        if k + 1 == n:
+            runs.append((start, 0, 1))
+            break
+        delta = numbers[k + 1] - start
+        end = k + 2
+        while end < n and numbers[end] - numbers[end - 1] == delta:
+            end += 1
+        runs.append((start, delta, end - k))
+        k = end
+    return runs
+
+
+def _encode_int_column(values: Sequence[str]) -> Optional[Tuple[str, bytes]]:
+    """
+    INT列的编码：值按等差游程（自增ID、重复值）存储，游程太多时按与最小值的差定宽存储（FOR）
+    有非规范写法的值（如 007、+5）或超出64位范围时返回None，按文本存储以保证原样读出
+    """
+    try:
+        numbers = [int(v) for v in values]
+    except ValueError:
+        return None
+    if any(str(n) != v for n, v in zip(numbers, values)):
+        return None
+    low, high = min(numbers), max(numbers)
+    if low < _INT64_MIN or high > _INT64_MAX:
+        return None
+
+    runs = _int_runs(numbers)
+    if all(_INT64_MIN <= delta <= _INT64_MAX for _, delta, _ in runs):
+        runs_size = _U32.size + len(runs) * _RUN.size
+    else:
+        runs_size = None
+
+    span = high - low
+    width = next(w for w in (1, 2, 4, 8) if span < 256 ** w)
+    if runs_size is not None and runs_size <= _FOR_HEADER.size + width * len(numbers):
+        return ENCODING_RUNS, _U32.pack(len(runs)) + b''.join(_RUN.pack(*run) for run in runs)
+
+    packed = array(_ARRAY_TYPES[width], [n - low for n in numbers])
+    if sys.byteorder == 'big':
+        packed.byteswap()
+    return ENCODING_FOR, _FOR_HEADER.pack(low, width) + packed.tobytes()
+
+
+def _encode_column(values: Sequence[str], type_name: str) -> Tuple[str, bytes]:
+    if type_name == 'INT':
+        encoded = _encode_int_column(values)
+        if encoded is not None:
+            return encoded
+    if type_name == 'CHAR':
+        entries: Dict[str, int] = {}
+        limit = len(values) * DICT_MAX_FRACTION
+        for value in values:
+            if value not in entries:
+                entries[value] = len(entries)
+                if len(entries) > limit:
+                    break
+        else:
+            dictionary = _csv_record(list(entries))
+            codes = ','.join(str(entries[v]) for v in values).encode('ascii')
+            return ENCODING_DICT, _U32.pack(len(dictionary)) + dictionary + codes
+    return ENCODING_CSV, _csv_record(values)
+
+
+def encode_block(rows: Sequence[Sequence[str]], column_types: List[str],
+                 compress: Callable[[bytes], bytes]) -> bytes:
+    """把若干行编码为一个数据块帧，column_types 为每列的类型名（隐藏的版本列为INT）"""
+    chunks = []
+    parts = []
+    zones = {}
+    for i, values in enumerate(zip(*rows)):
+        encoding, raw = _encode_column(values, column_types[i])
+        data = compress(raw)
+        chunks.append([encoding, len(data)])
+        parts.append(data)
+        if column_types[i] in _ZONE_TYPES:
+            zone = _zone(values)
+            if zone is not None:
+                zones[str(i)] = zone
+    data = b''.join(parts)
+    return _frame(FRAME_BLOCK, {'rows': len(rows), 'crc': zlib.crc32(data),
+                                'chunks': chunks, 'zones': zones}, data)
+
+
+def encode_blocks(rows: Sequence[Sequence[str]], column_types: List[str],
+                  compress: Callable[[bytes], bytes]) -> bytes:
+    """把任意多行均匀分成不超过 BLOCK_ROWS 行的若干块并编码"""
+    if not rows:
+        return b''
+    count = -(-len(rows) // BLOCK_ROWS)
+    size = -(-len(rows) // count)
+    return b''.join(encode_block(rows[i:i + size], column_types, compress)
+                    for i in range(0, len(rows), size))
+
+
+def read_frames(f, start: int, end: int) -> Tuple[List[BlockInfo], int]:
+    """
+    从 start 开始读取数据块的帧头和元数据直到 end，返回 (块索引, 最后一个完整帧的结束位置)
+    文件末尾不完整的帧（追加写到一半）被忽略
+    """
+    blocks = []
+    position = start
+    f.seek(start)
+    while position + FRAME_HEADER.size <= end:
+        kind, meta_len, data_len = FRAME_HEADER.unpack(f.read(FRAME_HEADER.size))
+        frame_end = position + FRAME_HEADER.size + meta_len + data_len
+        if frame_end > end:
+            break
+        try:
+            meta = json.loads(f.read(meta_len).decode('utf-8'))
+        except ValueError:
+            break
+        if kind != FRAME_BLOCK:
+            raise BlockFormatError(f"未知的帧类型: {kind}")
+        blocks.append(BlockInfo(position + FRAME_HEADER.size + meta_len, data_len, meta['rows'],
+                                meta['crc'], [tuple(chunk) for chunk in meta['chunks']],
+                                {int(i): tuple(zone) for i, zone in meta['zones'].items()}))
+        f.seek(frame_end)
+        position = frame_end
+    return blocks, position
+
+
+class Block:
+    """读入内存的数据块，各列在第一次访问时才解压和解码"""
+    def __init__(self, info: BlockInfo, data: bytes, decompress: Callable[[bytes], bytes]):
+        self.info = info
+        self._data = data
+        self._decompress = decompress
+        self._offsets = []
+        offset = 0
+        for _, length in info.chunks:
+            self._offsets.append(offset)
+            offset += length
+        self._raw: Dict[int, bytes] = {}
+        self._dictionaries: Dict[int, Tuple[List[str], List[int]]] = {}
+        self._runs: Dict[int, Tuple[List[Tuple[int, int, int]], List[int]]] = {}
+        self._packed: Dict[int, Tuple[int, array]] = {}
+        self._columns: Dict[int, List[str]] = {}
+
+    def _chunk(self, i: int) -> bytes:
+        raw = self._raw.get(i)
+        if raw is None:
+            start = self._offsets[i]
+            raw = self._raw[i] = self._decompress(self._data[start:start + self.info.chunks[i][1]])
+        return raw
+
+    def _dictionary(self, i: int) -> Tuple[List[str], List[int]]:
+        cached = self._dictionaries.get(i)
+        if cached is None:
+            raw = self._chunk(i)
+            (length,) = _U32.unpack_from(raw, 0)
+            end = _U32.size + length
+            intern = sys.intern
+            dictionary = [intern(v) for v in _parse_record(raw[_U32.size:end])]
+            codes = [int(c) for c in raw[end:].split(b',')]
+            cached = self._dictionaries[i] = (dictionary, codes)
+        return cached
+
+    def _int_runs(self, i: int) -> Tuple[List[Tuple[int, int, int]], List[int]]:
+        """返回 (游程列表, 每个游程第一行的行号)"""
+        cached = self._runs.get(i)
+        if cached is None:
+            raw = self._chunk(i)
+            (count,) = _U32.unpack_from(raw, 0)
+            runs = [_RUN.unpack_from(raw, _U32.size + k * _RUN.size) for k in range(count)]
+            offsets = []
+            position = 0
+            for _, _, length in runs:
+                offsets.append(position)
+                position += length
+            cached = self._runs[i] = (runs, offsets)
+        return cached
+
+    def _int_packed(self, i: int) -> Tuple[int, array]:
+        """返回 (基准值, 各值与基准值之差)"""
+        cached = self._packed.get(i)
+        if cached is None:
+            raw = self._chunk(i)
+            base, width = _FOR_HEADER.unpack_from(raw, 0)
+            packed = array(_ARRAY_TYPES[width])
+            packed.frombytes(raw[_FOR_HEADER.size:])
+            if sys.byteorder == 'big':
+                packed.byteswap()
+            cached = self._packed[i] = (base, packed)
+        return cached
+
+    def column(self, i: int) -> List[str]:
+        values = self._columns.get(i)
+        if values is None:
+            encoding = self.info.chunks[i][0]
+            if encoding == ENCODING_DICT:
+                dictionary, codes = self._dictionary(i)
+                values = [dictionary[c] for c in codes]
+            elif encoding == ENCODING_RUNS:
+                values = []
+                for start, delta, length in self._int_runs(i)[0]:
+                    if delta:
+                        values.extend(map(str, range(start, start + delta * length, delta)))
+                    else:
+                        values.extend([str(start)] * length)
+            elif encoding == ENCODING_FOR:
+                base, packed = self._int_packed(i)
+                if packed.itemsize == 1:
+                    # 值的范围不超过256时先生成所有可能值的文本，相同的值共享同一个字符串
+                    texts = [str(base + d) for d in range(256)]
+                    values = [texts[d] for d in packed]
+                else:
+                    values = [str(base + d) for d in packed]
+            else:
+                values = _parse_record(self._chunk(i))
+            if len(values) != self.info.rows:
+                raise BlockFormatError(f"列块的行数不符: 期望 {self.info.rows}，实际 {len(values)}")
+            self._columns[i] = values
+        return values
+
+    def take(self, i: int, indexes: List[int]) -> List[str]:
+        """只取出指定行的值（选中的行较少时避免解码整列）"""
+        if i in self._columns or 2 * len(indexes) > self.info.rows:
+            values = self.column(i)
+            return [values[k] for k in indexes]
+        encoding = self.info.chunks[i][0]
+        if encoding == ENCODING_DICT:
+            dictionary, codes = self._dictionary(i)
+            return [dictionary[codes[k]] for k in indexes]
+        if encoding == ENCODING_RUNS:
+            runs, offsets = self._int_runs(i)
+            values = []
+            for k in indexes:
+                r = bisect.bisect_right(offsets, k) - 1
+                start, delta, _ = runs[r]
+                values.append(str(start + delta * (k - offsets[r])))
+            return values
+        if encoding == ENCODING_FOR:
+            base, packed = self._int_packed(i)
+            return [str(base + packed[k]) for k in indexes]
+        values = self.column(i)
+        return [values[k] for k in indexes]
+
+    def matches(self, i: int, predicate: Callable[[str], bool]) -> List[bool]:
+        """
+        对一列求过滤条件
+        字典编码的列对每个不同的值只计算一次；INT列的等差游程先用游程的最小/最大值整体判断，
+        只有无法整体确定的游程才逐个值判断
+        """
+        encoding = self.info.chunks[i][0]
+        if encoding == ENCODING_DICT:
+            dictionary, codes = self._dictionary(i)
+            results = [predicate(value) for value in dictionary]
+            return [results[c] for c in codes]
+        if encoding == ENCODING_RUNS:
+            return self._run_matches(i, predicate)
+        if encoding == ENCODING_FOR and getattr(predicate, 'exact', False):
+            base, packed = self._int_packed(i)
+            test = predicate.test_number
+            return [test(base + d) for d in packed]
+        return [predicate(value) for value in self.column(i)]
+
+    def _run_matches(self, i: int, predicate: Callable[[str], bool]) -> List[bool]:
+        may_match = getattr(predicate, 'may_match', None)
+        all_match = getattr(predicate, 'all_match', None)
+        exact = getattr(predicate, 'exact', False)
+        result = []
+        for start, delta, length in self._int_runs(i)[0]:
+            last = start + delta * (length - 1)
+            low, high = (start, last) if start <= last else (last, start)
+            if not delta:
+                result.extend([predicate(str(start))] * length)
+            elif may_match is not None and not may_match(low, high):
+                result.extend([False] * length)
+            elif all_match is not None and all_match(low, high):
+                result.extend([True] * length)
+            elif exact:
+                test = predicate.test_number
+                result.extend(test(v) for v in range(start, start + delta * length, delta))
+            else:
+                result.extend(predicate(str(v)) for v in range(start, start + delta * length, delta))
+        return result
+
+
+def may_match(info: BlockInfo, filters: Dict[int, Any]) -> bool:
+    """根据块的最小/最大值判断块中是否可能有满足过滤条件的行"""
+    for i, predicate in filters.items():
+        zone = info.zones.get(i)
+        check = getattr(predicate, 'may_match', None)
+        if zone is not None and check is not None and not check(*zone):
+            return False
+    return True
+
+
+def read_block(f, info: BlockInfo, decompress: Callable[[bytes], bytes]) -> Optional[Block]:
+    """读取一个数据块，数据不完整或校验失败时返回None"""
+    f.seek(info.offset)
+    data = f.read(info.size)
+    if len(data) != info.size or zlib.crc32(data) != info.crc:
+        return None
+    return Block(info, data, decompress)
+
+
+def block_rows(block: Block, width: int, filters: Dict[int, Callable[[str], bool]]) -> List[List[str]]:
+    """
+    返回块中满足过滤条件的行：先只解码过滤条件涉及的列，没有满足条件的行时不再解码其他列；
+    选中的行较少时其他列只解码选中的行
+    """
+    selected = None
+    for i, predicate in filters.items():
+        matched = block.matches(i, predicate)
+        selected = matched if selected is None else [a and b for a, b in zip(selected, matched)]
+        if not any(selected):
+            return []
+    if selected is None or all(selected):
+        columns = [block.column(i) for i in range(width)]
+    else:
+        indexes = [k for k, keep in enumerate(selected) if keep]
+        columns = [block.take(i, indexes) for i in range(width)]
+    return [list(row) for row in zip(*columns)]
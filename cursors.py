@@ -0,0 +1,195 @@
+import time
+import secrets
+import threading
+from collections import OrderedDict
+from itertools import islice
+from typing import Any, Iterator, List, Optional, Tuple
+
+from sql_parser import SQLError
+
+# 空闲游标的过期时间（秒）、游标个数上限和游标占用内存上限
+DEFAULT_TTL = 300.0
+DEFAULT_MAX_CURSORS = 1000
+DEFAULT_MAX_BYTES = 256 * 1024 * 1024
+
+# 每个游标的固定开销估计（打开的数据文件、读缓冲区等）
+CURSOR_OVERHEAD_BYTES = 16 * 1024
+
+# 单次获取的最大行数
+MAX_FETCH_ROWS = 10000
+
+_EXHAUSTED = object()
+
+
+class Cursor:
+    """
+    服务器端游标
+    rows 为结果行迭代器（单表查询是边读边返回的生成器，持有语句快照和打开的数据文件），
+    每次获取从上次停止的位置继续，不会重新扫描
+    """
+    def __init__(self, cursor_id: str, rows: Iterator[Any], held_bytes: int = 0):
+        self.cursor_id = cursor_id
+        self.held_bytes = held_bytes + CURSOR_OVERHEAD_BYTES
+        self.fetched = 0
+        self.last_access = time.monotonic()
+        self._rows = rows
+        self._lookahead = None
+        self._lock = threading.Lock()
+        self.closed = False
+
+    @property
+    def exhausted(self) -> bool:
+        return self._lookahead is _EXHAUSTED
+
+    def fetch(self, n: int) -> List[Any]:
+        """获取接下来的至多 n 行，并预读一行以判断是否还有数据"""
+        with self._lock:
+            if self.closed:
+                raise SQLError(f"游标 {self.cursor_id} 已关闭")
+            self.last_access = time.monotonic()
+            batch = []
+            if self._lookahead is _EXHAUSTED:
+                return batch
+            if self._lookahead is not None:
+                batch.append(self._lookahead)
+            batch.extend(islice(self._rows, n - len(batch)))
+            self._lookahead = next(self._rows, _EXHAUSTED)
+            self.fetched += len(batch)
+            return batch
+
+    def close(self, blocking: bool = True) -> bool:
+        """关闭游标，释放快照和数据文件；blocking 为False且游标正在使用时返回False"""
+        if not self._lock.acquire(blocking):
+            return False
+        try:
+            if not self.closed:
+                self.closed = True
+                self._lookahead = _EXHAUSTED
+                close = getattr(self._rows, 'close', None)
+                if close is not None:
+                    close()
+            return True
+        finally:
+            self._lock.release()
+
+
+class CursorManager:
+    """
+    游标管理器
+    空闲超过 ttl 秒的游标会被清理；游标个数或占用内存超过上限时，
+    先关闭最久未使用的游标，仍然放不下时拒绝打开新游标
+    """
+    def __init__(self, ttl: float = DEFAULT_TTL, max_cursors: int = DEFAULT_MAX_CURSORS,
+                 max_bytes: int = DEFAULT_MAX_BYTES):
+        self.ttl = ttl
+        self.max_cursors = max_cursors
+        self.max_bytes = max_bytes
+        self._cursors: 'OrderedDict[str, Cursor]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._total_bytes = 0
+        self._reaper: Optional[threading.Thread] = None
+        # 统计信息
+        self.opened = 0
+        self.expired = 0
+        self.evicted = 0
+
+    @property
+    def total_bytes(self) -> int:
+        return self._total_bytes
+
+    def open(self, rows: Iterator[Any], held_bytes: int = 0) -> Cursor:
+        """打开游标；held_bytes 为迭代器已在内存中持有的结果大小"""
+        cursor = Cursor(secrets.token_urlsafe(16), rows, held_bytes)
+        if cursor.held_bytes > self.max_bytes:
+            cursor.close()
+            raise SQLError(f"查询结果过大（约 {cursor.held_bytes} 字节），超过游标内存上限 {self.max_bytes} 字节")
+
+        self.reap()
+        evicted = []
+        with self._lock:
+            # 淘汰最久未使用的游标直到放得下
+            while self._cursors and (len(self._cursors) >= self.max_cursors or
+                                     self._total_bytes + cursor.held_bytes > self.max_bytes):
+                _, oldest = self._cursors.popitem(last=False)
+                self._total_bytes -= oldest.held_bytes
+                evicted.append(oldest)
+            self._cursors[cursor.cursor_id] = cursor
+            self._total_bytes += cursor.held_bytes
+            self.opened += 1
+            self.evicted += len(evicted)
+        for old in evicted:
+            old.close()
+        return cursor
+
+    def get(self, cursor_id: str) -> Cursor:
+        with self._lock:
+            cursor = self._cursors.get(cursor_id)
+            if cursor is None:
+                raise SQLError(f"游标 {cursor_id} 不存在或已过期")
+            self._cursors.move_to_end(cursor_id)
+            return cursor
+
+    def fetch(self, cursor_id: str, n: int) -> Tuple[List[Any], bool]:
+        """从游标获取至多 n 行，返回 (行, 是否已读完)；读完的游标自动关闭"""
+        if n <= 0 or n > MAX_FETCH_ROWS:
+            raise SQLError(f"获取行数必须在 1 到 {MAX_FETCH_ROWS} 之间")
+        cursor = self.get(cursor_id)
+        rows = cursor.fetch(n)
+        if cursor.exhausted:
+            self.close(cursor_id)
+        return rows, cursor.exhausted
+
+    def close(self, cursor_id: str) -> bool:
+        """关闭并移除游标，游标不存在时返回False"""
+        with self._lock:
+            cursor = self._cursors.pop(cursor_id, None)
+            if cursor is not None:
+                self._total_bytes -= cursor.held_bytes
+        if cursor is None:
+            return False
+        cursor.close()
+        return True
+
+    def reap(self) -> int:
+        """关闭空闲超时的游标，返回关闭的个数（正在使用的游标跳过）"""
+        deadline = time.monotonic() - self.ttl
+        with self._lock:
+            expired = [c for c in self._cursors.values() if c.last_access < deadline]
+        count = 0
+        for cursor in expired:
+            if not cursor.close(blocking=False):
+                continue
+            with self._lock:
+                if self._cursors.pop(cursor.cursor_id, None) is not None:
+                    self._total_bytes -= cursor.held_bytes
+                    count += 1
+        self.expired += count
+        return count
+
+    def start_reaper(self, interval: Optional[float] = None):
+        """启动后台线程定期清理过期游标，使空闲游标尽快释放快照（VACUUM才能清理旧版本）"""
+        if self._reaper is not None:
+            return
+        interval = interval if interval is not None else max(1.0, self.ttl / 4)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.reap()
+
+        self._reaper = threading.Thread(target=run, name='cursor-reaper', daemon=True)
+        self._reaper.start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'open': len(self._cursors),
+                'bytes': self._total_bytes,
+                'opened': self.opened,
+                'expired': self.expired,
+                'evicted': self.evicted
+            }
+
+    def __len__(self):
+        return len(self._cursors)
+
@@ -1,10 +1,32 @@
 import os
 import csv
+import json
+import atexit
+import time
 import shutil
-from typing import List, Dict, Any, Optional
+import struct
+import threading
+import zlib
+from typing import List, Dict, Any, Optional, Iterator, Tuple, Callable
+from contextlib import contextmanager
 from dataclasses import dataclass
-from threading import Lock
+from enum import Enum
+from threading import Lock, Condition
 from sql_parser import SQLError, SQLTypeError, DataType,  Table
+from mvcc import CommitLog, Snapshot
+from storage import fsync_directory, get_storage
+from table_stats import TableStatsCache
+from recovery import (CHECKPOINT_WAL_BYTES, CHECKPOINT_INTERVAL, RecoveryStats,
+                      recover, write_checkpoint)
+
+# 预写日志文件名（位于数据目录下）
+WAL_FILE = '_wal.log'
+
+# 日志文件开头的记录类型，记录文件中第一条记录的起始LSN
+LOG_START = 'log_start'
+
+# 日志记录头：记录长度、CRC32校验
+_RECORD_HEADER = struct.Struct('<II')
 
 class DBError(SQLError):
     """数据库操作错误"""
@@ -18,36 +40,443 @@ class TableOperation:
     backup_path: Optional[str] = None
     is_new: bool = False
 
+class LockMode(Enum):
+    """锁模式：意向共享、意向排他、共享、共享意向排他、排他"""
+    IS = 'IS'
+    IX = 'IX'
+    S = 'S'
+    SIX = 'SIX'
+    X = 'X'
+
+# 锁模式兼容矩阵
+_COMPATIBLE = {
+    LockMode.IS:  {LockMode.IS, LockMode.IX, LockMode.S, LockMode.SIX},
+    LockMode.IX:  {LockMode.IS, LockMode.IX},
+    LockMode.S:   {LockMode.IS, LockMode.S},
+    LockMode.SIX: {LockMode.IS},
+    LockMode.X:   set(),
+}
+
+# 锁升级：已持有 a 模式再申请 b 模式时实际需要的模式
+_STRENGTH = {LockMode.IS: 0, LockMode.IX: 1, LockMode.S: 1, LockMode.SIX: 2, LockMode.X: 3}
+
+def _combine_modes(held: LockMode, requested: LockMode) -> LockMode:
+    if {held, requested} == {LockMode.IX, LockMode.S}:
+        return LockMode.SIX
+    return held if _STRENGTH[held] >= _STRENGTH[requested] else requested
+
+class LockConflict(DBError):
+    """不等待加锁时遇到冲突"""
+    def __init__(self, resource: Tuple, mode: LockMode):
+        super().__init__(f"资源 {resource} 已被其他事务锁定")
+        self.resource = resource
+        self.mode = mode
+
+class DeadlockError(DBError):
+    """检测到死锁，当前事务被选为牺牲者"""
+    pass
+
+class LockTimeoutError(DBError):
+    """等待锁超时"""
+    pass
+
+class WALError(DBError):
+    """预写日志写入或fsync失败，之后的提交都会失败，需要重启后由崩溃恢复处理"""
+    pass
+
 class LockManager:
-    """锁管理器"""
-    def __init__(self):
-        self._locks: Dict[str, Lock] = {}
-        self._global_lock = Lock()
-        
-    def acquire_lock(self, table_name: str) -> Lock:
-        """获取表锁"""
-        with self._global_lock:
-            if table_name not in self._locks:
-                self._locks[table_name] = Lock()
-            return self._locks[table_name]
-            
-    def release_lock(self, table_name: str):
-        """释放表锁"""
-        if table_name in self._locks:
-            self._locks[table_name].release()
+    """
+    锁管理器
+    - 表锁支持 IS/IX/S/SIX/X 五种模式，行锁以 (表名, 行ID) 为键，支持 S/X 模式
+    - 锁由事务持有直到事务结束（两阶段锁）
+    - 等待时维护等待图，发现环路立即报告死锁；等待超过超时时间报错
+    - 同一事务在一张表上持有的行锁超过阈值时尝试升级为表锁
+    """
+    def __init__(self, timeout: float = 10.0, escalation_threshold: int = 5000):
+        self.timeout = timeout
+        self.escalation_threshold = escalation_threshold
+        self._cond = Condition(threading.RLock())
+        self._granted: Dict[Tuple, Dict[Any, LockMode]] = {}   # 资源 -> {持有者: 模式}
+        self._owned: Dict[Any, set] = {}                       # 持有者 -> 资源集合
+        self._waits_for: Dict[Any, set] = {}                   # 等待图：等待者 -> 阻塞它的持有者
+        self._row_counts: Dict[Tuple[Any, str], int] = {}      # (持有者, 表名) -> 行锁个数
+        # 统计信息
+        self.waits = 0
+        self.deadlocks = 0
+        self.escalations = 0
+
+    @staticmethod
+    def table_resource(table_name: str) -> Tuple:
+        return ('table', table_name)
+
+    @staticmethod
+    def row_resource(table_name: str, rowid: str) -> Tuple:
+        return ('row', table_name, rowid)
+
+    def _blockers(self, owner: Any, resource: Tuple, mode: LockMode) -> set:
+        """与申请的模式不兼容的其他持有者"""
+        holders = self._granted.get(resource)
+        if not holders:
+            return set()
+        compatible = _COMPATIBLE[mode]
+        return {o for o, m in holders.items() if o != owner and m not in compatible}
+
+    def _has_cycle(self, start: Any) -> bool:
+        """从 start 出发沿等待图能否回到 start"""
+        stack = list(self._waits_for.get(start, ()))
+        seen = set()
+        while stack:
+            node = stack.pop()
+            if node == start:
+                return True
+            if node in seen:
+                continue
+            seen.add(node)
+            stack.extend(self._waits_for.get(node, ()))
+        return False
+
+    def acquire(self, owner: Any, resource: Tuple, mode: LockMode,
+                wait: bool = True, timeout: Optional[float] = None):
+        """
+        为持有者加锁（可重入，已持有较弱的模式时自动升级）
+        wait 为False时遇到冲突抛出 LockConflict；等待中发现死锁抛出 DeadlockError，当前持有者为牺牲者，
+        调用方必须立即回滚它的事务（先结束事务再释放锁，环路中的其他事务醒来时看到的是已回滚的行版本）
+        """
+        with self._cond:
+            held = self._granted.get(resource, {}).get(owner)
+            target = mode if held is None else _combine_modes(held, mode)
+            if held == target:
+                return
+
+            deadline = None
+            try:
+                while True:
+                    blockers = self._blockers(owner, resource, target)
+                    if not blockers:
+                        break
+                    if not wait:
+                        raise LockConflict(resource, target)
+                    self._waits_for[owner] = blockers
+                    if self._has_cycle(owner):
+                        self.deadlocks += 1
+                        raise DeadlockError(f"检测到死锁：事务 {owner} 等待 {resource} 时形成环路，"
+                                            f"该事务已被回滚，请重试")
+                    if deadline is None:
+                        self.waits += 1
+                        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise LockTimeoutError(f"等待锁 {resource} 超时")
+                    self._cond.wait(remaining)
+            finally:
+                self._waits_for.pop(owner, None)
+
+            self._granted.setdefault(resource, {})[owner] = target
+            self._owned.setdefault(owner, set()).add(resource)
+
+    def wait_until_free(self, resource: Tuple, mode: LockMode, timeout: Optional[float] = None):
+        """等待直到资源可以以指定模式加锁（不实际加锁，供不持有任何锁的调用方使用）"""
+        deadline = time.monotonic() + (self.timeout if timeout is None else timeout)
+        with self._cond:
+            while self._blockers(None, resource, mode):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise LockTimeoutError(f"等待锁 {resource} 超时")
+                self._cond.wait(remaining)
+
+    def lock_table(self, owner: Any, table_name: str, mode: LockMode, wait: bool = True):
+        """加表锁"""
+        self.acquire(owner, self.table_resource(table_name), mode, wait)
+
+    def lock_row(self, owner: Any, table_name: str, rowid: str,
+                 mode: LockMode = LockMode.X, wait: bool = True):
+        """
+        加行锁（调用方需已持有相应的表意向锁）
+        已持有覆盖该行的表锁时直接返回；行锁过多时尝试升级为表锁
+        """
+        table_resource = self.table_resource(table_name)
+        with self._cond:
+            table_mode = self._granted.get(table_resource, {}).get(owner)
+            if table_mode == LockMode.X or (mode == LockMode.S and table_mode in (LockMode.S, LockMode.SIX)):
+                return
+            resource = self.row_resource(table_name, rowid)
+            newly_locked = resource not in self._owned.get(owner, ())
+            self.acquire(owner, resource, mode, wait)
+            if not newly_locked:
+                return
+            key = (owner, table_name)
+            count = self._row_counts.get(key, 0) + 1
+            self._row_counts[key] = count
+            if count > self.escalation_threshold:
+                self._escalate(owner, table_name, mode)
+
+    def _escalate(self, owner: Any, table_name: str, mode: LockMode):
+        """尝试把行锁升级为表锁，有冲突时保留行锁"""
+        table_mode = LockMode.X if mode == LockMode.X else LockMode.S
+        try:
+            self.acquire(owner, self.table_resource(table_name), table_mode, wait=False)
+        except LockConflict:
+            return
+        self.escalations += 1
+        owned = self._owned.get(owner, set())
+        for resource in [r for r in owned if r[0] == 'row' and r[1] == table_name]:
+            owned.discard(resource)
+            holders = self._granted.get(resource)
+            if holders is not None:
+                holders.pop(owner, None)
+                if not holders:
+                    del self._granted[resource]
+        self._row_counts.pop((owner, table_name), None)
+        self._cond.notify_all()
+
+    def release_all(self, owner: Any):
+        """释放持有者的所有锁（事务结束时调用）"""
+        with self._cond:
+            for resource in self._owned.pop(owner, ()):
+                holders = self._granted.get(resource)
+                if holders is not None:
+                    holders.pop(owner, None)
+                    if not holders:
+                        del self._granted[resource]
+            for key in [k for k in self._row_counts if k[0] == owner]:
+                del self._row_counts[key]
+            self._cond.notify_all()
+
+    def held_locks(self, owner: Any) -> Dict[Tuple, LockMode]:
+        """持有者当前持有的锁"""
+        with self._cond:
+            return {r: self._granted[r][owner] for r in self._owned.get(owner, ())}
+
+class WriteAheadLog:
+    """
+    预写日志，支持组提交
+    日志记录先写入内存缓冲区，提交时调用 flush 等待记录落盘。
+    同一时间只有一个线程（领导者）执行写文件和fsync，其余提交线程等待；
+    领导者一次写入所有已缓冲的记录，因此并发提交的事务共享一次写入和一次fsync。
+    有其他事务正在进行时，领导者最多额外等待 commit_delay 秒以凑成更大的组。
+    LSN 为记录结束位置的逻辑字节偏移：检查点丢弃旧记录后日志文件以一条 log_start 记录开头，
+    记录其后第一个字节的LSN，因此丢弃旧记录后LSN仍然单调递增。
+    写文件或fsync失败后日志进入失败状态（fsync失败后无法确定哪些页已落盘，不能重试）：
+    已落盘的LSN不再前进，等待其后记录的提交全部抛出 WALError。
+    """
+    def __init__(self, log_path: str, commit_delay: float = 0.001,
+                 max_group_size: int = 256, sync: bool = True):
+        self.log_path = log_path
+        self.commit_delay = commit_delay
+        self.max_group_size = max_group_size
+        self.sync = sync
+        self._file = open(log_path, 'ab')
+        self._cond = Condition(Lock())
+        self._pending: List[bytes] = []
+        self._base, self._start_lsn = self._read_start()
+        self._end_lsn = self._base + self._file.tell()   # 已分配的最大LSN
+        self._flushed_lsn = self._end_lsn      # 已落盘的最大LSN
+        self._flushing = False
+        self._failed: Optional[BaseException] = None   # 写入失败的原因
+        # 统计信息
+        self.records_written = 0
+        self.fsync_count = 0
+
+    def _read_start(self) -> Tuple[int, int]:
+        """读取日志文件开头的 log_start 记录，返回 (文件偏移0对应的LSN, 第一条记录的起始LSN)"""
+        for lsn, record in self._read_file(0, 0):
+            if record.get('type') == LOG_START:
+                return record['lsn'] - lsn, record['lsn']
+            break
+        return 0, 0
+
+    @staticmethod
+    def encode(record: Dict[str, Any]) -> bytes:
+        """编码一条日志记录：长度 + CRC32 + JSON"""
+        payload = json.dumps(record, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        return _RECORD_HEADER.pack(len(payload), zlib.crc32(payload)) + payload
+
+    def append(self, record: Dict[str, Any]) -> int:
+        """追加日志记录到缓冲区（不落盘），返回该记录的LSN"""
+        data = self.encode(record)
+        with self._cond:
+            self._pending.append(data)
+            self._end_lsn += len(data)
+            lsn = self._end_lsn
+            # 唤醒正在等待凑组的领导者
+            if self._flushing:
+                self._cond.notify_all()
+            return lsn
+
+    def flush(self, lsn: int, wait_for_group: bool = False):
+        """
+        等待LSN之前的所有记录落盘
+        wait_for_group 为True时，领导者会在 commit_delay 内等待更多提交加入本组
+        """
+        with self._cond:
+            while self._flushed_lsn < lsn:
+                if self._failed is not None:
+                    raise WALError(f"预写日志写入失败，提交无法落盘: {self._failed}") from self._failed
+                if self._flushing:
+                    # 跟随者：等待领导者完成本组写入
+                    self._cond.wait()
+                    continue
+
+                # 成为领导者
+                self._flushing = True
+                if wait_for_group and self.commit_delay > 0:
+                    deadline = time.monotonic() + self.commit_delay
+                    while len(self._pending) < self.max_group_size:
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            break
+                        self._cond.wait(remaining)
+
+                batch = self._pending
+                self._pending = []
+                target_lsn = self._end_lsn
+
+                # 写文件和fsync期间释放锁，新的记录可以继续进入缓冲区
+                self._cond.release()
+                try:
+                    self._file.write(b''.join(batch))
+                    self._file.flush()
+                    if self.sync:
+                        os.fsync(self._file.fileno())
+                except BaseException as e:
+                    self._fail(e)
+                finally:
+                    self._cond.acquire()
+                    self._flushing = False
+                    self._cond.notify_all()
+                if self._failed is not None:
+                    continue
+
+                self._flushed_lsn = target_lsn
+                self.records_written += len(batch)
+                self.fsync_count += 1
+
+    def _fail(self, error: BaseException):
+        """
+        进入失败状态（领导者调用，不持有锁）
+        尽量截掉写了一半的记录，使日志文件停在已落盘的LSN处；本组和之后的记录都不再写入
+        """
+        self._failed = error
+        try:
+            self._file.truncate(self._flushed_lsn - self._base)
+        except (OSError, ValueError):
+            # 截断也失败时，恢复按CRC校验跳过不完整的记录
+            pass
+
+    @property
+    def failed(self) -> bool:
+        return self._failed is not None
+
+    @property
+    def flushed_lsn(self) -> int:
+        return self._flushed_lsn
+
+    @property
+    def start_lsn(self) -> int:
+        """日志文件中第一条记录的起始LSN（更早的记录已被检查点丢弃）"""
+        return self._start_lsn
+
+    @property
+    def end_lsn(self) -> int:
+        """已分配的最大LSN（包括尚未落盘的记录）"""
+        with self._cond:
+            return self._end_lsn
+
+    def _read_file(self, offset: int, lsn: int) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        with open(self.log_path, 'rb') as f:
+            f.seek(offset)
+            while True:
+                header = f.read(_RECORD_HEADER.size)
+                if len(header) < _RECORD_HEADER.size:
+                    return
+                length, crc = _RECORD_HEADER.unpack(header)
+                payload = f.read(length)
+                if len(payload) < length or zlib.crc32(payload) != crc:
+                    return
+                lsn += _RECORD_HEADER.size + length
+                yield lsn, json.loads(payload.decode('utf-8'))
+
+    def read_records(self, start_lsn: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+        """从指定位置读取已落盘的日志记录，返回 (LSN, 记录)；遇到不完整或损坏的记录时停止"""
+        start_lsn = max(start_lsn, self._start_lsn)
+        for lsn, record in self._read_file(start_lsn - self._base, start_lsn):
+            if record.get('type') != LOG_START:
+                yield lsn, record
+
+    def truncate(self, lsn: int):
+        """丢弃 lsn 之后的内容（恢复时截掉崩溃留下的不完整记录，必须在写入新记录之前调用）"""
+        with self._cond:
+            if self._pending or self._flushing or not self._start_lsn <= lsn < self._end_lsn:
+                return
+            self._file.truncate(lsn - self._base)
+            self._end_lsn = self._flushed_lsn = lsn
+
+    def discard_before(self, lsn: int) -> int:
+        """
+        丢弃 lsn 之前的已落盘记录（检查点调用），返回丢弃的字节数
+        lsn 之后的记录复制到新文件（以 log_start 记录开头）后原子替换日志文件；
+        替换期间追加的记录留在缓冲区中，之后写入新文件
+        """
+        with self._cond:
+            while self._flushing:
+                self._cond.wait()
+            lsn = min(lsn, self._flushed_lsn)
+            if lsn <= self._start_lsn:
+                return 0
+            with open(self.log_path, 'rb') as f:
+                f.seek(lsn - self._base)
+                tail = f.read(self._flushed_lsn - lsn)
+            start = self.encode({'type': LOG_START, 'lsn': lsn})
+            tmp_path = self.log_path + '.tmp'
+            with open(tmp_path, 'wb') as f:
+                f.write(start + tail)
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp_path, self.log_path)
+            fsync_directory(os.path.dirname(self.log_path))
+            self._file = open(self.log_path, 'ab')
+            discarded = lsn - self._start_lsn
+            self._base, self._start_lsn = lsn - len(start), lsn
+            return discarded
+
+    def close(self):
+        """刷新剩余记录并关闭日志文件"""
+        try:
+            self.flush(self._end_lsn)
+        finally:
+            self._file.close()
 
 class Transaction:
     """事务管理"""
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, txid: int = 0, manager: Optional['DBManager'] = None):
         self.db_path = db_path
+        self.txid = txid
+        self.manager = manager
         self.operations: List[TableOperation] = []
         self.active = True
+        self.last_lsn = 0
+        self.commit_lsn = 0  # 提交记录的起始LSN（正在提交时不为0，检查点据此确定重做起点）
+        self.snapshot: Optional[Snapshot] = None  # 事务快照，第一次读取时创建
         
     def add_operation(self, operation: TableOperation):
         """添加操作到事务"""
         if not self.active:
             raise DBError("事务已结束")
         self.operations.append(operation)
+
+    def log(self, record: Dict[str, Any]) -> int:
+        """写入本事务的日志记录（在提交时统一落盘）"""
+        if not self.active:
+            raise DBError("事务已结束")
+        if self.manager is None:
+            return 0
+        record['txid'] = self.txid
+        if 'table' in record:
+            # 先登记再写日志，检查点看到这条记录时一定也会把这张表落盘
+            self.manager.mark_dirty(record['table'])
+        self.last_lsn = self.manager.wal.append(record)
+        return self.last_lsn
         
     def commit(self):
         """提交事务"""
@@ -55,12 +484,22 @@ class Transaction:
             raise DBError("事务已结束")
             
         try:
+            # 写入提交记录并等待落盘（组提交）
+            if self.manager is not None:
+                self.commit_lsn = self.manager.wal.end_lsn
+                lsn = self.manager.wal.append({'type': 'commit', 'txid': self.txid})
+                self.manager.wal.flush(lsn, self.manager.active_transaction_count() > 1)
+                # 日志落盘后才对其他事务可见
+                self.manager.clog.mark_committed(self.txid)
+
             # 清理所有备份
             for op in self.operations:
                 if op.backup_path and os.path.exists(op.backup_path):
                     os.remove(op.backup_path)
         finally:
             self.active = False
+            if self.manager is not None:
+                self.manager._finish_transaction(self)
             
     def rollback(self):
         """回滚事务"""
@@ -81,25 +520,235 @@ class Transaction:
                     if os.path.exists(op.backup_path):
                         shutil.copy2(op.backup_path, table_path)
                         os.remove(op.backup_path)
+            # 回滚记录不需要立即落盘
+            if self.manager is not None:
+                self.manager.wal.append({'type': 'abort', 'txid': self.txid})
         finally:
             self.active = False
+            if self.manager is not None:
+                self.manager._finish_transaction(self)
 
 class DBManager:
-    """数据库管理器"""
-    def __init__(self, db_path: str):
+    """
+    数据库管理器
+    启动时从上次检查点的重做起点开始重放预写日志（见 recovery.py），之后由后台线程定期做检查点：
+    距上次检查点的日志超过 checkpoint_bytes 字节，或有新日志且距上次检查点超过 checkpoint_interval 秒。
+    需要重放的日志量因此有上限，崩溃恢复的时间与数据库的总大小无关
+    """
+    def __init__(self, db_path: str, commit_delay: float = 0.001,
+                 checkpoint_bytes: int = CHECKPOINT_WAL_BYTES,
+                 checkpoint_interval: float = CHECKPOINT_INTERVAL):
         self.db_path = db_path
         self.lock_manager = LockManager()
-        self.current_transaction: Optional[Transaction] = None
+        # 每个线程各自的当前事务，多个线程可以同时进行事务
+        self._local = threading.local()
+        self._txn_lock = Lock()
+        self._active_transactions: Dict[int, Transaction] = {}
+        # 已注册的读快照（VACUUM不能清理它们仍可能看到的行版本）
+        self._snapshots: Dict[int, Snapshot] = {}
+        # 表级写闩：同一张表的数据文件同一时间只有一个写操作（读操作不需要）
+        self._table_latches: Dict[str, threading.RLock] = {}
+        self._next_rowids: Dict[str, int] = {}
+        # 每张表上次VACUUM以来产生的死版本数
+        self.dead_versions: Dict[str, int] = {}
+        # 各表统计信息（写操作提交后在内存中调整，检查点时写回文件）
+        self.table_stats = TableStatsCache(db_path)
+        atexit.register(self.table_stats.flush)
         
         # 确保数据目录存在
         if not os.path.exists(db_path):
             os.makedirs(db_path)
+
+        # 上次检查点以来写过数据的表（检查点需要把它们的数据文件落盘）
+        self._dirty_tables: set = set()
+        self.checkpoint_bytes = checkpoint_bytes
+        self.checkpoint_interval = checkpoint_interval
+        self._checkpoint_lock = Lock()
+        self._checkpoint_wakeup = threading.Event()
+        self.checkpoint_count = 0
+        self.last_checkpoint_seconds = 0.0
+
+        self.wal = WriteAheadLog(os.path.join(db_path, WAL_FILE), commit_delay=commit_delay)
+        self.clog = CommitLog(db_path)
+        # 提交记录先写入预写日志，提交日志文件可能缺少崩溃前最后一批提交；
+        # 数据文件的修改不在提交时落盘，重做起点之后的修改按日志补齐
+        self.recovery: RecoveryStats = recover(db_path, self.wal, self.clog)
+        self._checkpoint_lsn = self.recovery.start_lsn
+        # 重放了日志时立即做检查点：补齐的数据落盘，下次启动不再重放这些日志
+        if self.recovery.records or self.recovery.tables:
+            self._dirty_tables.update(self.recovery.tables)
+            self.checkpoint()
+        threading.Thread(target=self._checkpoint_loop, name=f'checkpoint-{db_path}', daemon=True).start()
+
+    @property
+    def current_transaction(self) -> Optional[Transaction]:
+        return getattr(self._local, 'transaction', None)
+
+    @current_transaction.setter
+    def current_transaction(self, transaction: Optional[Transaction]):
+        self._local.transaction = transaction
+
+    def start_transaction(self) -> Transaction:
+        """创建一个新事务（不绑定到当前线程），由调用方负责提交或回滚"""
+        with self._txn_lock:
+            txid = self.clog.allocate_xid()
+            transaction = Transaction(self.db_path, txid, self)
+            self._active_transactions[txid] = transaction
+            return transaction
+
+    def _finish_transaction(self, transaction: Transaction):
+        """事务结束（提交或回滚）后从活动事务中移除"""
+        with self._txn_lock:
+            self._active_transactions.pop(transaction.txid, None)
+        self.lock_manager.release_all(transaction.txid)
+        if self.wal.end_lsn - self._checkpoint_lsn >= self.checkpoint_bytes:
+            self._checkpoint_wakeup.set()
+
+    def mark_dirty(self, table_name: str):
+        """登记写过数据的表"""
+        with self._txn_lock:
+            self._dirty_tables.add(table_name)
+
+    def checkpoint(self) -> int:
+        """
+        做一次检查点，返回重做起点LSN
+        1. 重做起点取当前日志末尾，正在提交的事务从其提交记录开始（提交日志文件中可能还没有它）
+        2. 依次获取上次检查点以来写过的表的写闩（等待已写日志的写操作完成），将数据文件落盘
+        3. 提交日志落盘，原子地写入检查点文件，丢弃重做起点之前的日志
+        """
+        with self._checkpoint_lock:
+            started = time.monotonic()
+            with self._txn_lock:
+                end_lsn = redo_lsn = self.wal.end_lsn
+                for txn in self._active_transactions.values():
+                    if txn.commit_lsn:
+                        redo_lsn = min(redo_lsn, txn.commit_lsn)
+                tables, self._dirty_tables = self._dirty_tables, set()
+            try:
+                # 日志先于数据落盘
+                self.wal.flush(end_lsn)
+                for table_name in sorted(tables):
+                    table_dir = os.path.join(self.db_path, table_name)
+                    with self.table_latch(table_name):
+                        if os.path.isdir(table_dir):
+                            get_storage(table_dir).sync()
+                fsync_directory(self.db_path)
+                self.clog.sync()
+                write_checkpoint(self.db_path, redo_lsn)
+            except BaseException:
+                with self._txn_lock:
+                    self._dirty_tables |= tables
+                raise
+            self.wal.discard_before(redo_lsn)
+            self._checkpoint_lsn = redo_lsn
+            self.table_stats.flush()
+            self.checkpoint_count += 1
+            self.last_checkpoint_seconds = time.monotonic() - started
+            return redo_lsn
+
+    def _checkpoint_loop(self):
+        """后台检查点线程"""
+        while True:
+            self._checkpoint_wakeup.wait(self.checkpoint_interval)
+            self._checkpoint_wakeup.clear()
+            if self.wal.end_lsn <= self._checkpoint_lsn:
+                continue
+            try:
+                self.checkpoint()
+            except Exception:
+                # 检查点失败不影响正常运行，日志保留到下次检查点
+                pass
+
+    def active_transaction_count(self) -> int:
+        """当前活动事务数"""
+        return len(self._active_transactions)
+
+    def snapshot(self, transaction: Optional[Transaction] = None) -> Snapshot:
+        """创建快照；事务内的快照在第一次调用时创建并在整个事务期间复用（快照隔离）"""
+        if transaction is not None and transaction.snapshot is not None:
+            return transaction.snapshot
+        with self._txn_lock:
+            active = set(self._active_transactions)
+            own_xid = 0
+            if transaction is not None:
+                own_xid = transaction.txid
+                active.discard(own_xid)
+            snapshot = Snapshot(self.clog.next_xid, active, self.clog.committed, own_xid)
+            if transaction is not None:
+                transaction.snapshot = snapshot
+        return snapshot
+
+    @contextmanager
+    def read_snapshot(self, transaction: Optional[Transaction] = None):
+        """
+        读操作使用的快照，不加任何锁
+        不在事务中时创建语句级快照，并在读取期间登记以免被VACUUM清理
+        """
+        if transaction is not None:
+            yield self.snapshot(transaction)
+            return
+        snapshot = self.snapshot()
+        with self._txn_lock:
+            self._snapshots[id(snapshot)] = snapshot
+        try:
+            yield snapshot
+        finally:
+            with self._txn_lock:
+                self._snapshots.pop(id(snapshot), None)
+
+    def register_snapshot(self, snapshot: Snapshot):
+        """登记长期持有的快照（如游标），直到 release_snapshot"""
+        with self._txn_lock:
+            self._snapshots[id(snapshot)] = snapshot
+
+    def release_snapshot(self, snapshot: Snapshot):
+        with self._txn_lock:
+            self._snapshots.pop(id(snapshot), None)
+
+    def vacuum_horizon(self) -> int:
+        """比该事务ID小的已提交事务对所有活动事务和快照都可见"""
+        with self._txn_lock:
+            horizon = self.clog.next_xid
+            if self._active_transactions:
+                horizon = min(horizon, min(self._active_transactions))
+            for txn in self._active_transactions.values():
+                if txn.snapshot is not None:
+                    horizon = min(horizon, txn.snapshot.xmin)
+            for snapshot in self._snapshots.values():
+                horizon = min(horizon, snapshot.xmin)
+            return horizon
+
+    def is_active(self, txid: int) -> bool:
+        return txid in self._active_transactions
+
+    def table_latch(self, table_name: str) -> threading.RLock:
+        """获取表的写闩"""
+        with self._txn_lock:
+            latch = self._table_latches.get(table_name)
+            if latch is None:
+                latch = self._table_latches[table_name] = threading.RLock()
+            return latch
+
+    def allocate_rowids(self, table_name: str, count: int, max_rowid: Callable[[], int]) -> int:
+        """
+        为表分配连续的行ID，返回第一个行ID
+        本进程第一次写该表时通过 max_rowid 扫描数据文件得到当前最大行ID
+        """
+        with self._txn_lock:
+            next_rowid = self._next_rowids.get(table_name)
+        if next_rowid is None:
+            next_rowid = max_rowid() + 1
+        with self._txn_lock:
+            next_rowid = max(next_rowid, self._next_rowids.get(table_name, 0))
+            self._next_rowids[table_name] = next_rowid + count
+            return next_rowid
             
-    def begin_transaction(self):
+    def begin_transaction(self) -> Transaction:
         """开始事务"""
         if self.current_transaction:
             raise DBError("已有活动事务")
-        self.current_transaction = Transaction(self.db_path)
+        self.current_transaction = self.start_transaction()
+        return self.current_transaction
         
     def commit_transaction(self):
         """提交事务"""
@@ -194,3 +843,17 @@ class DBManager:
             raise SQLTypeError(f"无法将值 '{value}' 转换为 {expected_type.name} 类型")
             
         return value 
+
+
+# 每个数据目录共享一个数据库管理器（同一进程内的执行器共用日志和事务编号）
+_managers: Dict[str, DBManager] = {}
+_managers_lock = Lock()
+
+def get_db_manager(db_path: str) -> DBManager:
+    """获取数据目录对应的数据库管理器"""
+    key = os.path.abspath(db_path)
+    with _managers_lock:
+        if key not in _managers:
+            _managers[key] = DBManager(key)
+        return _managers[key]
+
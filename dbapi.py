@@ -0,0 +1,318 @@
+from collections import OrderedDict
+from typing import Any, Iterator, List, Optional, Sequence, Tuple
+
+from sql_parser import (SQLParser, SQLError, SQLSyntaxError, DataType, SelectStatement,
+                        InsertStatement, TransactionStatement)
+from sql_scanner import scan_statement
+from sql_executor import SQLExecutor
+from query_cache import shared_query_cache
+from statement_cache import PreparedStatement, to_literal
+from table_stats import parse_value
+
+# PEP 249 模块级属性
+apilevel = '2.0'
+threadsafety = 1          # 线程之间可以共享模块，但不能共享连接
+paramstyle = 'qmark'      # 参数占位符为 ?
+
+# 每个连接缓存的已解析语句数
+STATEMENT_CACHE_SIZE = 256
+
+
+class Warning(Exception):
+    pass
+
+
+class Error(Exception):
+    pass
+
+
+class InterfaceError(Error):
+    pass
+
+
+class DatabaseError(Error):
+    pass
+
+
+class DataError(DatabaseError):
+    pass
+
+
+class OperationalError(DatabaseError):
+    pass
+
+
+class IntegrityError(DatabaseError):
+    pass
+
+
+class InternalError(DatabaseError):
+    pass
+
+
+class ProgrammingError(DatabaseError):
+    pass
+
+
+class NotSupportedError(DatabaseError):
+    pass
+
+
+class DBAPITypeObject:
+    """description 中的类型编码为列的数据类型名，与类型对象比较判断类别"""
+    def __init__(self, *values: str):
+        self.values = values
+
+    def __eq__(self, other):
+        return other in self.values
+
+    def __hash__(self):
+        return hash(self.values)
+
+
+STRING = DBAPITypeObject(DataType.CHAR.name)
+NUMBER = DBAPITypeObject(DataType.INT.name, DataType.FLOAT.name)
+
+
+def _convert_row(row: List[Tuple[str, Any]], types: List[Optional[DataType]]) -> tuple:
+    """将执行器返回的 [(列名, 值), ...] 转换为Python值的元组"""
+    return tuple(value if data_type is None else parse_value(str(value), data_type)
+                 for (_, value), data_type in zip(row, types))
+
+
+class Cursor:
+    """游标：SELECT 的结果按需从执行器逐行读取，fetchmany 不会一次读入整个结果集"""
+    def __init__(self, connection: 'Connection'):
+        self.connection = connection
+        self.description: Optional[List[tuple]] = None
+        self.rowcount = -1
+        self.arraysize = 1
+        self.lastrowid = None
+        self._rows: Optional[Iterator[List[Tuple[str, Any]]]] = None
+        self._types: List[Optional[DataType]] = []
+        self._closed = False
+
+    def _check_open(self):
+        if self._closed:
+            raise InterfaceError("游标已关闭")
+        self.connection._check_open()
+
+    def _reset(self):
+        """丢弃上一条语句未读完的结果（释放其快照和数据文件）"""
+        if self._rows is not None:
+            self._rows.close()
+        self._rows = None
+        self.description = None
+        self.rowcount = -1
+
+    def execute(self, operation: str, parameters: Sequence[Any] = ()) -> 'Cursor':
+        """执行一条语句，参数以 ? 占位"""
+        self._check_open()
+        self._reset()
+        stmt = self.connection._bind(operation, [parameters])[0]
+        executor = self.connection._begin()
+        try:
+            if isinstance(stmt, SelectStatement):
+                columns = executor.describe(stmt)
+                self._types = [DataType[type_name] if type_name else None for _, type_name in columns]
+                self.description = [(name, type_name, None, None, None, None, None)
+                                    for name, type_name in columns]
+                self._rows = executor.stream_select(stmt)
+            else:
+                executor.execute([stmt])
+                if isinstance(stmt, InsertStatement):
+                    self.rowcount = len(stmt.rows)
+        except SQLError as e:
+            raise DatabaseError(str(e)) from e
+        return self
+
+    def executemany(self, operation: str, seq_of_parameters: Sequence[Sequence[Any]]) -> 'Cursor':
+        """
+        对每组参数执行同一条语句
+        INSERT 的所有参数组合并为一条多行 INSERT，只写入和提交一次；
+        UPDATE / DELETE 不合并，每组参数各执行一次（各扫描并重写一次表），
+        大批量修改请尽量写成一条带条件的语句
+        """
+        self._check_open()
+        self._reset()
+        statements = self.connection._bind(operation, seq_of_parameters)
+        if not statements:
+            self.rowcount = 0
+            return self
+        if any(isinstance(stmt, SelectStatement) for stmt in statements):
+            raise ProgrammingError("executemany 不能用于 SELECT 语句")
+
+        executor = self.connection._begin()
+        try:
+            if isinstance(statements[0], InsertStatement):
+                rows = [row for stmt in statements for row in stmt.rows]
+                executor.execute([InsertStatement(statements[0].table_name, rows)])
+                self.rowcount = len(rows)
+            else:
+                executor.execute(statements)
+        except SQLError as e:
+            raise DatabaseError(str(e)) from e
+        return self
+
+    def fetchone(self) -> Optional[tuple]:
+        rows = self.fetchmany(1)
+        return rows[0] if rows else None
+
+    def fetchmany(self, size: Optional[int] = None) -> List[tuple]:
+        self._check_open()
+        if self._rows is None:
+            raise ProgrammingError("上一条语句没有结果集")
+        size = self.arraysize if size is None else size
+        rows = []
+        try:
+            for row in self._rows:
+                rows.append(_convert_row(row, self._types))
+                if len(rows) >= size:
+                    break
+        except SQLError as e:
+            raise DatabaseError(str(e)) from e
+        return rows
+
+    def fetchall(self) -> List[tuple]:
+        self._check_open()
+        if self._rows is None:
+            raise ProgrammingError("上一条语句没有结果集")
+        try:
+            return [_convert_row(row, self._types) for row in self._rows]
+        except SQLError as e:
+            raise DatabaseError(str(e)) from e
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> tuple:
+        row = self.fetchone()
+        if row is None:
+            raise StopIteration
+        return row
+
+    def setinputsizes(self, sizes):
+        pass
+
+    def setoutputsize(self, size, column=None):
+        pass
+
+    def close(self):
+        if not self._closed:
+            self._reset()
+            self._closed = True
+            self.connection._cursors.discard(self)
+
+    def __enter__(self) -> 'Cursor':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+class Connection:
+    """
+    进程内连接：持有一个长期存在的执行器和语法分析器，已解析的语句按文本缓存，
+    重复执行时只绑定参数
+    autocommit 为False时（默认）第一条语句隐式开始事务，commit / rollback 结束事务
+    未指定 query_cache 时使用数据目录的共享结果缓存，写入会使同一进程内服务器缓存的结果失效
+    """
+    def __init__(self, data_dir: Optional[str] = None, autocommit: bool = False, **executor_options):
+        self.autocommit = autocommit
+        self._executor = SQLExecutor(data_dir, **executor_options)
+        if self._executor.query_cache is None:
+            self._executor.query_cache = shared_query_cache(self._executor.data_dir)
+        self._parser = SQLParser()
+        self._statements: 'OrderedDict[str, PreparedStatement]' = OrderedDict()
+        self._cursors = set()
+        self._closed = False
+
+    def _check_open(self):
+        if self._closed:
+            raise InterfaceError("连接已关闭")
+
+    def _prepare(self, operation: str) -> PreparedStatement:
+        """解析语句（带LRU缓存）"""
+        prepared = self._statements.get(operation)
+        if prepared is not None:
+            self._statements.move_to_end(operation)
+            return prepared
+        try:
+            stmt = self._parser.parse(scan_statement(operation.strip().rstrip(';')).iter_tokens())
+        except SQLSyntaxError as e:
+            raise ProgrammingError(str(e)) from e
+        except SQLError as e:
+            raise DatabaseError(str(e)) from e
+        if stmt is None:
+            raise ProgrammingError("语法错误")
+        if isinstance(stmt, TransactionStatement):
+            raise ProgrammingError("请使用连接的 commit() / rollback() 控制事务")
+        prepared = PreparedStatement(operation, stmt)
+        self._statements[operation] = prepared
+        while len(self._statements) > STATEMENT_CACHE_SIZE:
+            self._statements.popitem(last=False)
+        return prepared
+
+    def _bind(self, operation: str, seq_of_parameters: Sequence[Sequence[Any]]) -> list:
+        """为每组参数生成绑定后的语法树"""
+        prepared = self._prepare(operation)
+        try:
+            return [prepared.bind([to_literal(v) for v in params]) for params in seq_of_parameters]
+        except SQLError as e:
+            raise ProgrammingError(str(e)) from e
+
+    def _begin(self) -> SQLExecutor:
+        """返回执行器；非自动提交模式下按需开始事务"""
+        if not self.autocommit and self._executor.transaction is None:
+            self._executor.execute([TransactionStatement('BEGIN')])
+        return self._executor
+
+    def _finish(self, action: str):
+        self._check_open()
+        for cursor in list(self._cursors):
+            cursor._reset()
+        if self._executor.transaction is not None:
+            try:
+                self._executor.execute([TransactionStatement(action)])
+            except SQLError as e:
+                raise DatabaseError(str(e)) from e
+
+    def commit(self):
+        self._finish('COMMIT')
+
+    def rollback(self):
+        self._finish('ROLLBACK')
+
+    def cursor(self) -> Cursor:
+        self._check_open()
+        cursor = Cursor(self)
+        self._cursors.add(cursor)
+        return cursor
+
+    def execute(self, operation: str, parameters: Sequence[Any] = ()) -> Cursor:
+        """非标准的便捷方法：创建游标并执行"""
+        return self.cursor().execute(operation, parameters)
+
+    def close(self):
+        """关闭连接，未提交的事务会被回滚"""
+        if self._closed:
+            return
+        self.rollback()
+        for cursor in list(self._cursors):
+            cursor.close()
+        self._closed = True
+
+    def __enter__(self) -> 'Connection':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # 与 sqlite3 相同：正常退出时提交，出现异常时回滚（不关闭连接）
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+
+def connect(data_dir: Optional[str] = None, autocommit: bool = False, **executor_options) -> Connection:
+    """打开数据目录（默认为项目下的 data 目录）上的进程内连接"""
+    return Connection(data_dir, autocommit, **executor_options)
@@ -0,0 +1,233 @@
+import re
+import threading
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+# Prometheus 文本格式（/metrics 接口的响应类型）
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# 语句耗时直方图的桶上界（秒）
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 采集函数返回的一项指标：(指标名, 类型 counter/gauge, 说明, 值)
+CollectedMetric = Tuple[str, str, str, float]
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...],
+                   extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """只增不减的计数器，每组标签值一个计数"""
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def value(self, *label_values: str) -> float:
+        return self._values.get(label_values, 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"
+                for key, value in values]
+
+
+class Histogram:
+    """
+    直方图：每组标签值记录各个桶的次数、总和与总次数
+    记录时只累加落入的那个桶，输出时才计算 Prometheus 要求的累计次数
+    """
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.buckets = tuple(buckets)
+        # 标签值 -> [各桶次数（最后一个为 +Inf）, 总和]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def count(self, *label_values: str) -> int:
+        entry = self._values.get(label_values)
+        return sum(entry[0]) if entry is not None else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        lines = []
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labels, key, ('le', _format_value(float(bound))))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labels, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    指标注册表
+    计数器和直方图在语句执行时更新（每条语句几次加锁累加，不随行数增长）；
+    其他模块已有的统计（缓存命中数、锁等待数等）由采集函数在抓取时读取，平时没有任何开销
+    """
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Callable[[], Iterable[CollectedMetric]]] = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def add_collector(self, collector: Callable[[], Iterable[CollectedMetric]]):
+        """注册采集函数，抓取时调用，返回 [(指标名, 类型, 说明, 值), ...]"""
+        with self._lock:
+            self._collectors.append(collector)
+
+    def render(self) -> str:
+        """以 Prometheus 文本格式输出所有指标"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        for collector in collectors:
+            for name, kind, help_text, value in collector():
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                lines.append(f"{name} {_format_value(value)}")
+        return '\n'.join(lines) + '\n'
+
+
+# 进程内共享的注册表
+REGISTRY = MetricsRegistry()
+
+STATEMENT_DURATION = REGISTRY.histogram(
+    'minidb_statement_duration_seconds', '语句执行耗时（流式SELECT包括结果被取完的时间）', ('statement',))
+TABLE_STATEMENT_DURATION = REGISTRY.histogram(
+    'minidb_table_statement_duration_seconds', '按表统计的语句执行耗时（多表连接计入每张表）',
+    ('statement', 'table'))
+STATEMENT_ERRORS = REGISTRY.counter('minidb_statement_errors_total', '执行出错的语句数', ('statement',))
+ROWS_SCANNED = REGISTRY.counter('minidb_rows_scanned_total', '从数据文件读取的行数', ('statement',))
+BYTES_READ = REGISTRY.counter('minidb_bytes_read_total', '读取的数据文件字节数', ('statement',))
+ROWS_WRITTEN = REGISTRY.counter('minidb_rows_written_total', '写入（插入、更新、删除）的行数',
+                                ('statement',))
+ROWS_RETURNED = REGISTRY.counter('minidb_rows_returned_total', 'SELECT返回的行数', ('statement',))
+SPILLED_BYTES = REGISTRY.counter('minidb_spilled_bytes_total', '超出内存预算写入临时文件的字节数',
+                                 ('statement',))
+
+
+@dataclass
+class StatementStats:
+    """一条语句执行期间的统计，由执行器在读写数据时累加"""
+    rows_scanned: int = 0
+    bytes_read: int = 0
+    rows_written: int = 0
+    rows_returned: int = 0
+    peak_memory: int = 0    # 物化的中间结果占用内存的估计峰值（字节），边读边返回的查询为0
+    spilled_bytes: int = 0  # 超出内存预算写入临时文件的字节数
+
+    def track_memory(self, nbytes: int):
+        if nbytes > self.peak_memory:
+            self.peak_memory = nbytes
+
+
+def statement_kind(stmt: Any) -> str:
+    """语句类型标签，如 SelectStatement -> select，CreateTableStatement -> create_table"""
+    name = type(stmt).__name__
+    if name.endswith('Statement'):
+        name = name[:-len('Statement')]
+    return re.sub(r'(?<!^)(?=[A-Z])', '_', name).lower()
+
+
+def statement_tables(stmt: Any) -> List[str]:
+    """语句涉及的表名"""
+    if hasattr(stmt, 'statement'):
+        return statement_tables(stmt.statement)
+    if hasattr(stmt, 'tables'):
+        return list(stmt.tables)
+    if hasattr(stmt, 'table'):
+        return [stmt.table.name]
+    table_name = getattr(stmt, 'table_name', None)
+    return [table_name] if table_name else []
+
+
+def record_statement(stmt: Any, stats: StatementStats, seconds: float, success: bool):
+    """语句结束时记录耗时和行数；出错的语句不按表记录（表名可能不存在）"""
+    kind = statement_kind(stmt)
+    STATEMENT_DURATION.observe(seconds, kind)
+    if stats.rows_scanned:
+        ROWS_SCANNED.inc(kind, amount=stats.rows_scanned)
+    if stats.bytes_read:
+        BYTES_READ.inc(kind, amount=stats.bytes_read)
+    if stats.rows_written:
+        ROWS_WRITTEN.inc(kind, amount=stats.rows_written)
+    if stats.rows_returned:
+        ROWS_RETURNED.inc(kind, amount=stats.rows_returned)
+    if stats.spilled_bytes:
+        SPILLED_BYTES.inc(kind, amount=stats.spilled_bytes)
+    if not success:
+        STATEMENT_ERRORS.inc(kind)
+        return
+    for table in statement_tables(stmt):
+        TABLE_STATEMENT_DURATION.observe(seconds, kind, table)
+
+
+def render() -> str:
+    return REGISTRY.render()
@@ -0,0 +1,187 @@
+import os
+import threading
+from typing import List, Tuple, Set, Iterator, Optional
+
+from storage import TableStorage, RowFilter
+
+# 每个行版本末尾的隐藏列：行ID、创建事务ID、删除事务ID（0表示未删除）
+ROWID_COLUMN = '_rowid'
+XMIN_COLUMN = '_xmin'
+XMAX_COLUMN = '_xmax'
+HIDDEN_COLUMNS = [ROWID_COLUMN, XMIN_COLUMN, XMAX_COLUMN]
+HIDDEN_COUNT = len(HIDDEN_COLUMNS)
+
+# 事务ID为0表示"冻结"：对所有快照都可见（旧格式数据或已被VACUUM冻结的行）
+FROZEN_XID = 0
+
+# 提交日志文件和事务ID预留文件（位于数据目录下）
+CLOG_FILE = '_clog'
+XID_FILE = '_xid'
+XID_RESERVE_STEP = 1024
+
+
+def is_versioned(header: List[str]) -> bool:
+    """数据文件表头是否包含隐藏的版本列"""
+    return header[-HIDDEN_COUNT:] == HIDDEN_COLUMNS
+
+
+def read_versions(storage: TableStorage) -> Tuple[List[str], List[List[str]]]:
+    """
+    读取表中所有行版本，返回 (用户列名, 行版本列表)
+    每个行版本为 用户列值 + [rowid, xmin, xmax]；
+    旧格式的数据文件按冻结版本处理，rowid按行号分配；
+    不完整的行（并发追加写到一半）会被跳过
+    """
+    header, reader = storage.scan()
+    if not is_versioned(header):
+        versions = [row + [str(i), '0', '0'] for i, row in enumerate(reader, 1)]
+        return header, versions
+
+    width = len(header)
+    versions = [row for row in reader if len(row) == width and row[-1].isdigit()]
+    return header[:-HIDDEN_COUNT], versions
+
+
+class Snapshot:
+    """
+    事务快照
+    快照创建时已提交的事务可见；xid_bound 之后开始的事务和创建时仍活动的事务不可见；
+    事务自己的修改对自己可见
+    """
+    def __init__(self, xid_bound: int, active: Set[int], committed: Set[int], own_xid: int = 0):
+        self.xid_bound = xid_bound
+        self.active = active
+        self.committed = committed
+        self.own_xid = own_xid
+        # 所有快照中仍可能被视为"未提交"的最小事务ID，用于VACUUM
+        self.xmin = min(active) if active else xid_bound
+
+    def _committed_before(self, xid: int) -> bool:
+        """事务在快照创建之前已提交"""
+        return (xid < self.xid_bound and xid not in self.active and
+                xid in self.committed)
+
+    def is_visible(self, xmin: str, xmax: str) -> bool:
+        """判断行版本对快照是否可见（参数为数据文件中的原始文本）"""
+        # 快速路径：冻结且未删除的行
+        if xmin == '0' and xmax == '0':
+            return True
+
+        xmin_id = int(xmin)
+        if xmin_id != FROZEN_XID and xmin_id != self.own_xid and not self._committed_before(xmin_id):
+            return False
+
+        xmax_id = int(xmax)
+        if xmax_id == FROZEN_XID:
+            return True
+        if xmax_id == self.own_xid:
+            return False
+        return not self._committed_before(xmax_id)
+
+
+def visible_rows(storage: TableStorage, snapshot: Snapshot,
+                 filters: Optional[RowFilter] = None) -> Tuple[List[str], List[List[str]]]:
+    """
+    读取对快照可见的行，返回 (用户列名, 只含用户列的行列表)
+    filters 为下推到存储层的过滤函数（按用户列序号）
+    """
+    header, reader = storage.scan(filters)
+    if not is_versioned(header):
+        return header, list(reader)
+
+    width = len(header)
+    ncols = width - HIDDEN_COUNT
+    is_visible = snapshot.is_visible
+    rows = [row[:ncols] for row in reader
+            if len(row) == width and row[-1].isdigit() and is_visible(row[-2], row[-1])]
+    return header[:ncols], rows
+
+
+def scan_visible_rows(storage: TableStorage, snapshot: Snapshot,
+                      filters: Optional[RowFilter] = None) -> Tuple[List[str], Iterator[List[str]]]:
+    """
+    与 visible_rows 相同，但逐行读取：返回 (用户列名, 行迭代器)
+    数据文件在迭代结束（或迭代器被关闭）时关闭
+    """
+    header, reader = storage.scan(filters)
+    versioned = is_versioned(header)
+    width = len(header)
+    ncols = width - HIDDEN_COUNT if versioned else width
+
+    def rows():
+        try:
+            if not versioned:
+                yield from reader
+                return
+            is_visible = snapshot.is_visible
+            for row in reader:
+                if len(row) == width and row[-1].isdigit() and is_visible(row[-2], row[-1]):
+                    yield row[:ncols]
+        finally:
+            reader.close()
+
+    return header[:ncols], rows()
+
+
+class CommitLog:
+    """
+    提交日志：记录已提交的事务ID，并分配不重复的事务ID
+    事务ID按批预留并持久化，重启后不会复用崩溃前已分配的事务ID；
+    未记录为已提交且不在活动中的事务都视为已中止
+    """
+    def __init__(self, db_path: str):
+        self.clog_file = os.path.join(db_path, CLOG_FILE)
+        self.xid_file = os.path.join(db_path, XID_FILE)
+        self._lock = threading.Lock()
+        self.committed: Set[int] = set()
+
+        if os.path.exists(self.clog_file):
+            with open(self.clog_file, 'r', encoding='utf-8') as f:
+                self.committed = {int(line) for line in f if line.strip().isdigit()}
+
+        self._xid_limit = 1
+        if os.path.exists(self.xid_file):
+            with open(self.xid_file, 'r', encoding='utf-8') as f:
+                content = f.read().strip()
+                if content.isdigit():
+                    self._xid_limit = int(content)
+        self._next_xid = max(self._xid_limit, max(self.committed, default=0) + 1)
+        self._xid_limit = self._next_xid
+
+    @property
+    def next_xid(self) -> int:
+        return self._next_xid
+
+    def allocate_xid(self) -> int:
+        """分配新的事务ID（调用方需保证串行调用）"""
+        if self._next_xid >= self._xid_limit:
+            self._xid_limit = self._next_xid + XID_RESERVE_STEP
+            tmp_file = self.xid_file + '.tmp'
+            with open(tmp_file, 'w', encoding='utf-8') as f:
+                f.write(str(self._xid_limit))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.xid_file)
+        xid = self._next_xid
+        self._next_xid += 1
+        return xid
+
+    def mark_committed(self, xid: int, persist: bool = True):
+        """记录事务已提交（提交记录已在预写日志中落盘，这里无需fsync）"""
+        with self._lock:
+            if xid in self.committed:
+                return
+            self.committed.add(xid)
+            if persist:
+                with open(self.clog_file, 'a', encoding='utf-8') as f:
+                    f.write(f"{xid}\n")
+
+    def sync(self):
+        """将提交日志文件落盘（检查点调用，之后不再需要从预写日志中恢复之前的提交）"""
+        with self._lock:
+            if os.path.exists(self.clog_file):
+                with open(self.clog_file, 'a', encoding='utf-8') as f:
+                    os.fsync(f.fileno())
+
+    def is_committed(self, xid: int) -> bool:
+        return xid == FROZEN_XID or xid in self.committed
@@ -0,0 +1,89 @@
+import os
+import json
+import hashlib
+from typing import Optional
+
+import sly
+from sly.yacc import Parser, LRTable, YaccError
+
+# LALR分析表的缓存目录（文件按语法的哈希值命名），设为空字符串时不使用缓存
+PARSER_CACHE_DIR = os.environ.get(
+    'SQL_PARSER_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__'))
+
+
+def grammar_hash(grammar) -> str:
+    """语法（终结符、产生式及其优先级）和SLY版本的哈希值，语法改变后旧的缓存不再被使用"""
+    spec = {
+        'sly': sly.__version__,
+        'terminals': sorted(grammar.Terminals),
+        'productions': [[p.name, list(p.prod), list(p.prec)] for p in grammar.Productions],
+    }
+    return hashlib.sha256(json.dumps(spec, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def load_tables(path: str, grammar) -> Optional[LRTable]:
+    """读取缓存的分析表，文件不存在或损坏时返回None"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        lrtable = LRTable.__new__(LRTable)
+        lrtable.grammar = grammar
+        lrtable.lr_productions = grammar.Productions
+        lrtable.lr_action = {int(state): actions for state, actions in data['action'].items()}
+        lrtable.lr_goto = {int(state): gotos for state, gotos in data['goto'].items()}
+        lrtable.defaulted_states = {int(state): rule for state, rule in data['defaulted'].items()}
+        lrtable.sr_conflicts = []
+        lrtable.rr_conflicts = []
+        return lrtable
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+
+def save_tables(path: str, lrtable: LRTable):
+    """写入分析表缓存（先写临时文件再原子替换，多个进程同时写入互不影响）；目录不可写时忽略"""
+    data = {
+        'action': lrtable.lr_action,
+        'goto': lrtable.lr_goto,
+        'defaulted': lrtable.defaulted_states,
+    }
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        os.replace(tmp_path, path)
+    except OSError:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+
+
+class CachedParser(Parser):
+    """
+    LALR分析表缓存在磁盘上的SLY语法分析器基类
+    SLY在定义语法分析器类时（即导入模块时）生成分析表，这是导入的主要开销；
+    子类的语法照常构建（产生式需要绑定语义动作），分析表按语法的哈希值从缓存读取，
+    缓存不存在时生成并写入缓存
+    """
+    @classmethod
+    def _build(cls, definitions):
+        if vars(cls).get('_build', False):
+            return
+        rules = cls._Parser__collect_rules(definitions)
+        if not cls._Parser__validate_specification():
+            raise YaccError('Invalid parser specification')
+        cls._Parser__build_grammar(rules)
+
+        path = None
+        if PARSER_CACHE_DIR:
+            path = os.path.join(PARSER_CACHE_DIR,
+                                f"{cls.__name__}.{grammar_hash(cls._grammar)}.lrtable.json")
+            lrtable = load_tables(path, cls._grammar)
+            if lrtable is not None:
+                cls._lrtable = lrtable
+                return
+        if not cls._Parser__build_lrtables():
+            raise YaccError('Can\'t build parsing tables')
+        if path:
+            save_tables(path, cls._lrtable)
@@ -0,0 +1,179 @@
+import os
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    规范化SQL文本，用作缓存键
+    折叠引号外的连续空白，去掉首尾空白和结尾分号，引号内的内容保持不变
+    """
+    parts = []
+    in_quotes = False
+    quote_char = None
+    pending_space = False
+
+    for char in sql:
+        if in_quotes:
+            parts.append(char)
+            if char == quote_char:
+                in_quotes = False
+        elif char in ("'", '"'):
+            if pending_space and parts:
+                parts.append(' ')
+            pending_space = False
+            in_quotes = True
+            quote_char = char
+            parts.append(char)
+        elif char.isspace():
+            pending_space = True
+        else:
+            if pending_space and parts:
+                parts.append(' ')
+            pending_space = False
+            parts.append(char)
+
+    return ''.join(parts).rstrip(';').rstrip()
+
+
+def estimate_size(value: Any) -> int:
+    """粗略估算查询结果占用的内存字节数"""
+    size = sys.getsizeof(value)
+    if isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+    elif isinstance(value, dict):
+        for k, v in value.items():
+            size += estimate_size(k) + estimate_size(v)
+    return size
+
+
+def estimate_rows_size(rows: list) -> int:
+    """按第一行估算行列表占用的内存字节数（不逐行遍历，可以在执行过程中频繁调用）"""
+    if not rows:
+        return sys.getsizeof(rows)
+    return sys.getsizeof(rows) + len(rows) * estimate_size(rows[0])
+
+
+@dataclass
+class CacheEntry:
+    """缓存条目"""
+    result: Any
+    table_versions: Tuple[Tuple[str, int], ...]  # 填充缓存时各表的版本号
+    size: int
+
+
+class QueryCache:
+    """
+    查询结果缓存
+    以规范化后的语句文本为键，按LRU淘汰，并限制条目数和总内存。
+    每张表维护一个版本号，INSERT/UPDATE/DELETE 会递增版本号，
+    读到旧版本的条目在命中前即被判定失效。
+    """
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[str, CacheEntry]' = OrderedDict()
+        self._table_keys: Dict[str, Set[str]] = {}  # 表名 -> 依赖该表的缓存键
+        self._versions: Dict[str, int] = {}
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def table_versions(self, tables: List[str]) -> Tuple[Tuple[str, int], ...]:
+        """获取若干张表的当前版本号（执行查询之前调用）"""
+        with self._lock:
+            return tuple((t, self._versions.get(t, 0)) for t in sorted(set(tables)))
+
+    def bump_version(self, table_name: str):
+        """表被修改：递增版本号并移除依赖该表的缓存条目"""
+        with self._lock:
+            self._versions[table_name] = self._versions.get(table_name, 0) + 1
+            for key in self._table_keys.pop(table_name, set()):
+                self._remove(key)
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        """查找缓存，未命中或已失效时返回None"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            for table, version in entry.table_versions:
+                if self._versions.get(table, 0) != version:
+                    self._remove(key)
+                    self.misses += 1
+                    return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key: str, table_versions: Tuple[Tuple[str, int], ...], result: Any):
+        """
+        写入缓存
+        table_versions 必须是执行查询之前取得的版本号，
+        这样执行期间发生的写操作会让该条目立即失效
+        """
+        size = estimate_size(result)
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            # 执行期间表已被修改，结果可能不是最新的
+            for table, version in table_versions:
+                if self._versions.get(table, 0) != version:
+                    return
+
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = CacheEntry(result, table_versions, size)
+            self._total_bytes += size
+            for table, _ in table_versions:
+                self._table_keys.setdefault(table, set()).add(key)
+
+            # LRU淘汰
+            while self._entries and (len(self._entries) > self.max_entries or
+                                     self._total_bytes > self.max_bytes):
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+            self._table_keys.clear()
+            self._total_bytes = 0
+
+    def _remove(self, key: str):
+        """移除条目（调用方需持有锁）"""
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return
+        self._total_bytes -= entry.size
+        for table, _ in entry.table_versions:
+            keys = self._table_keys.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._table_keys[table]
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# 每个数据目录共享一个结果缓存：服务器和同一进程内的 DB-API 连接写入时使同一份缓存失效
+_shared_caches: Dict[str, QueryCache] = {}
+_shared_caches_lock = threading.Lock()
+
+def shared_query_cache(data_dir: str) -> QueryCache:
+    """获取数据目录对应的共享结果缓存"""
+    key = os.path.abspath(data_dir)
+    with _shared_caches_lock:
+        if key not in _shared_caches:
+            _shared_caches[key] = QueryCache()
+        return _shared_caches[key]
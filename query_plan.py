@@ -0,0 +1,85 @@
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+
+@dataclass
+class PlanNode:
+    """执行计划中的一个算子"""
+    operator: str                                           # 算子名称，如 SeqScan / NestedLoopJoin
+    detail: Dict[str, Any] = field(default_factory=dict)    # 算子参数（表名、条件等）
+    children: List['PlanNode'] = field(default_factory=list)
+    # EXPLAIN ANALYZE 实际执行统计
+    time_ms: float = 0.0
+    rows_in: int = 0
+    rows_out: int = 0
+    bytes_read: int = 0
+    executed: bool = False
+
+    def record(self, seconds: float, rows_in: int = 0, rows_out: int = 0, bytes_read: int = 0):
+        """累加一次执行统计"""
+        self.time_ms += seconds * 1000
+        self.rows_in += rows_in
+        self.rows_out += rows_out
+        self.bytes_read += bytes_read
+        self.executed = True
+
+    def to_dict(self, analyze: bool = False) -> Dict[str, Any]:
+        """转换为可JSON序列化的字典"""
+        node = {
+            'operator': self.operator,
+            'detail': self.detail,
+            'children': [child.to_dict(analyze) for child in self.children]
+        }
+        if analyze:
+            node.update({
+                'time_ms': round(self.time_ms, 3),
+                'rows_in': self.rows_in,
+                'rows_out': self.rows_out,
+                'bytes_read': self.bytes_read
+            })
+        return node
+
+    def format(self, analyze: bool = False, depth: int = 0) -> List[str]:
+        """格式化为缩进文本，每个算子一行"""
+        detail = ', '.join(f"{k}={v}" for k, v in self.detail.items())
+        line = '  ' * depth + ('-> ' if depth else '') + self.operator
+        if detail:
+            line += f" ({detail})"
+        if analyze:
+            line += (f" [time={self.time_ms:.3f}ms rows_in={self.rows_in} "
+                     f"rows_out={self.rows_out} bytes={self.bytes_read}]")
+        lines = [line]
+        for child in self.children:
+            lines.extend(child.format(analyze, depth + 1))
+        return lines
+
+
+@dataclass
+class SelectPlan:
+    """SELECT语句的执行计划，保存各算子的引用以便执行时记录统计"""
+    root: PlanNode
+    scans: Dict[str, PlanNode] = field(default_factory=dict)   # 表名 -> 扫描算子
+    joins: Dict[str, PlanNode] = field(default_factory=dict)   # 被连接的表名 -> 连接算子
+    filter: Optional[PlanNode] = None                          # 连接后的过滤算子
+    project: Optional[PlanNode] = None
+
+    def to_result(self, analyze: bool = False, total_time_ms: float = None) -> Dict[str, Any]:
+        """EXPLAIN 语句的返回结果"""
+        result = {
+            'analyze': analyze,
+            'plan': self.root.to_dict(analyze),
+            'text': '\n'.join(self.root.format(analyze))
+        }
+        if total_time_ms is not None:
+            result['total_time_ms'] = round(total_time_ms, 3)
+        return result
+
+
+def format_conditions(conditions) -> str:
+    """将条件列表格式化为文本"""
+    text = ''
+    for i, cond in enumerate(conditions):
+        if i:
+            text += f" {conditions[i - 1].logic_op} "
+        text += f"{cond.column} {cond.operator} {cond.value}"
+    return text
@@ -0,0 +1,174 @@
+import os
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from mvcc import CommitLog, ROWID_COLUMN, XMIN_COLUMN, XMAX_COLUMN, read_versions
+from storage import SCHEMA_FILE, get_storage, fsync_directory
+
+# 检查点文件（位于数据目录下），记录崩溃恢复时开始重放预写日志的LSN
+CHECKPOINT_FILE = '_checkpoint'
+
+# 距上次检查点的日志超过该字节数时做检查点（崩溃恢复最多需要重放这么多日志）
+CHECKPOINT_WAL_BYTES = 16 * 1024 * 1024
+
+# 有新日志时两次检查点之间的最长间隔（秒）
+CHECKPOINT_INTERVAL = 60.0
+
+
+@dataclass
+class RecoveryStats:
+    """一次崩溃恢复的统计信息"""
+    start_lsn: int = 0                                  # 重做起点
+    end_lsn: int = 0                                    # 最后一条完整日志记录的LSN
+    records: int = 0                                    # 重放的日志记录数
+    tables: List[str] = field(default_factory=list)     # 需要在恢复后落盘的表
+    redone: List[str] = field(default_factory=list)     # 按日志补齐了数据的表
+    seconds: float = 0.0
+
+    @property
+    def log_bytes(self) -> int:
+        """重放的日志字节数"""
+        return self.end_lsn - self.start_lsn
+
+
+@dataclass
+class _TableRedo:
+    """一张表需要重做的修改：最后一次重写的日志记录，以及之后按日志顺序的追加（insert）和修改（modify）记录"""
+    rewrite: Optional[Dict[str, Any]] = None
+    records: List[Dict[str, Any]] = field(default_factory=list)
+
+    @property
+    def appends_only(self) -> bool:
+        return self.rewrite is None and all(record['type'] == 'insert' for record in self.records)
+
+
+def read_checkpoint(db_path: str) -> Optional[Dict[str, Any]]:
+    """读取检查点文件，不存在时返回None"""
+    try:
+        with open(os.path.join(db_path, CHECKPOINT_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def write_checkpoint(db_path: str, redo_lsn: int):
+    """原子地写入检查点文件"""
+    path = os.path.join(db_path, CHECKPOINT_FILE)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'redo_lsn': redo_lsn, 'time': time.time()}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    fsync_directory(db_path)
+
+
+def _redo_table(table_dir: str, redo: _TableRedo, clog: CommitLog) -> bool:
+    """按日志补齐一张表的数据文件，返回是否写入了数据"""
+    # 建表不写日志，表结构文件不存在时没有可以补齐的表
+    if not os.path.exists(os.path.join(table_dir, SCHEMA_FILE)):
+        return False
+    storage = get_storage(table_dir)
+    if not redo.appends_only:
+        return _replay_table(storage, redo)
+
+    header = storage.header()
+    if ROWID_COLUMN not in header:
+        return False
+    rowid_index, xmin_index = header.index(ROWID_COLUMN), header.index(XMIN_COLUMN)
+    rows = [row for record in redo.records for row in record['rows'] if len(row) == len(header)]
+    positions = {(row[rowid_index], row[xmin_index]): i for i, row in enumerate(rows)}
+    storage.discard_torn_tail()
+    # 追加按日志顺序进行，数据文件中已有的是这些行的一个前缀，之后可能还有日志未落盘的
+    # 未提交事务写入的行。从文件末尾向前找到第一个出现在日志中的行；
+    # 遇到已提交的行说明日志中的行都不在文件中
+    for row in storage.reverse_scan():
+        position = positions.get((row[rowid_index], row[xmin_index]))
+        if position is not None:
+            rows = rows[position + 1:]
+            break
+        if clog.is_committed(int(row[xmin_index])):
+            break
+    if rows:
+        with storage.appender() as appender:
+            appender.write(rows)
+    return bool(rows)
+
+
+def _replay_table(storage, redo: _TableRedo) -> bool:
+    """
+    从最后一次重写记录（没有时为数据文件）中的行版本开始，按日志顺序重放之后的追加和修改，再整体重写数据文件
+    数据文件中可能已有其中一部分修改，重放是幂等的：追加的行版本按 (行ID, 创建事务) 去重，
+    删除标记（xmax 置为记录所属的事务）按日志顺序重复设置，结果与原来相同
+    """
+    codec = None
+    if redo.rewrite is not None:
+        header = redo.rewrite['headers']
+        versions = redo.rewrite['rows']
+        codec = redo.rewrite.get('compression')
+    else:
+        storage.discard_torn_tail()
+        header = storage.header()
+        if ROWID_COLUMN not in header:
+            return False
+        versions = read_versions(storage)[1]
+    rowid_index, xmin_index = header.index(ROWID_COLUMN), header.index(XMIN_COLUMN)
+    xmax_index = header.index(XMAX_COLUMN)
+    index = {(row[rowid_index], row[xmin_index]): row for row in versions}
+    for record in redo.records:
+        xid = str(record['txid'])
+        for key in record.get('deleted', ()):
+            row = index.get(tuple(key))
+            if row is not None:
+                row[xmax_index] = xid
+        for row in record['rows']:
+            key = (row[rowid_index], row[xmin_index])
+            if len(row) == len(header) and key not in index:
+                index[key] = row
+                versions.append(row)
+    storage.rewrite(header, versions, codec)
+    return True
+
+
+def recover(db_path: str, wal, clog: CommitLog) -> RecoveryStats:
+    """
+    崩溃恢复：从检查点记录的重做起点开始重放预写日志
+    - 提交记录补到提交日志中
+    - 数据文件的修改在提交时不落盘（由检查点落盘），系统崩溃时重做起点之后的修改可能丢失：
+      只有追加时，按版本列（行ID、创建事务）找到数据文件中已有的最后一行，只追加它之后的行；
+      有 UPDATE/DELETE 的修改记录或重写记录时，从最后一次重写记录（或数据文件）开始按日志顺序重放后整体重写。
+      未提交事务的行版本同样重做，它们对快照不可见
+    没有检查点文件时（旧版本留下的日志）只补提交记录，并把所有表交给恢复后的检查点落盘
+    """
+    started = time.monotonic()
+    checkpoint = read_checkpoint(db_path)
+    start_lsn = wal.start_lsn if checkpoint is None else checkpoint['redo_lsn']
+    stats = RecoveryStats(start_lsn=start_lsn, end_lsn=start_lsn)
+    changes: Dict[str, _TableRedo] = {}
+    for lsn, record in wal.read_records(start_lsn):
+        stats.records += 1
+        stats.end_lsn = lsn
+        kind = record.get('type')
+        if kind == 'commit':
+            clog.mark_committed(record['txid'])
+        elif checkpoint is None:
+            continue
+        elif kind == 'rewrite':
+            changes[record['table']] = _TableRedo(rewrite=record)
+        elif kind in ('insert', 'modify'):
+            changes.setdefault(record['table'], _TableRedo()).records.append(record)
+    # 丢弃崩溃时写到一半的记录，之后的新记录紧接在最后一条完整记录后面
+    wal.truncate(stats.end_lsn)
+
+    if checkpoint is None:
+        stats.tables = sorted(name for name in os.listdir(db_path)
+                              if os.path.isdir(os.path.join(db_path, name)))
+    else:
+        stats.tables = sorted(changes)
+        for table_name in stats.tables:
+            if _redo_table(os.path.join(db_path, table_name), changes[table_name], clog):
+                stats.redone.append(table_name)
+    stats.seconds = time.monotonic() - started
+    return stats
@@ -1,152 +1,644 @@
-from flask import Flask, request, jsonify, render_template
-from sql_parser import SQLLexer, SQLParser
-from sql_executor import SQLExecutor
+from sql_parser import SQLParser, SQLError, SelectStatement, PrepareStatement, ExecuteStatement
+from sql_scanner import ScannedStatement, scan_script, scan_statement
+from sql_executor import SQLExecutor, batched
+from spill import MemoryBudget
+from query_cache import normalize_sql, shared_query_cache
+from cursors import Cursor, CursorManager
+from session import Session, SessionManager
+from db_manager import Transaction, get_db_manager
+from tracing import Trace, tracer, INFO, DEBUG, ERROR
+from metrics import (REGISTRY, StatementStats, CONTENT_TYPE as METRICS_CONTENT_TYPE,
+                     render as render_metrics, statement_kind)
+from slow_log import SlowQueryLog, SlowQueryRecord, QueryTiming, SLOW_LOG_FILE, fingerprint
+from statement_cache import StatementCache, count_placeholders, to_literal
+from typing import Iterable, Iterator, Optional
+from itertools import chain
+from datetime import datetime
 import os
+import json
+import time
 
 
-app = Flask(__name__)
+# 默认数据目录
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# 查询结果缓存和语句缓存，跨请求共享；结果缓存与同一进程内的 DB-API 连接共用
+query_cache = shared_query_cache(DATA_DIR)
+statement_cache = StatementCache()
+
+# 流式响应每批的结果行数；结果行数不超过上限时同时写入结果缓存
+STREAM_BATCH_ROWS = 500
+STREAM_CACHE_MAX_ROWS = 10000
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# 服务器端游标，空闲游标由后台线程定期清理
+cursor_manager = CursorManager()
+cursor_manager.start_reaper()
+DEFAULT_FETCH_ROWS = 500
+
+# 客户端会话（跨请求的事务），空闲会话由后台线程定期关闭
+session_manager = SessionManager(DATA_DIR, query_cache=query_cache,
+                                 statement_cache=statement_cache)
+session_manager.start_reaper()
+
+# 慢查询日志（阈值由环境变量 SQL_SLOW_QUERY_MS 设置，默认不记录）
+slow_query_log = SlowQueryLog(os.path.join(DATA_DIR, SLOW_LOG_FILE))
+
+# 解析指标（执行相关的指标由执行器记录）
+PARSE_DURATION = REGISTRY.histogram('minidb_parse_duration_seconds', '词法和语法分析耗时（解析缓存未命中时）')
+PARSE_ERRORS = REGISTRY.counter('minidb_parse_errors_total', '词法或语法错误的语句数')
+
+def _ratio(hits: int, misses: int) -> float:
+    total = hits + misses
+    return hits / total if total else 0.0
+
+def collect_metrics() -> list:
+    """/metrics 抓取时读取缓存、事务、锁、会话和游标已有的统计"""
+    db_manager = get_db_manager(DATA_DIR)
+    lock_manager = db_manager.lock_manager
+    sessions = session_manager.stats()
+    cursors = cursor_manager.stats()
+    return [
+        ('minidb_query_cache_hits_total', 'counter', '结果缓存命中次数', query_cache.hits),
+        ('minidb_query_cache_misses_total', 'counter', '结果缓存未命中次数', query_cache.misses),
+        ('minidb_query_cache_hit_ratio', 'gauge', '结果缓存命中率（启动以来）',
+         _ratio(query_cache.hits, query_cache.misses)),
+        ('minidb_statement_cache_hits_total', 'counter', '解析缓存命中次数', statement_cache.hits),
+        ('minidb_statement_cache_misses_total', 'counter', '解析缓存未命中次数', statement_cache.misses),
+        ('minidb_statement_cache_hit_ratio', 'gauge', '解析缓存命中率（启动以来）',
+         _ratio(statement_cache.hits, statement_cache.misses)),
+        ('minidb_active_transactions', 'gauge', '活动事务数', db_manager.active_transaction_count()),
+        ('minidb_lock_waits_total', 'counter', '需要等待的加锁次数', lock_manager.waits),
+        ('minidb_deadlocks_total', 'counter', '检测到的死锁次数', lock_manager.deadlocks),
+        ('minidb_lock_escalations_total', 'counter', '行锁升级为表锁的次数', lock_manager.escalations),
+        ('minidb_checkpoints_total', 'counter', '完成的检查点次数', db_manager.checkpoint_count),
+        ('minidb_sessions_open', 'gauge', '打开的会话数', sessions['open']),
+        ('minidb_sessions_in_transaction', 'gauge', '处于事务中的会话数', sessions['in_transaction']),
+        ('minidb_cursors_open', 'gauge', '打开的游标数', cursors['open']),
+        ('minidb_cursor_bytes', 'gauge', '游标占用的内存估计（字节）', cursors['bytes']),
+        ('minidb_slow_queries_total', 'counter', '写入慢查询日志的语句数', slow_query_log.logged),
+        ('minidb_slow_queries_dropped_total', 'counter', '写入队列已满而丢弃的慢查询记录数',
+         slow_query_log.dropped),
+    ]
+
+REGISTRY.add_collector(collect_metrics)
 
 def split_sql_statements(sql: str) -> list:
     """
     分割SQL语句，同时保持语句的完整性
     支持可选的分号结尾
     """
-    # 移除所有换行符，替换为空格
-    sql = sql.replace('\n', ' ').replace('\r', ' ')
-    
-    # 使用正则表达式分割语句，保持分号
-    statements = []
-    current_stmt = ''
-    in_quotes = False
-    quote_char = None
-    
-    for char in sql:
-        if char in ["'", '"']:
-            if not in_quotes:
-                in_quotes = True
-                quote_char = char
-            elif quote_char == char:
-                in_quotes = False
-            current_stmt += char
-        elif char == ';' and not in_quotes:
-            current_stmt = current_stmt.strip()
-            if current_stmt:
-                statements.append(current_stmt)
-            current_stmt = ''
-        else:
-            current_stmt += char
-    
-    # 添加最后一个语句（如果有的话）
-    current_stmt = current_stmt.strip()
-    if current_stmt:
-        statements.append(current_stmt)
-    
-    # 如果没有语句，返回原始SQL作为单个语句
-    if not statements and sql.strip():
-        statements.append(sql.strip())
-    
-    return statements
-
-@app.route('/')
-def index():
-    return render_template('a.html')
-
-@app.route('/execute', methods=['POST'])
-def execute_sql():
-    sql = request.json.get('sql', '')
-    print(f"\n收到SQL语句: {sql}")
-    
+    return [statement.text for statement in scan_script(sql)]
+
+def parse_statement(stmt: str, parser: SQLParser, cache_key: str = None,
+                    scanned: Optional[ScannedStatement] = None, trace: Optional[Trace] = None):
+    """
+    解析单条语句，优先使用解析缓存
+    scanned 为分割语句时得到的词法分析结果，为空时对 stmt 做词法分析
+    返回语法树，语法错误时返回None
+    """
+    if cache_key is None:
+        cache_key = normalize_sql(stmt)
+    parsed_stmt = statement_cache.get_parsed(cache_key)
+    if parsed_stmt is not None:
+        return parsed_stmt
+
+    # 词法分析
+    start = time.perf_counter()
+    if scanned is None:
+        scanned = scan_statement(stmt)
+    tokens = list(scanned.iter_tokens())
+    if trace is not None and trace.enabled(DEBUG):
+        trace.event(DEBUG, '词法分析结果', statement=stmt,
+                    tokens=[(token.type, token.value) for token in tokens])
+
+    # 语法分析
+    parsed_stmt = parser.parse(iter(tokens))
+    PARSE_DURATION.observe(time.perf_counter() - start)
+    if parsed_stmt is None:
+        return None
+    if not isinstance(parsed_stmt, PrepareStatement) and count_placeholders(parsed_stmt):
+        raise SQLError("参数占位符 ? 只能用于预编译语句")
+
+    statement_cache.put_parsed(cache_key, parsed_stmt)
+    return parsed_stmt
+
+def start_trace(trace_level: Optional[str] = None) -> Trace:
+    """开始一个请求的跟踪；trace_level 为请求单独指定的级别（如 'debug'），级别无效时抛出 ValueError"""
+    return tracer.start(trace_level)
+
+def stream_statements(sql: str, cursor_page_size: Optional[int] = None,
+                      session_id: Optional[str] = None, describe: bool = False,
+                      trace_level: Optional[str] = None) -> Iterator[dict]:
+    """
+    解析并执行以分号分隔的多条语句，以事件的形式逐步产生结果，遇到错误立即停止：
+    - {'type': 'statement', 'index': 序号, 'statement': 语句}   每条语句开始
+    - {'type': 'columns', 'columns': [(列名, 类型), ...]}       SELECT 的结果列（describe 为True时）
+    - {'type': 'rows', 'rows': [...]}                           SELECT 的一批结果行
+    - {'type': 'cursor', 'cursor': 游标ID}                       游标模式下SELECT还有剩余结果
+    - {'type': 'result', 'result': 结果}                        其他语句的结果
+    - {'type': 'error', 'result': 错误信息}                     出错（之前没有 statement 事件时为整体错误）
+    - {'type': 'done', 'success': 是否全部成功}                 结束（记录了跟踪时带有 'trace': 跟踪ID）
+    SELECT 边执行边返回，服务器不需要在内存中保存完整的结果集；
+    指定 cursor_page_size 时每个SELECT只返回第一页并打开服务器端游标（不使用结果缓存），
+    之后通过 fetch_cursor 继续获取；
+    指定 session_id 时使用会话的执行器，BEGIN 开始的事务可以在之后的请求中 COMMIT；
+    不使用会话时，请求结束时仍未提交的事务会被回滚；
+    trace_level 指定时按该级别记录这个请求的跟踪（见 tracing.py）
+    """
     try:
-        # 分割SQL语句
-        statements = split_sql_statements(sql)
-        if not statements:
-            return jsonify({
-                'success': False,
-                'result': "错误: 没有找到有效的SQL语句"
-            })
-        
-        # 创建词法分析器和解析器实例
-        lexer = SQLLexer()
-        parser = SQLParser()
-        
-        # 创建SQL执行器（使用默认数据目录）
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        data_dir = os.path.join(current_dir, 'data')
-        executor = SQLExecutor(data_dir)
-        
-        # 存储所有语句的执行结果
-        results = []
-        
+        trace = start_trace(trace_level)
+    except ValueError as e:
+        yield {'type': 'error', 'result': str(e)}
+        yield {'type': 'done', 'success': False}
+        return
+    trace.event(INFO, '收到SQL语句', sql=sql)
+
+    # 分割SQL语句，同时完成词法分析；边执行边分割，之后的语句在执行到时才扫描
+    statements = scan_script(sql)
+    first = next(statements, None)
+    if first is None:
+        tracer.finish(trace)
+        yield {'type': 'error', 'result': "错误: 没有找到有效的SQL语句"}
+        yield {'type': 'done', 'success': False}
+        return
+    yield from stream_parsed(((stmt.text, None, stmt) for stmt in chain([first], statements)),
+                             cursor_page_size, session_id, describe, trace)
+
+def stream_prepared(statement_id: str, params: list, session_id: Optional[str] = None,
+                    describe: bool = False) -> Iterator[dict]:
+    """绑定参数执行预编译语句，不经过词法和语法分析，事件格式与 stream_statements 相同"""
+    try:
+        parsed_stmt = ExecuteStatement(statement_id, [to_literal(v) for v in params])
+    except Exception as e:
+        yield {'type': 'error', 'result': str(e)}
+        yield {'type': 'done', 'success': False}
+        return
+    yield from stream_parsed([(f"EXECUTE {statement_id}", parsed_stmt, None)], None, session_id,
+                             describe)
+
+def stream_parsed(statements: Iterable[tuple], cursor_page_size: Optional[int] = None,
+                  session_id: Optional[str] = None, describe: bool = False,
+                  trace: Optional[Trace] = None) -> Iterator[dict]:
+    """
+    依次执行 [(语句文本, 语法树, 词法分析结果), ...]，语法树为None的语句先查询结果缓存再解析，
+    参数和事件格式见 stream_statements；trace 为空时按全局采样设置开始新的跟踪
+    """
+    if trace is None:
+        trace = start_trace()
+    done = {'type': 'done', 'success': False}
+    if trace.sampled:
+        done['trace'] = trace.trace_id
+    session = None
+    executor = None
+    try:
+        if session_id:
+            # 会话的执行器和分析器跨请求复用
+            candidate = session_manager.get(session_id)
+            candidate.acquire()
+            session = candidate
+            parser, executor = session.parser, session.executor
+        else:
+            # 创建解析器实例
+            parser = SQLParser()
+
+            # 创建SQL执行器（使用默认数据目录）
+            executor = SQLExecutor(DATA_DIR, query_cache=query_cache,
+                                   statement_cache=statement_cache)
+        executor.trace = trace
+
         # 解析并执行每个语句，遇到错误立即停止
-        for stmt in statements:
+        for index, (stmt, parsed_stmt, scanned) in enumerate(statements):
+            trace.event(INFO, '语句开始', index=index, statement=stmt)
+            yield {'type': 'statement', 'index': index, 'statement': stmt}
+            if session is not None:
+                session.statements += 1
+            timing = QueryTiming(time.perf_counter())
+            executor.stats = StatementStats()
+            params = parsed_stmt.params if isinstance(parsed_stmt, ExecuteStatement) else None
+            # 事务中的查询可能看到本事务未提交的修改，不读写共享的结果缓存；
+            # 预编译语句的结果随参数变化，也不使用结果缓存；打开详细跟踪时需要实际执行
+            use_cache = (cursor_page_size is None and executor.transaction is None and
+                         parsed_stmt is None and not trace.enabled(DEBUG))
+            cache_key = None
             try:
-                # 词法分析
-                tokens = list(lexer.tokenize(stmt))
-                print(f"\n语句 '{stmt}' 的词法分析结果:")
-                for token in tokens:
-                    print(f"Token: {token.type}, Value: {token.value}")
-                
-                # 语法分析
-                parsed_stmt = parser.parse(iter(tokens))
                 if parsed_stmt is None:
-                    results.append({
-                        'statement': stmt,
-                        'success': False,
-                        'result': "语法错误"
-                    })
-                    # 遇到错误立即返回所有结果
-                    return jsonify({
-                        'success': False,
-                        'result': results
-                    })
-                
-                # 执行语句
-                try:
+                    # 先查询结果缓存，命中则跳过解析和执行
+                    cache_key = normalize_sql(stmt)
+                    cached = query_cache.get(cache_key) if use_cache else None
+                    if cached is not None:
+                        if describe:
+                            parsed_stmt = parse_statement(stmt, parser, cache_key, scanned, trace)
+                            yield {'type': 'columns', 'columns': executor.describe(parsed_stmt)}
+                        trace.event(INFO, '语句结束', index=index, cached=True, rows=len(cached.result))
+                        executor.stats.rows_returned = len(cached.result)
+                        for batch in batched(cached.result, STREAM_BATCH_ROWS):
+                            paused = time.perf_counter()
+                            yield {'type': 'rows', 'rows': batch}
+                            timing.serialize += time.perf_counter() - paused
+                        log_slow_query(stmt, parsed_stmt, executor, timing, trace=trace,
+                                       session_id=session_id)
+                        continue
+
+                    # 词法分析和语法分析
+                    parse_start = time.perf_counter()
+                    try:
+                        parsed_stmt = parse_statement(stmt, parser, cache_key, scanned, trace)
+                    finally:
+                        timing.parse = time.perf_counter() - parse_start
+                    if parsed_stmt is None:
+                        PARSE_ERRORS.inc()
+                        trace.event(INFO, '语句出错', index=index, error="语法错误")
+                        log_slow_query(stmt, None, executor, timing, error="语法错误", trace=trace,
+                                       session_id=session_id)
+                        yield {'type': 'error', 'result': "语法错误"}
+                        yield done
+                        return
+                elif isinstance(parsed_stmt, ExecuteStatement):
+                    parsed_stmt = executor.prepared_statements.get(parsed_stmt.name).bind(parsed_stmt.params)
+            except Exception as e:
+                PARSE_ERRORS.inc()
+                trace.event(INFO, '语句出错', index=index, error=f"语法分析错误: {str(e)}")
+                log_slow_query(stmt, None, executor, timing, params, f"语法分析错误: {str(e)}", trace,
+                               session_id)
+                yield {'type': 'error', 'result': f"语法分析错误: {str(e)}"}
+                yield done
+                return
+
+            # 执行语句；结果事件交给调用方后暂停的时间（编码和发送结果）计为序列化耗时
+            try:
+                if isinstance(parsed_stmt, SelectStatement) and describe:
+                    yield {'type': 'columns', 'columns': executor.describe(parsed_stmt)}
+                if cursor_page_size is not None and isinstance(parsed_stmt, SelectStatement):
+                    cursor = open_cursor(parsed_stmt, executor.transaction, trace)
+                    rows, exhausted = cursor_manager.fetch(cursor.cursor_id, cursor_page_size)
+                    paused = time.perf_counter()
+                    yield {'type': 'rows', 'rows': rows}
+                    timing.serialize += time.perf_counter() - paused
+                    if not exhausted:
+                        yield {'type': 'cursor', 'cursor': cursor.cursor_id}
+                elif isinstance(parsed_stmt, SelectStatement):
+                    # 执行前记录表版本号，执行期间发生的写操作会使缓存条目失效；
+                    # 结果不太大时顺便填充结果缓存
+                    table_versions = query_cache.table_versions(parsed_stmt.tables)
+                    cached_rows = [] if use_cache else None
+                    for batch in batched(executor.stream_select(parsed_stmt), STREAM_BATCH_ROWS):
+                        if cached_rows is not None:
+                            cached_rows.extend(batch)
+                            if len(cached_rows) > STREAM_CACHE_MAX_ROWS:
+                                cached_rows = None
+                        paused = time.perf_counter()
+                        yield {'type': 'rows', 'rows': batch}
+                        timing.serialize += time.perf_counter() - paused
+                    if cached_rows is not None:
+                        query_cache.put(cache_key, table_versions, cached_rows)
+                else:
                     result = executor.execute([parsed_stmt])
-                    results.append({
-                        'statement': stmt,
-                        'success': True,
-                        'result': result[0]['result'] if result else None
-                    })
-                except Exception as e:
-                    results.append({
-                        'statement': stmt,
-                        'success': False,
-                        'result': str(e)
-                    })
-                    # 遇到执行错误立即返回所有结果
-                    return jsonify({
-                        'success': False,
-                        'result': results
-                    })
-                    
+                    paused = time.perf_counter()
+                    yield {'type': 'result', 'result': result[0]['result'] if result else None}
+                    timing.serialize += time.perf_counter() - paused
             except Exception as e:
-                results.append({
-                    'statement': stmt,
-                    'success': False,
-                    'result': f"语法分析错误: {str(e)}"
-                })
-                # 遇到解析错误立即返回所有结果
-                return jsonify({
-                    'success': False,
-                    'result': results
-                })
-        
+                trace.event(INFO, '语句出错', index=index, error=str(e))
+                log_slow_query(stmt, parsed_stmt, executor, timing, params, str(e), trace, session_id)
+                yield {'type': 'error', 'result': str(e)}
+                yield done
+                return
+            trace.event(INFO, '语句结束', index=index, rows_scanned=executor.stats.rows_scanned,
+                        rows_returned=executor.stats.rows_returned,
+                        rows_written=executor.stats.rows_written)
+            log_slow_query(stmt, parsed_stmt, executor, timing, params, trace=trace, session_id=session_id)
+
         # 所有语句执行成功
-        return jsonify({
-            'success': True,
-            'result': results
-        })
-            
+        done['success'] = True
+        yield done
+
     except Exception as e:
-        print(f"\n执行过程发生异常: {str(e)}")
         import traceback
-        print("\n详细错误信息:")
-        print(traceback.format_exc())
-        return jsonify({
+        trace.event(ERROR, '执行过程发生异常', error=str(e), traceback=traceback.format_exc())
+        yield {'type': 'error', 'result': f"执行错误: {str(e)}"}
+        yield done
+
+    finally:
+        tracer.finish(trace)
+        if executor is not None:
+            executor.trace = None
+        if session is not None:
+            session.release()
+        elif executor is not None and executor.transaction is not None:
+            executor.transaction.rollback()
+            executor.transaction = None
+
+def log_slow_query(stmt: str, parsed_stmt, executor: SQLExecutor, timing: QueryTiming,
+                   params: Optional[list] = None, error: Optional[str] = None,
+                   trace: Optional[Trace] = None, session_id: Optional[str] = None):
+    """
+    语句耗时超过阈值时写入慢查询日志；指纹和执行计划只为慢语句计算
+    params 为预编译语句绑定的参数，为空时取语句文本中的字面量
+    """
+    seconds = timing.elapsed()
+    if not slow_query_log.is_slow(seconds):
+        return
+    digest, normalized, literals = fingerprint(stmt)
+    plan = None
+    if error is None and parsed_stmt is not None:
+        try:
+            plan = executor.plan_text(parsed_stmt)
+        except Exception:
+            pass
+    stats = executor.stats
+    execute = max(0.0, seconds - timing.parse - timing.serialize)
+    slow_query_log.log(SlowQueryRecord(
+        time=datetime.now().isoformat(timespec='milliseconds'),
+        fingerprint=digest,
+        statement=normalized,
+        params=literals if params is None else params,
+        # 命中结果缓存时没有语法树（只有SELECT会被缓存），语法错误时类型未知
+        statement_type=(statement_kind(parsed_stmt) if parsed_stmt is not None
+                        else 'select' if error is None else 'unknown'),
+        duration_ms=round(seconds * 1000, 3),
+        parse_ms=round(timing.parse * 1000, 3),
+        execute_ms=round(execute * 1000, 3),
+        serialize_ms=round(timing.serialize * 1000, 3),
+        rows_scanned=stats.rows_scanned,
+        rows_returned=stats.rows_returned,
+        rows_written=stats.rows_written,
+        bytes_read=stats.bytes_read,
+        peak_memory_bytes=stats.peak_memory,
+        spilled_bytes=stats.spilled_bytes,
+        plan=plan,
+        error=error,
+        trace=trace.trace_id if trace is not None and trace.sampled else None,
+        session=session_id
+    ))
+
+def open_cursor(stmt: SelectStatement, transaction: Optional[Transaction] = None,
+                trace: Optional[Trace] = None) -> Cursor:
+    """
+    为SELECT语句打开服务器端游标
+    游标直接持有边读边返回的结果生成器（以及语句快照），因此使用独立的执行器；
+    多表连接在打开游标时完成，结果受每条查询的内存预算限制（超出部分在临时文件中），
+    留在内存中的大小计入游标内存；在事务中打开的游标使用事务的快照；
+    trace 只用于多表连接（单表查询的结果在请求结束后仍会被读取）
+    """
+    executor = SQLExecutor(DATA_DIR, query_cache=query_cache,
+                           statement_cache=statement_cache)
+    executor.transaction = transaction
+    if len(stmt.tables) == 1:
+        return cursor_manager.open(executor.stream_select(stmt))
+    executor.trace = trace
+    budget = MemoryBudget(executor.memory_limit)
+    rows = executor.stream_select(stmt, budget)
+    first = next(rows, None)
+    executor.trace = None
+    if first is None:
+        return cursor_manager.open(iter(()))
+    return cursor_manager.open(_resume(first, rows), budget.used)
+
+def _resume(first: list, rows: Iterator[list]) -> Iterator[list]:
+    """先返回已读出的第一行再继续迭代；被关闭时同时关闭原来的生成器（删除临时文件、释放快照）"""
+    try:
+        yield first
+        yield from rows
+    finally:
+        rows.close()
+
+def fetch_cursor(cursor_id: str, n: int) -> dict:
+    """从游标继续获取至多 n 行；读完后游标自动关闭，返回的 cursor 为None"""
+    try:
+        rows, exhausted = cursor_manager.fetch(cursor_id, n)
+        return {
+            'success': True,
+            'result': rows,
+            'cursor': None if exhausted else cursor_id
+        }
+    except Exception as e:
+        return {
+            'success': False,
+            'result': str(e)
+        }
+
+def close_cursor(cursor_id: str) -> dict:
+    """提前关闭游标"""
+    if cursor_manager.close(cursor_id):
+        return {'success': True, 'result': f"游标 {cursor_id} 已关闭"}
+    return {'success': False, 'result': f"游标 {cursor_id} 不存在或已过期"}
+
+def execute_statements(sql: str, cursor_page_size: Optional[int] = None,
+                       session_id: Optional[str] = None, trace_level: Optional[str] = None) -> dict:
+    """
+    解析并执行多条语句，返回完整的响应内容（Flask和异步服务器共用）
+    记录了跟踪时响应中带有 trace（跟踪ID），之后通过 /traces?id=<跟踪ID> 查看
+    """
+    results = []
+    for event in stream_statements(sql, cursor_page_size, session_id, trace_level=trace_level):
+        kind = event['type']
+        if kind == 'statement':
+            results.append({'statement': event['statement'], 'success': True, 'result': []})
+        elif kind == 'rows':
+            results[-1]['result'].extend(event['rows'])
+        elif kind == 'result':
+            results[-1]['result'] = event['result']
+        elif kind == 'cursor':
+            results[-1]['cursor'] = event['cursor']
+        elif kind == 'error':
+            if not results:
+                return {'success': False, 'result': event['result']}
+            results[-1]['success'] = False
+            results[-1]['result'] = event['result']
+        elif kind == 'done':
+            response = {'success': event['success'], 'result': results}
+            if 'trace' in event:
+                response['trace'] = event['trace']
+            return response
+    return {'success': False, 'result': results}
+
+def requested_page_size(data: dict) -> Optional[int]:
+    """请求中 "cursor": true 表示打开游标，"page_size" 为第一页的行数"""
+    if not data.get('cursor'):
+        return None
+    return int(data.get('page_size', DEFAULT_FETCH_ROWS))
+
+def ndjson_stream(sql: str, session_id: Optional[str] = None,
+                  trace_level: Optional[str] = None) -> Iterator[str]:
+    """以NDJSON格式（每行一个JSON对象）输出 stream_statements 的事件"""
+    for event in stream_statements(sql, session_id=session_id, trace_level=trace_level):
+        yield json.dumps(event, ensure_ascii=False) + '\n'
+
+def get_traces(trace_id: Optional[str] = None, limit: int = 20) -> dict:
+    """指定 trace_id 时返回该跟踪的所有事件，否则返回环形缓冲区中最近的跟踪概要"""
+    if trace_id:
+        trace = tracer.get(trace_id)
+        if trace is None:
+            return {'success': False, 'result': f"跟踪 {trace_id} 不存在或已被覆盖"}
+        return {'success': True, 'result': trace.to_dict()}
+    return {'success': True, 'tracer': tracer.stats(),
+            'result': [trace.summary() for trace in tracer.recent(limit)]}
+
+def open_session() -> dict:
+    """创建会话，之后的 /execute 请求带上会话ID即可跨请求使用事务"""
+    try:
+        session = session_manager.open()
+        return {'success': True, 'session': session.session_id}
+    except Exception as e:
+        return {'success': False, 'result': str(e)}
+
+def close_session(session_id: str) -> dict:
+    """关闭会话，未提交的事务会被回滚"""
+    if session_manager.close(session_id):
+        return {'success': True, 'result': f"会话 {session_id} 已关闭"}
+    return {'success': False, 'result': f"会话 {session_id} 不存在或已过期"}
+
+def _acquire_session(session_id: Optional[str]) -> Session:
+    """取得并占用预编译语句所属的会话"""
+    if not session_id:
+        raise SQLError("预编译语句属于会话：请先通过 /session 创建会话，并在请求中带上 session")
+    session = session_manager.get(session_id)
+    session.acquire()
+    return session
+
+def prepare_statement(sql: str, session_id: Optional[str] = None) -> dict:
+    """
+    在会话中预编译语句，返回语句ID，之后通过 /execute_prepared 在同一会话中绑定参数执行
+    语句只对该会话可见，会话关闭时释放
+    """
+    session = None
+    try:
+        session = _acquire_session(session_id)
+        statements = split_sql_statements(sql)
+        if len(statements) != 1:
+            return {
+                'success': False,
+                'result': "错误: 每次只能预编译一条SQL语句"
+            }
+
+        stmt = statements[0]
+        statement_id = StatementCache.statement_id(stmt)
+        parsed_stmt = parse_statement(f"PREPARE {statement_id} AS {stmt}", session.parser)
+        if parsed_stmt is None:
+            return {'success': False, 'result': "语法错误"}
+
+        prepared = session.executor.prepared_statements.prepare(statement_id, parsed_stmt.statement)
+        return {
+            'success': True,
+            'statement_id': statement_id,
+            'param_count': prepared.param_count
+        }
+
+    except Exception as e:
+        return {
             'success': False,
-            'result': f"执行错误: {str(e)}"
-        })
+            'result': f"预编译错误: {str(e)}"
+        }
+    finally:
+        if session is not None:
+            session.release()
+
+def execute_prepared_statement(statement_id: str, params: list, session_id: Optional[str] = None) -> dict:
+    """在预编译语句所属的会话中绑定参数执行"""
+    timing = QueryTiming(time.perf_counter())
+    session = None
+    executor = None
+    bound_stmt = None
+    literals = None
+    try:
+        session = _acquire_session(session_id)
+        # 热路径上只做参数绑定，不再进行词法和语法分析
+        prepared = session.executor.prepared_statements.get(statement_id)
+        literals = [to_literal(v) for v in params]
+        bound_stmt = prepared.bind(literals)
+
+        executor = session.executor
+        session.statements += 1
+        result = executor.execute([bound_stmt])
+        log_slow_query(f"EXECUTE {statement_id}", bound_stmt, executor, timing, literals,
+                       session_id=session_id)
+        return {
+            'success': True,
+            'result': result[0]['result'] if result else None
+        }
+
+    except Exception as e:
+        if executor is not None:
+            log_slow_query(f"EXECUTE {statement_id}", bound_stmt, executor, timing, literals, str(e),
+                           session_id=session_id)
+        return {
+            'success': False,
+            'result': str(e)
+        }
+    finally:
+        if session is not None:
+            session.release()
+
+def create_app():
+    """
+    创建Flask应用（Flask只在这里导入，二进制协议服务器、ASGI服务器等只使用本模块的函数时不加载Flask）
+    flask run 会自动调用本函数；WSGI服务器使用 server:app 时在第一次访问 app 时创建
+    """
+    from flask import Flask, Response, request, jsonify, render_template, stream_with_context
+
+    app = Flask(__name__)
+
+    @app.route('/')
+    def index():
+        return render_template('a.html')
+
+    @app.route('/metrics', methods=['GET'])
+    def metrics():
+        return Response(render_metrics(), content_type=METRICS_CONTENT_TYPE)
+
+    @app.route('/execute', methods=['POST'])
+    def execute_sql():
+        sql = request.json.get('sql', '')
+        session_id = request.json.get('session')
+        trace_level = request.json.get('trace')
+        if request.json.get('stream'):
+            # 流式模式：逐批返回结果行，减少首行延迟和服务器内存占用
+            return Response(stream_with_context(ndjson_stream(sql, session_id, trace_level)),
+                            mimetype=NDJSON_MIMETYPE)
+        return jsonify(execute_statements(sql, requested_page_size(request.json), session_id,
+                                          trace_level))
+
+    @app.route('/traces', methods=['GET'])
+    def traces():
+        return Response(json.dumps(get_traces(request.args.get('id'), request.args.get('limit', 20, type=int)),
+                                   ensure_ascii=False, default=str),
+                        mimetype='application/json')
+
+    @app.route('/session', methods=['POST'])
+    def open_session_route():
+        return jsonify(open_session())
+
+    @app.route('/close_session', methods=['POST'])
+    def close_session_route():
+        return jsonify(close_session(request.json.get('session', '')))
+
+    @app.route('/fetch', methods=['GET'])
+    def fetch():
+        n = request.args.get('n', DEFAULT_FETCH_ROWS, type=int)
+        return jsonify(fetch_cursor(request.args.get('cursor', ''), n))
+
+    @app.route('/close_cursor', methods=['POST'])
+    def close_cursor_route():
+        return jsonify(close_cursor(request.json.get('cursor', '')))
+
+    @app.route('/prepare', methods=['POST'])
+    def prepare_sql():
+        return jsonify(prepare_statement(request.json.get('sql', ''), request.json.get('session')))
+
+    @app.route('/execute_prepared', methods=['POST'])
+    def execute_prepared():
+        return jsonify(execute_prepared_statement(request.json.get('statement_id', ''),
+                                                  request.json.get('params', []),
+                                                  request.json.get('session')))
+
+    return app
+
+def __getattr__(name: str):
+    if name == 'app':
+        app = globals()['app'] = create_app()
+        return app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run(debug=True) 
+    create_app().run(debug=True)
+
@@ -0,0 +1,153 @@
+import time
+import secrets
+import threading
+from typing import Dict, Optional
+
+from sql_parser import SQLParser, SQLError
+from sql_executor import SQLExecutor
+
+# 空闲会话的过期时间（秒）和会话个数上限
+DEFAULT_SESSION_TTL = 600.0
+DEFAULT_MAX_SESSIONS = 1000
+
+
+class Session:
+    """
+    客户端会话
+    持有长期存在的执行器（以及其中的事务状态和预编译语句）和语法分析器，
+    BEGIN ... COMMIT 可以跨越同一会话的多个请求
+    """
+    def __init__(self, session_id: str, executor: SQLExecutor):
+        self.session_id = session_id
+        self.executor = executor
+        self.parser = SQLParser()
+        self.created_at = time.time()
+        self.last_access = time.monotonic()
+        self.statements = 0
+        self._lock = threading.Lock()
+
+    @property
+    def in_transaction(self) -> bool:
+        return self.executor.transaction is not None
+
+    def acquire(self):
+        """同一会话的请求按顺序执行，会话正被其他请求使用时报错"""
+        if not self._lock.acquire(blocking=False):
+            raise SQLError(f"会话 {self.session_id} 正在执行其他请求")
+        self.last_access = time.monotonic()
+
+    def release(self):
+        self.last_access = time.monotonic()
+        self._lock.release()
+
+    def close(self, blocking: bool = True) -> bool:
+        """关闭会话，回滚未提交的事务；blocking 为False且会话正在使用时返回False"""
+        if not self._lock.acquire(blocking):
+            return False
+        try:
+            transaction = self.executor.transaction
+            if transaction is not None:
+                self.executor.transaction = None
+                if transaction.active:
+                    transaction.rollback()
+            return True
+        finally:
+            self._lock.release()
+
+    def info(self) -> dict:
+        transaction = self.executor.transaction
+        return {
+            'session': self.session_id,
+            'transaction': transaction.txid if transaction is not None else None,
+            'statements': self.statements,
+            'idle_seconds': round(time.monotonic() - self.last_access, 3)
+        }
+
+
+class SessionManager:
+    """
+    会话管理器
+    空闲超过 ttl 秒的会话会被关闭（未提交的事务回滚，释放其持有的锁和快照）
+    """
+    def __init__(self, data_dir: str, ttl: float = DEFAULT_SESSION_TTL,
+                 max_sessions: int = DEFAULT_MAX_SESSIONS, **executor_options):
+        self.data_dir = data_dir
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.executor_options = executor_options
+        self._sessions: Dict[str, Session] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        # 统计信息
+        self.opened = 0
+        self.expired = 0
+
+    def open(self) -> Session:
+        """创建新会话"""
+        self.reap()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                raise SQLError(f"会话数已达上限 {self.max_sessions}")
+            session = Session(secrets.token_urlsafe(16),
+                              SQLExecutor(self.data_dir, **self.executor_options))
+            self._sessions[session.session_id] = session
+            self.opened += 1
+            return session
+
+    def get(self, session_id: str) -> Session:
+        with self._lock:
+            session = self._sessions.get(session_id)
+        if session is None:
+            raise SQLError(f"会话 {session_id} 不存在或已过期")
+        return session
+
+    def close(self, session_id: str) -> bool:
+        """关闭并移除会话，会话不存在时返回False"""
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+        session.close()
+        return True
+
+    def reap(self) -> int:
+        """关闭空闲超时的会话，返回关闭的个数（正在执行请求的会话跳过）"""
+        deadline = time.monotonic() - self.ttl
+        with self._lock:
+            idle = [s for s in self._sessions.values() if s.last_access < deadline]
+        count = 0
+        for session in idle:
+            if not session.close(blocking=False):
+                continue
+            with self._lock:
+                if self._sessions.pop(session.session_id, None) is not None:
+                    count += 1
+        self.expired += count
+        return count
+
+    def start_reaper(self, interval: Optional[float] = None):
+        """启动后台线程定期关闭空闲会话，避免被遗弃的事务一直持有锁"""
+        if self._reaper is not None:
+            return
+        interval = interval if interval is not None else max(1.0, self.ttl / 4)
+
+        def run():
+            while True:
+                time.sleep(interval)
+                self.reap()
+
+        self._reaper = threading.Thread(target=run, name='session-reaper', daemon=True)
+        self._reaper.start()
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {
+            'open': len(sessions),
+            'in_transaction': sum(1 for s in sessions if s.in_transaction),
+            'opened': self.opened,
+            'expired': self.expired
+        }
+
+    def __len__(self):
+        return len(self._sessions)
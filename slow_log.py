@@ -0,0 +1,302 @@
+import os
+import re
+import sys
+import json
+import time
+import queue
+import atexit
+import hashlib
+import argparse
+import threading
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from sql_scanner import scan_statement
+
+# 执行时间超过阈值（毫秒）的语句写入慢查询日志，小于0时不记录
+SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', -1))
+# 日志文件名（位于数据目录下），单个文件的大小上限和保留的轮转文件个数
+SLOW_LOG_FILE = os.environ.get('SQL_SLOW_LOG_FILE', '_slow_query.log')
+SLOW_LOG_MAX_BYTES = int(os.environ.get('SQL_SLOW_LOG_MAX_BYTES', 16 * 1024 * 1024))
+SLOW_LOG_BACKUPS = int(os.environ.get('SQL_SLOW_LOG_BACKUPS', 5))
+# 等待写入的记录数上限，超过时丢弃新记录（写日志不阻塞查询）
+SLOW_LOG_QUEUE_SIZE = 10000
+
+_LITERALS = {'INT', 'FLOAT', 'STRING'}
+# 规范化文本中前后不加空格的词法单元
+_NO_SPACE_BEFORE = {'COMMA', 'RPAREN', 'DOT'}
+_NO_SPACE_AFTER = {'LPAREN', 'DOT'}
+# 多行 VALUES 折叠为第一行
+_VALUES_RE = re.compile(r'(\([?, ]*\))(?:, \([?, ]*\))+')
+
+
+def fingerprint(sql: str) -> Tuple[str, str, List[str]]:
+    """
+    返回 (指纹, 规范化文本, 参数)
+    规范化文本中的字面量替换为 ?（参数为按顺序取出的字面量），关键字大写，空白统一，
+    多行 VALUES 只保留第一行；只有字面量不同的语句指纹相同
+    """
+    parts: List[str] = []
+    params: List[str] = []
+    last = None
+    for tok in scan_statement(sql).tokens:
+        if tok.type in _LITERALS:
+            text = '?'
+            params.append(tok.value)
+        elif tok.type == 'IDENTIFIER':
+            text = tok.value
+        else:
+            text = tok.value.upper()
+        if parts and tok.type not in _NO_SPACE_BEFORE and last not in _NO_SPACE_AFTER:
+            parts.append(' ')
+        parts.append(text)
+        last = tok.type
+    normalized = _VALUES_RE.sub(r'\1, ...', ''.join(parts))
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest()[:16], normalized, params
+
+
+@dataclass
+class QueryTiming:
+    """一条语句的耗时：解析、执行和序列化（调用方编码和发送结果所用的时间）"""
+    started: float
+    parse: float = 0.0
+    serialize: float = 0.0
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+
+@dataclass
+class SlowQueryRecord:
+    """慢查询日志中的一条记录（JSON Lines 格式的一行）"""
+    time: str                       # 语句结束的时间（本地时间，ISO 8601）
+    fingerprint: str
+    statement: str                  # 规范化文本
+    params: List[Any]
+    statement_type: str
+    duration_ms: float
+    parse_ms: float
+    execute_ms: float
+    serialize_ms: float
+    rows_scanned: int
+    rows_returned: int
+    rows_written: int
+    bytes_read: int
+    peak_memory_bytes: int          # 物化的中间结果占用内存的估计峰值
+    spilled_bytes: int = 0          # 超出内存预算写入临时文件的字节数
+    plan: Optional[str] = None
+    error: Optional[str] = None
+    trace: Optional[str] = None
+    session: Optional[str] = None
+
+
+class SlowQueryLog:
+    """
+    慢查询日志
+    请求线程只把记录放入有界队列，由后台线程写入文件；文件超过 max_bytes 时轮转
+    （path -> path.1 -> ... -> path.backups），最旧的文件被删除。队列已满时丢弃记录并计数
+    """
+    def __init__(self, path: str, threshold_ms: float = SLOW_QUERY_MS,
+                 max_bytes: int = SLOW_LOG_MAX_BYTES, backups: int = SLOW_LOG_BACKUPS,
+                 queue_size: int = SLOW_LOG_QUEUE_SIZE):
+        self.path = path
+        self.threshold_ms = threshold_ms
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue: 'queue.Queue[Optional[SlowQueryRecord]]' = queue.Queue(queue_size)
+        self._writer: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._file = None
+        # 统计信息
+        self.logged = 0
+        self.dropped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.threshold_ms >= 0
+
+    def is_slow(self, seconds: float) -> bool:
+        return self.threshold_ms >= 0 and seconds * 1000 >= self.threshold_ms
+
+    def log(self, record: SlowQueryRecord):
+        """放入写入队列（不等待写入完成）"""
+        self._start_writer()
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start_writer(self):
+        if self._writer is not None:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run, name='slow-query-log', daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _run(self):
+        while True:
+            records = [self._queue.get()]
+            # 一次写入队列中已有的所有记录
+            while True:
+                try:
+                    records.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._write(records)
+            except OSError:
+                self.dropped += len(records)
+            finally:
+                for _ in records:
+                    self._queue.task_done()
+
+    def _write(self, records: List[SlowQueryRecord]):
+        for record in records:
+            line = (json.dumps(asdict(record), ensure_ascii=False, default=str) + '\n').encode('utf-8')
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, 'ab')
+            if self._file.tell() and self._file.tell() + len(line) > self.max_bytes:
+                self._rotate()
+            self._file.write(line)
+            self.logged += 1
+        self._file.flush()
+
+    def _rotate(self):
+        self._file.close()
+        self._file = None
+        for i in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{i}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{i + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+        self._file = open(self.path, 'ab')
+
+    def flush(self):
+        """等待队列中的记录全部写入"""
+        if self._writer is not None:
+            self._queue.join()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'threshold_ms': self.threshold_ms,
+            'logged': self.logged,
+            'dropped': self.dropped,
+            'queued': self._queue.qsize()
+        }
+
+
+def log_files(path: str) -> List[str]:
+    """日志文件及其轮转文件，从旧到新"""
+    files = []
+    i = 1
+    while os.path.exists(f"{path}.{i}"):
+        files.append(f"{path}.{i}")
+        i += 1
+    files.reverse()
+    if os.path.exists(path):
+        files.append(path)
+    return files
+
+
+def read_records(paths: List[str]) -> Iterator[Dict[str, Any]]:
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # 写到一半的行
+                    continue
+
+
+def _percentile(values: List[float], fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def aggregate(records: Iterator[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """按指纹汇总慢查询：次数、总耗时、平均/p95/最大耗时、耗时构成、平均行数和最大内存"""
+    groups: Dict[str, Dict[str, Any]] = {}
+    for record in records:
+        group = groups.get(record['fingerprint'])
+        if group is None:
+            group = groups[record['fingerprint']] = {
+                'fingerprint': record['fingerprint'],
+                'statement': record['statement'],
+                'statement_type': record['statement_type'],
+                'durations': [], 'parse_ms': 0.0, 'execute_ms': 0.0, 'serialize_ms': 0.0,
+                'rows_scanned': 0, 'rows_returned': 0, 'peak_memory_bytes': 0, 'errors': 0,
+                'example_params': record['params'], 'last_seen': record['time'],
+            }
+        group['durations'].append(record['duration_ms'])
+        for key in ('parse_ms', 'execute_ms', 'serialize_ms', 'rows_scanned', 'rows_returned'):
+            group[key] += record[key]
+        group['peak_memory_bytes'] = max(group['peak_memory_bytes'], record['peak_memory_bytes'])
+        group['errors'] += record['error'] is not None
+        group['last_seen'] = max(group['last_seen'], record['time'])
+
+    result = []
+    for group in groups.values():
+        durations = group.pop('durations')
+        count = len(durations)
+        result.append(dict(
+            group,
+            count=count,
+            total_ms=round(sum(durations), 3),
+            mean_ms=round(sum(durations) / count, 3),
+            p95_ms=round(_percentile(durations, 0.95), 3),
+            max_ms=round(max(durations), 3),
+            parse_ms=round(group['parse_ms'], 3),
+            execute_ms=round(group['execute_ms'], 3),
+            serialize_ms=round(group['serialize_ms'], 3),
+            rows_scanned=group['rows_scanned'] // count,
+            rows_returned=group['rows_returned'] // count,
+        ))
+    return result
+
+
+def print_table(groups: List[Dict[str, Any]], width: int = 60):
+    print(f"{'指纹':<18}{'次数':>8}{'总耗时(ms)':>14}{'平均(ms)':>12}{'p95(ms)':>12}{'最大(ms)':>12}"
+          f"{'解析/执行/序列化(%)':>22}{'扫描行数':>10}{'返回行数':>10}{'内存峰值(KB)':>14}  语句")
+    for group in groups:
+        total = group['total_ms'] or 1
+        shares = '/'.join(f"{group[key] * 100 / total:.0f}"
+                          for key in ('parse_ms', 'execute_ms', 'serialize_ms'))
+        statement = group['statement']
+        if len(statement) > width:
+            statement = statement[:width - 3] + '...'
+        print(f"{group['fingerprint']:<18}{group['count']:>8}{group['total_ms']:>14.1f}"
+              f"{group['mean_ms']:>12.1f}{group['p95_ms']:>12.1f}{group['max_ms']:>12.1f}"
+              f"{shares:>22}{group['rows_scanned']:>10}{group['rows_returned']:>10}"
+              f"{group['peak_memory_bytes'] / 1024:>14.1f}  {statement}")
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='按查询指纹汇总慢查询日志（包括轮转的旧文件）')
+    arg_parser.add_argument('log_file', nargs='?',
+                            default=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                                                 SLOW_LOG_FILE),
+                            help='慢查询日志文件，默认为 data/_slow_query.log')
+    arg_parser.add_argument('--sort', choices=['total', 'count', 'mean', 'p95', 'max'], default='total',
+                            help='排序依据')
+    arg_parser.add_argument('--top', type=int, default=20, help='显示的指纹个数')
+    arg_parser.add_argument('--json', action='store_true', help='以JSON格式输出')
+    args = arg_parser.parse_args()
+
+    files = log_files(args.log_file)
+    if not files:
+        sys.exit(f"日志文件 {args.log_file} 不存在")
+    groups = aggregate(read_records(files))
+    groups.sort(key=lambda group: group[f"{args.sort}_ms" if args.sort != 'count' else 'count'],
+                reverse=True)
+    groups = groups[:args.top]
+    if args.json:
+        print(json.dumps(groups, ensure_ascii=False, indent=2))
+    else:
+        print_table(groups)
@@ -0,0 +1,172 @@
+import os
+import pickle
+import tempfile
+from typing import Any, Iterable, Iterator, List, Optional
+
+from query_cache import estimate_size
+from sql_parser import SQLError
+
+# 每条查询物化中间结果可用的内存（MB），小于等于0时不限制
+QUERY_MEMORY_MB = float(os.environ.get('SQL_QUERY_MEMORY_MB', 256))
+QUERY_MEMORY_LIMIT = int(QUERY_MEMORY_MB * 1024 * 1024)
+# 临时文件所在目录，默认为系统临时目录
+SPILL_DIR = os.environ.get('SQL_SPILL_DIR') or None
+# 每追加多少行检查一次预算；写入临时文件时每批的行数（读回时一次只加载一批）
+CHECK_ROWS = 1024
+SPILL_BATCH_ROWS = 10000
+
+
+class MemoryBudget:
+    """
+    一条查询的内存预算
+    各算子的输出缓冲区按估计的行大小成批申请内存，申请不到时把已有的行写入临时文件后继续；
+    不能写出的数据（如连接的输入表）用 charge 直接计入，超出预算时其他缓冲区立即写出
+    """
+    def __init__(self, limit: int = QUERY_MEMORY_LIMIT, spill_dir: Optional[str] = SPILL_DIR):
+        self.limit = limit
+        self.spill_dir = spill_dir
+        self.used = 0
+        self.peak = 0
+        self._buffers: List['SpillBuffer'] = []
+        # 统计信息
+        self.spilled_partitions = 0
+        self.spilled_rows = 0
+        self.spilled_bytes = 0
+
+    def charge(self, nbytes: int):
+        self.used += nbytes
+        if self.used > self.peak:
+            self.peak = self.used
+
+    def reserve(self, nbytes: int) -> bool:
+        """申请内存，超出预算时返回False（不计入）"""
+        if self.limit > 0 and self.used + nbytes > self.limit:
+            return False
+        self.charge(nbytes)
+        return True
+
+    def release(self, nbytes: int):
+        self.used -= nbytes
+
+    def collect(self, rows: Iterable[Any]) -> List[Any]:
+        """
+        把结果读入列表（返回给调用方的结果不能写入临时文件），按估计的行大小成批计入预算，
+        超出预算时抛出 SQLError
+        """
+        result: List[Any] = []
+        row_size = 0
+        reserved = 0
+        next_check = 1
+        for row in rows:
+            result.append(row)
+            if len(result) >= next_check:
+                if not row_size:
+                    row_size = estimate_size(row)
+                needed = (len(result) + CHECK_ROWS) * row_size - reserved
+                if not self.reserve(needed):
+                    raise SQLError(f"查询结果超出每条查询的内存上限 {self.limit // (1024 * 1024)} MB，"
+                                   f"请使用流式接口或游标分批获取")
+                reserved += needed
+                next_check = len(result) + CHECK_ROWS
+        return result
+
+    def buffer(self, name: str) -> 'SpillBuffer':
+        buffer = SpillBuffer(self, name)
+        self._buffers.append(buffer)
+        return buffer
+
+    def close(self):
+        """关闭所有缓冲区并删除临时文件（查询结束、出错或结果未取完被关闭时调用）"""
+        for buffer in self._buffers:
+            buffer.close()
+        self._buffers = []
+
+
+class SpillBuffer:
+    """
+    受内存预算限制的行缓冲区，按追加顺序迭代
+    内存中的行超出预算时作为一个分区写入临时文件（pickle，每批 SPILL_BATCH_ROWS 行，
+    字典行只写一次键），迭代时先逐批读回各分区再返回内存中的行；追加和迭代都不随预算改变接口，
+    算子可以像使用列表一样使用
+    """
+    def __init__(self, budget: MemoryBudget, name: str):
+        self.budget = budget
+        self.name = name
+        self._rows: List[Any] = []
+        self._row_size = 0          # 按第一行估计的每行字节数
+        self._reserved = 0          # 内存中的行已申请的字节数
+        self._next_check = 1
+        self._file = None
+        self._spilled_rows = 0
+        self.partitions = 0
+
+    def append(self, row: Any):
+        rows = self._rows
+        rows.append(row)
+        if len(rows) >= self._next_check:
+            self._check()
+
+    def _check(self):
+        rows = self._rows
+        if not self._row_size:
+            self._row_size = estimate_size(rows[0])
+        needed = (len(rows) + CHECK_ROWS) * self._row_size - self._reserved
+        if self.budget.reserve(needed):
+            self._reserved += needed
+        else:
+            self._spill()
+        self._next_check = len(self._rows) + CHECK_ROWS
+
+    def _spill(self):
+        """把内存中的行作为一个分区写入临时文件"""
+        if self._file is None:
+            self._file = tempfile.TemporaryFile(prefix='minidb-spill-', dir=self.budget.spill_dir)
+        start = self._file.seek(0, os.SEEK_END)
+        rows = self._rows
+        for i in range(0, len(rows), SPILL_BATCH_ROWS):
+            batch = rows[i:i + SPILL_BATCH_ROWS]
+            if isinstance(batch[0], dict):
+                keys = tuple(batch[0])
+                batch = [tuple(row.values()) for row in batch]
+            else:
+                keys = None
+            pickle.dump((keys, batch), self._file, pickle.HIGHEST_PROTOCOL)
+        self.partitions += 1
+        self._spilled_rows += len(rows)
+        self.budget.spilled_partitions += 1
+        self.budget.spilled_rows += len(rows)
+        self.budget.spilled_bytes += self._file.tell() - start
+        self._rows = []
+        self.budget.release(self._reserved)
+        self._reserved = 0
+
+    def __len__(self) -> int:
+        return self._spilled_rows + len(self._rows)
+
+    def __iter__(self) -> Iterator[Any]:
+        # 每次读取前定位到上次读完的位置，迭代过程中可以继续追加
+        position = 0
+        remaining = self._spilled_rows
+        while remaining:
+            self._file.seek(position)
+            keys, batch = pickle.load(self._file)
+            position = self._file.tell()
+            remaining -= len(batch)
+            if keys is None:
+                yield from batch
+            else:
+                for values in batch:
+                    yield dict(zip(keys, values))
+        yield from self._rows
+
+    @property
+    def spilled(self) -> bool:
+        return self._file is not None
+
+    def close(self):
+        self._rows = []
+        self.budget.release(self._reserved)
+        self._reserved = 0
+        if self._file is not None:
+            self._file.close()
+            self._file = None
@@ -1,15 +1,85 @@
 import os
 import csv
-from typing import List, Dict, Any,  Tuple
+import time
+from contextlib import contextmanager
+from typing import List, Dict, Any,  Tuple, Optional, Iterator, Set
+from query_cache import QueryCache, estimate_rows_size
+from statement_cache import StatementCache, PreparedStatements
+from query_plan import PlanNode, SelectPlan, format_conditions
+from table_stats import analyze_table
+from db_manager import DBManager, Transaction, LockMode, LockConflict, DeadlockError, get_db_manager
+from mvcc import (HIDDEN_COLUMNS, HIDDEN_COUNT, Snapshot, is_versioned, read_versions,
+                  visible_rows, scan_visible_rows)
+from storage import (TableStorage, RowFilter, ColumnPredicate, DATA_FILE, SCHEMA_FILE,
+                     NO_COMPRESSION, get_storage)
+from block_format import BlockFormatError, get_codec
+from metrics import StatementStats, record_statement
+from spill import MemoryBudget, QUERY_MEMORY_LIMIT
+from tracing import Trace, TRACE, DEBUG
 from sql_parser import (
     SQLError, DataType, 
     CreateTableStatement, InsertStatement, SelectStatement,
-    UpdateStatement, DeleteStatement, Condition, UpdateValue
+    UpdateStatement, DeleteStatement, Condition, UpdateValue,
+    PrepareStatement, ExecuteStatement, ExplainStatement, AnalyzeStatement,
+    CopyStatement, VacuumStatement, TransactionStatement
 )
 
+# 批量写入时每批的行数
+WRITE_BATCH_ROWS = 10000
+
+# COPY 可以读取的文件所在目录，默认为数据目录；文件路径必须是该目录下的相对路径
+IMPORT_DIR = os.environ.get('SQL_IMPORT_DIR') or None
+
+# 自动VACUUM阈值：死版本数超过 max(最小值, 比例 * 行数)
+AUTO_VACUUM_MIN_VERSIONS = 50
+AUTO_VACUUM_FRACTION = 0.2
+
+
+def batched(rows, size: int):
+    """将可迭代对象按固定大小分批"""
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _copy_converter(data_type: DataType):
+    """返回把COPY文件中的原始文本转换为存储格式的函数，类型不符时抛出ValueError"""
+    if data_type == DataType.INT:
+        def convert(value):
+            value = value.strip()
+            int(value)
+            return value
+    elif data_type == DataType.FLOAT:
+        def convert(value):
+            value = value.strip()
+            float_val = float(value)
+            # 存储格式要求带小数点
+            return value if '.' in value else repr(float_val)
+    else:
+        def convert(value):
+            if len(value) >= 2 and value.startswith("'") and value.endswith("'"):
+                return value
+            return f"'{value}'"
+    return convert
+
 class SQLExecutor:
     """SQL执行器"""
-    def __init__(self, data_dir=None):
+    def __init__(self, data_dir=None, query_cache: Optional[QueryCache] = None,
+                 statement_cache: Optional[StatementCache] = None,
+                 db_manager: Optional[DBManager] = None, memory_limit: int = QUERY_MEMORY_LIMIT,
+                 import_dir: Optional[str] = IMPORT_DIR):
+        # 查询结果缓存（可选），写操作后需要使其失效
+        self.query_cache = query_cache
+        # 预编译语句缓存，未提供时使用执行器自己的缓存
+        self.statement_cache = statement_cache if statement_cache is not None else StatementCache()
+        # 本执行器（会话、连接）的预编译语句，其他客户端不可见
+        self.prepared_statements = PreparedStatements()
+
         # 如果没有提供数据目录，使用默认路径
         if data_dir is None:
             current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -20,6 +90,24 @@ class SQLExecutor:
         # 确保数据目录存在
         if not os.path.exists(self.data_dir):
             os.makedirs(self.data_dir)
+
+        # 数据库管理器负责事务编号和预写日志；transaction 为None时每条写语句自动提交
+        self.db_manager = db_manager if db_manager is not None else get_db_manager(self.data_dir)
+        self.transaction: Optional[Transaction] = None
+        # 显式事务中修改过的表，提交时需要再次使缓存失效
+        self._transaction_tables: Set[str] = set()
+        # 显式事务中各表修改的行数 [插入, 更新, 删除]，提交后才计入统计信息
+        self._transaction_modifications: Dict[str, List[int]] = {}
+        # 当前读语句使用的快照（语句执行期间有效）
+        self._current_snapshot: Optional[Snapshot] = None
+        # 当前（或最近一条）语句的读写统计
+        self.stats = StatementStats()
+        # 当前请求的跟踪（由服务器设置），为None时不记录任何跟踪事件
+        self.trace: Optional[Trace] = None
+        # COPY 只能读取该目录下的文件
+        self.import_dir = import_dir if import_dir is not None else self.data_dir
+        # 每条查询物化中间结果可用的内存（字节），超出时写入临时文件，小于等于0时不限制
+        self.memory_limit = memory_limit
             
     def get_table_dir(self, table_name: str) -> str:
         """获取表的目录路径"""
@@ -27,43 +115,283 @@ class SQLExecutor:
         
     def get_table_file(self, table_name: str) -> str:
         """获取表数据文件的路径"""
-        return os.path.join(self.get_table_dir(table_name), 'data.csv')
+        return os.path.join(self.get_table_dir(table_name), DATA_FILE)
         
     def get_schema_file(self, table_name: str) -> str:
         """获取表结构文件的路径"""
-        return os.path.join(self.get_table_dir(table_name), 'schema.csv')
+        return os.path.join(self.get_table_dir(table_name), SCHEMA_FILE)
+
+    def get_storage(self, table_name: str) -> TableStorage:
+        """获取表数据文件的存储对象"""
+        return get_storage(self.get_table_dir(table_name))
         
+    def _invalidate_cache(self, table_name: str):
+        """表数据被修改后，递增表版本号使相关缓存失效"""
+        if self.query_cache is not None:
+            self.query_cache.bump_version(table_name)
+        if self.transaction is not None:
+            self._transaction_tables.add(table_name)
+
+    def _begin_write(self) -> Tuple[Transaction, bool]:
+        """获取写操作所在的事务，返回 (事务, 是否自动提交)"""
+        if self.transaction is not None:
+            return self.transaction, False
+        return self.db_manager.start_transaction(), True
+
+    def _finish_write(self, transaction: Transaction, autocommit: bool, success: bool):
+        """自动提交模式下结束写操作事务（提交时与其他并发事务共享一次fsync）"""
+        if not autocommit or not transaction.active:
+            return
+        if success:
+            transaction.commit()
+        else:
+            transaction.rollback()
+
+    @contextmanager
+    def _table_write(self, table_name: str, commit_under_latch: bool = True):
+        """
+        表写操作：持有表意向排他锁和表写闩，在事务中执行，返回事务
+        UPDATE/DELETE 在释放写闩前提交，保证下一个写操作的快照能看到本次修改；
+        追加写入不读取旧版本，可以在释放写闩后提交，与其他事务共享一次fsync
+        """
+        transaction, autocommit = self._begin_write()
+        try:
+            # 表锁可能需要等待，必须在获取写闩之前申请
+            self.db_manager.lock_manager.lock_table(transaction.txid, table_name, LockMode.IX)
+        except DeadlockError:
+            self._abort_transaction()
+            self._finish_write(transaction, autocommit, False)
+            raise
+        except BaseException:
+            self._finish_write(transaction, autocommit, False)
+            raise
+        latch = self.db_manager.table_latch(table_name)
+        latch.acquire()
+        try:
+            self._ensure_versioned(table_name, transaction)
+            yield transaction
+            if commit_under_latch:
+                self._finish_write(transaction, autocommit, True)
+        except BaseException:
+            self._finish_write(transaction, autocommit, False)
+            raise
+        finally:
+            latch.release()
+        self._finish_write(transaction, autocommit, True)
+
+    def _ensure_versioned(self, table_name: str, transaction: Transaction):
+        """旧格式的数据文件在第一次写入前升级为带版本列的格式（所有行视为冻结版本）"""
+        storage = self.get_storage(table_name)
+        if is_versioned(storage.header()):
+            return
+        headers, versions = read_versions(storage)
+        self._rewrite_table(table_name, headers + HIDDEN_COLUMNS, versions, transaction)
+
+    def _rewrite_table(self, table_name: str, headers: List[str], rows: List[List[str]],
+                       transaction: Transaction, compression: Optional[str] = None):
+        """
+        重写整张表的数据文件（VACUUM和格式升级使用，调用方需持有表写闩）
+        先记录完整的新数据到日志再写文件；
+        数据先写入临时文件再原子替换，进程中途退出不会留下截断的数据文件；
+        compression 不为空时同时转换表的存储格式
+        """
+        transaction.log({'type': 'rewrite', 'table': table_name,
+                         'headers': headers, 'rows': rows, 'compression': compression})
+        self.get_storage(table_name).rewrite(headers, rows, compression)
+
+    def _modify_table(self, table_name: str, headers: List[str], versions: List[List[str]],
+                      deleted: List[List[str]], inserted: List[List[str]], transaction: Transaction):
+        """
+        UPDATE/DELETE 写回数据文件（调用方需持有表写闩）
+        日志只记录被当前事务标记删除的行版本（行ID、创建事务）和新追加的行版本，
+        与修改的行数成正比；数据文件仍整体重写，新文件落盘后才原子替换，恢复时以它为基础重做
+        """
+        transaction.log({'type': 'modify', 'table': table_name,
+                         'deleted': [[row[-HIDDEN_COUNT], row[-2]] for row in deleted],
+                         'rows': inserted})
+        self.get_storage(table_name).rewrite(headers, versions + inserted)
+
+    def _max_rowid(self, table_name: str) -> int:
+        """扫描数据文件得到当前最大行ID"""
+        _, versions = read_versions(self.get_storage(table_name))
+        return max((int(row[-HIDDEN_COUNT]) for row in versions), default=0)
+
+    def _read_rows(self, table_name: str, stream: bool = False,
+                   filters: Optional[RowFilter] = None) -> Tuple[List[str], List[List[str]]]:
+        """
+        读取对当前快照可见的行，返回 (列名, 行列表)；stream 为True时返回行迭代器
+        filters 为下推到存储层的过滤函数
+        """
+        snapshot = self._current_snapshot
+        if snapshot is None:
+            snapshot = self.db_manager.snapshot(self.transaction)
+        storage = self.get_storage(table_name)
+        self.stats.bytes_read += storage.size()
+        if stream:
+            # 流式读取的行数由调用方在迭代时累加
+            return scan_visible_rows(storage, snapshot, filters)
+        headers, rows = visible_rows(storage, snapshot, filters)
+        self.stats.rows_scanned += len(rows)
+        return headers, rows
+
+    def _lock_row(self, transaction: Transaction, table_name: str, version: List[str]):
+        """
+        为要修改的行加排他行锁（持有表写闩时调用，不等待）
+        行已被其他事务锁定时抛出 LockConflict，由调用方释放写闩后等待
+        """
+        self.db_manager.lock_manager.lock_row(transaction.txid, table_name,
+                                              version[-HIDDEN_COUNT], LockMode.X, wait=False)
+
+    def _wait_for_lock(self, conflict: LockConflict):
+        """
+        等待冲突的锁被释放
+        显式事务以自己的事务ID加锁等待（参与死锁检测，被选为牺牲者时立即回滚并释放所有锁）；
+        自动提交的语句此时已回滚、不持有任何锁，只需等待锁释放后重试
+        """
+        lock_manager = self.db_manager.lock_manager
+        if self.transaction is not None:
+            try:
+                lock_manager.acquire(self.transaction.txid, conflict.resource, conflict.mode)
+            except DeadlockError:
+                self._abort_transaction()
+                raise
+        else:
+            lock_manager.wait_until_free(conflict.resource, conflict.mode)
+
+    @staticmethod
+    def _check_write_conflict(version: List[str], transaction: Transaction, db_manager: DBManager):
+        """
+        检查可见的行版本能否被当前事务修改（先提交者胜）
+        行版本已被其他未结束的事务或快照之后提交的事务删除/更新时报错
+        """
+        xmax = int(version[-1])
+        if xmax == 0 or xmax == transaction.txid:
+            return
+        if db_manager.is_active(xmax):
+            raise SQLError("并发更新冲突：行正在被其他事务修改")
+        if db_manager.clog.is_committed(xmax):
+            raise SQLError("并发更新冲突：行已被其他事务修改，请重试")
+
+    def _load_schema(self, table_name: str) -> List[Dict[str, Any]]:
+        """读取表结构"""
+        schema = []
+        with open(self.get_schema_file(table_name), 'r', encoding='utf-8', newline='') as f:
+            reader = csv.DictReader(f)
+            for row in reader:
+                schema.append({
+                    'name': row['column_name'],
+                    'type': DataType[row['data_type']]
+                })
+        return schema
+
+    def _record_modifications(self, table_name: str, inserted: int = 0, updated: int = 0, deleted: int = 0):
+        """
+        增量维护已分析表的统计信息
+        自动提交的语句此时已提交，直接计入；显式事务中先累积，提交时计入，回滚时丢弃
+        """
+        if self.transaction is not None:
+            counts = self._transaction_modifications.setdefault(table_name, [0, 0, 0])
+            counts[0] += inserted
+            counts[1] += updated
+            counts[2] += deleted
+            return
+        self._apply_modifications(table_name, inserted, updated, deleted)
+
+    def _apply_modifications(self, table_name: str, inserted: int, updated: int, deleted: int):
+        """已提交的修改计入统计信息（只调整内存中的行数），修改累积超过阈值后重新分析整张表"""
+        table_stats = self.db_manager.table_stats
+        if table_stats.record(table_name, inserted, updated, deleted):
+            _, rows = visible_rows(self.get_storage(table_name), self.db_manager.snapshot())
+            table_stats.put(table_name, analyze_table(table_name, rows, self._load_schema(table_name)))
+
+    def _maybe_vacuum(self, table_name: str, dead_versions: int):
+        """死版本累积超过阈值后自动清理（只在自动提交模式下触发）"""
+        if self.transaction is not None or not dead_versions:
+            return
+        dead = self.db_manager.dead_versions.get(table_name, 0) + dead_versions
+        self.db_manager.dead_versions[table_name] = dead
+        stats = self.db_manager.table_stats.get(table_name)
+        row_count = stats.row_count if stats is not None else 0
+        if dead > max(AUTO_VACUUM_MIN_VERSIONS, AUTO_VACUUM_FRACTION * row_count):
+            self._vacuum_table(table_name)
+
     def execute(self, statements: List[Any]) -> List[Dict[str, Any]]:
         """执行SQL语句"""
         results = []
         
         for stmt in statements:
-            if isinstance(stmt, CreateTableStatement):
-                result = self._execute_create_table(stmt)
-            elif isinstance(stmt, InsertStatement):
-                result = self._execute_insert(stmt)
-            elif isinstance(stmt, SelectStatement):
-                result = self._execute_select(stmt)
-            elif isinstance(stmt, UpdateStatement):
-                result = self._execute_update(stmt)
-            elif isinstance(stmt, DeleteStatement):
-                result = self._execute_delete(stmt)
-            else:
-                raise SQLError(f"不支持的SQL语句类型: {type(stmt)}")
-                
+            if isinstance(stmt, ExecuteStatement):
+                # 先绑定参数，按实际的语句类型记录统计
+                stmt = self.prepared_statements.get(stmt.name).bind(stmt.params)
+            with self._measure(stmt) as stats:
+                result = self._execute_statement(stmt)
+                if isinstance(stmt, SelectStatement):
+                    stats.rows_returned = len(result)
+                    stats.track_memory(estimate_rows_size(result))
             results.append({
                 'success': True,
                 'result': result
             })
             
         return results
-        
+
+    @contextmanager
+    def _measure(self, stmt: Any):
+        """记录一条语句的耗时、读写行数和是否出错（提前关闭的流式查询不算出错）"""
+        stats = self.stats = StatementStats()
+        start = time.perf_counter()
+        try:
+            yield stats
+        except Exception:
+            record_statement(stmt, stats, time.perf_counter() - start, False)
+            raise
+        record_statement(stmt, stats, time.perf_counter() - start, True)
+
+    def _execute_statement(self, stmt: Any) -> Any:
+        """执行单条语句（EXECUTE 已在 execute 中绑定为实际的语句）"""
+        if isinstance(stmt, CreateTableStatement):
+            return self._execute_create_table(stmt)
+        elif isinstance(stmt, InsertStatement):
+            return self._execute_insert(stmt)
+        elif isinstance(stmt, SelectStatement):
+            with self._statement_snapshot():
+                return self._execute_select(stmt)
+        elif isinstance(stmt, UpdateStatement):
+            return self._execute_update(stmt)
+        elif isinstance(stmt, DeleteStatement):
+            return self._execute_delete(stmt)
+        elif isinstance(stmt, ExplainStatement):
+            with self._statement_snapshot():
+                return self._execute_explain(stmt)
+        elif isinstance(stmt, CopyStatement):
+            return self._execute_copy(stmt)
+        elif isinstance(stmt, AnalyzeStatement):
+            return self._execute_analyze(stmt)
+        elif isinstance(stmt, VacuumStatement):
+            return self._execute_vacuum(stmt)
+        elif isinstance(stmt, TransactionStatement):
+            return self._execute_transaction(stmt)
+        elif isinstance(stmt, PrepareStatement):
+            prepared = self.prepared_statements.prepare(stmt.name, stmt.statement)
+            return f"预编译语句 {stmt.name} 已创建，参数个数: {prepared.param_count}"
+        else:
+            raise SQLError(f"不支持的SQL语句类型: {type(stmt)}")
+
+    @contextmanager
+    def _statement_snapshot(self):
+        """整条读语句（包括多表连接）使用同一个快照，读操作不加锁"""
+        with self.db_manager.read_snapshot(self.transaction) as snapshot:
+            self._current_snapshot = snapshot
+            try:
+                yield snapshot
+            finally:
+                self._current_snapshot = None
+
     def _execute_create_table(self, stmt: CreateTableStatement) -> str:
         """执行CREATE TABLE语句"""
         table_name = stmt.table.name
         table_dir = self.get_table_dir(table_name)
         schema_file = self.get_schema_file(table_name)
-        data_file = self.get_table_file(table_name)
         
         # 检查表是否已存在
         if os.path.exists(table_dir):
@@ -72,6 +400,7 @@ class SQLExecutor:
         try:
             # 创建表目录
             os.makedirs(table_dir)
+            self.db_manager.table_stats.forget(table_name)
             
             # 写入表结构
             with open(schema_file, 'w', encoding='utf-8', newline='') as f:
@@ -82,11 +411,11 @@ class SQLExecutor:
                 for col in stmt.table.columns:
                     writer.writerow([col.name, col.data_type.name])
                     
-            # 创建数据文件，写入列名
-            with open(data_file, 'w', encoding='utf-8', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow([col.name for col in stmt.table.columns])
-                
+            # 创建数据文件，写入列名和隐藏的版本列
+            self.get_storage(table_name).create([col.name for col in stmt.table.columns] + HIDDEN_COLUMNS,
+                                                stmt.compression or NO_COMPRESSION)
+
+            self._invalidate_cache(table_name)
             return f"表 {table_name} 创建成功"
             
         except Exception as e:
@@ -97,47 +426,129 @@ class SQLExecutor:
             raise SQLError(f"创建表时出错: {str(e)}")
             
     def _execute_insert(self, stmt: InsertStatement) -> str:
-        """执行INSERT语句"""
+        """执行INSERT语句（支持一次插入多行）"""
         table_name = stmt.table_name
         table_dir = self.get_table_dir(table_name)
-        schema_file = self.get_schema_file(table_name)
-        data_file = self.get_table_file(table_name)
         
         # 检查表是否存在
         if not os.path.exists(table_dir):
             raise SQLError(f"表 {table_name} 不存在")
             
         try:
-            # 读取表结构
-            schema = []
-            with open(schema_file, 'r', encoding='utf-8', newline='') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    schema.append({
-                        'name': row['column_name'],
-                        'type': DataType[row['data_type']]
-                    })
+            # 读取表结构（每条语句只读取一次）
+            schema = self._load_schema(table_name)
+            column_types = [column['type'].name for column in schema]
                         
-            # 检查值的数量是否匹配
-            if len(stmt.values) != len(schema):
-                raise SQLError(f"列数不匹配：期望 {len(schema)} 列，实际提供 {len(stmt.values)} 列")
-                
-            # 验证每个值的类型
-            for i, (value, column) in enumerate(zip(stmt.values, schema)):
-                is_valid, error_msg = self.validate_data_type(value, column['type'].name)
-                if not is_valid:
-                    raise SQLError(f"第 {i+1} 列 '{column['name']}' {error_msg}")
+            for row_no, values in enumerate(stmt.rows, 1):
+                prefix = f"第 {row_no} 行" if len(stmt.rows) > 1 else ""
+
+                # 检查值的数量是否匹配
+                if len(values) != len(schema):
+                    raise SQLError(f"{prefix}列数不匹配：期望 {len(schema)} 列，实际提供 {len(values)} 列")
                     
-            # 写入数据
-            with open(data_file, 'a', encoding='utf-8', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(stmt.values)
-                
-            return "插入成功"
+                # 验证每个值的类型
+                for i, value in enumerate(values):
+                    is_valid, error_msg = self.validate_data_type(value, column_types[i])
+                    if not is_valid:
+                        raise SQLError(f"{prefix}第 {i+1} 列 '{schema[i]['name']}' {error_msg}")
+                    
+            # 所有行验证通过后一次性写入
+            self._append_rows(table_name, stmt.rows)
+
+            self._invalidate_cache(table_name)
+            self._record_modifications(table_name, inserted=len(stmt.rows))
+            if len(stmt.rows) == 1:
+                return "插入成功"
+            return f"插入成功，共 {len(stmt.rows)} 行"
             
         except Exception as e:
             raise SQLError(f"插入数据时出错: {str(e)}")
 
+    def _append_rows(self, table_name: str, rows) -> int:
+        """
+        以大缓冲区追加写入多行，返回写入的行数
+        rows 可以是任意可迭代对象（包括生成器），每批数据分配行ID、写入前先记录日志；
+        新行版本的 xmin 为当前事务，提交前对其他事务不可见；写入失败时截断回写入前的大小
+        """
+        count = 0
+        with self._table_write(table_name, commit_under_latch=False) as transaction:
+            txid = str(transaction.txid)
+            with self.get_storage(table_name).appender() as appender:
+                for batch in batched(rows, WRITE_BATCH_ROWS):
+                    first_rowid = self.db_manager.allocate_rowids(
+                        table_name, len(batch), lambda: self._max_rowid(table_name))
+                    # 生成新列表，不修改调用方（可能是缓存的语法树）中的行
+                    batch = [row + [str(first_rowid + i), txid, '0']
+                             for i, row in enumerate(batch)]
+                    transaction.log({'type': 'insert', 'table': table_name,
+                                     'offset': appender.offset, 'rows': batch})
+                    appender.write(batch)
+                    count += len(batch)
+                    self.stats.rows_written += len(batch)
+        self._maybe_compact(table_name)
+        return count
+
+    def _maybe_compact(self, table_name: str):
+        """分块格式的表中少量行的追加写入产生的小块累积过多时，重写整理（只在自动提交模式下触发）"""
+        if self.transaction is None and self.get_storage(table_name).needs_compaction():
+            self._vacuum_table(table_name)
+
+    def _resolve_import_path(self, file_path: str) -> str:
+        """
+        COPY 的文件路径解析为导入目录下的路径
+        拒绝绝对路径和（包括经过符号链接）指向导入目录以外的路径，客户端不能借此读取服务器上的任意文件
+        """
+        if os.path.isabs(file_path) or os.path.splitdrive(file_path)[0]:
+            raise SQLError(f"COPY 只能使用导入目录下的相对路径: {file_path}")
+        import_dir = os.path.realpath(self.import_dir)
+        resolved = os.path.realpath(os.path.join(import_dir, file_path))
+        if os.path.commonpath([import_dir, resolved]) != import_dir:
+            raise SQLError(f"COPY 的文件不在导入目录中: {file_path}")
+        return resolved
+
+    def _execute_copy(self, stmt: CopyStatement) -> str:
+        """
+        执行COPY语句，从CSV文件批量导入数据
+        文件第一行如果与列名相同则作为表头跳过；CHAR列的值可以不带引号
+        """
+        table_name = stmt.table_name
+        if self._find_table(table_name) is None:
+            raise SQLError(f"表 {table_name} 不存在")
+
+        file_path = self._resolve_import_path(stmt.file_path)
+        if not os.path.exists(file_path):
+            raise SQLError(f"文件 {stmt.file_path} 不存在")
+
+        schema = self._load_schema(table_name)
+        headers = [column['name'] for column in schema]
+        converters = [_copy_converter(column['type']) for column in schema]
+        ncols = len(schema)
+
+        def converted_rows(reader):
+            for line_no, row in enumerate(reader, 1):
+                if line_no == 1 and row == headers:
+                    continue
+                if not row:
+                    continue
+                if len(row) != ncols:
+                    raise SQLError(f"第 {line_no} 行列数不匹配：期望 {ncols} 列，实际 {len(row)} 列")
+                try:
+                    yield [convert(value) for convert, value in zip(converters, row)]
+                except ValueError as e:
+                    raise SQLError(f"第 {line_no} 行数据类型错误: {str(e)}")
+
+        try:
+            with open(file_path, 'r', encoding='utf-8-sig', newline='') as f:
+                count = self._append_rows(table_name, converted_rows(csv.reader(f)))
+        except SQLError as e:
+            raise SQLError(f"导入数据时出错: {str(e)}")
+        except Exception as e:
+            raise SQLError(f"导入数据时出错: {str(e)}")
+
+        self._invalidate_cache(table_name)
+        self._record_modifications(table_name, inserted=count)
+        return f"导入成功，共 {count} 行"
+
     def validate_data_type(self, value, column_type):
         """验证数据类型是否匹配"""
         try:
@@ -158,26 +569,497 @@ class SQLExecutor:
                 # 确保是浮点数
                 if isinstance(value, (int, str)):
                     try:
-                        float_val = value
+                        float_val = float(value)
                         # 如果输入的是整数（如5），转换为浮点数字符串（如"5.0"）
                         if isinstance(value, (int, str)) and '.' not in str(value):
                             return False, f"FLOAT类型必须包含小数点，请使用'{float_val}'"
+                        if str(value).count('.') != 1:
+                            return False, "FLOAT类型只能包含一个小数点"
                         return True, None
                     except ValueError:
                         return False, f"无法将'{value}'转换为FLOAT类型"
                 return False, f"类型错误：期望FLOAT类型，实际为{type(value)}"
                 
             elif column_type == 'CHAR':
-                # 字符串类型
+                # 字符串类型，必须带引号
                 if not isinstance(value, str):
                     return False, f"类型错误：期望CHAR类型，实际为{type(value)}"
+                if len(value) < 2 or not value.startswith("'") or not value.endswith("'"):
+                    return False, f"类型错误：期望CHAR类型（带引号的字符串），实际为 {value}"
                 return True, None
                 
             return False, f"未知的数据类型：{column_type}"
         except Exception as e:
             return False, f"类型验证错误：{str(e)}"
 
+    def _find_table(self, table_name: str) -> Optional[str]:
+        """在数据目录中查找表（严格匹配，区分大小写）"""
+        for dir_name in os.listdir(self.data_dir):
+            if dir_name == table_name:
+                return dir_name
+        return None
+
+    def _classify_conditions(self, stmt: SelectStatement) -> Tuple[List[Condition], List[Condition]]:
+        """将多表查询的条件分为连接条件和过滤条件"""
+        join_conditions = []
+        filter_conditions = []
+        for condition in stmt.conditions:
+            if (isinstance(condition.value, str) and 
+                '.' in condition.value and 
+                any(table in condition.value for table in stmt.tables)):
+                # 这是一个连接条件（值中包含表名）
+                join_conditions.append(condition)
+            else:
+                filter_conditions.append(condition)
+        return join_conditions, filter_conditions
+
+    def _join_conditions_for(self, table_name: str, join_conditions: List[Condition]) -> List[Condition]:
+        """找到与当前表相关的等值连接条件"""
+        current_join_conditions = []
+        for cond in join_conditions:
+            # 检查条件是否涉及当前表
+            if (table_name in cond.column or 
+                (isinstance(cond.value, str) and table_name in cond.value)):
+                # 确这是一个连接条件（两个表之间的等值条件）
+                if ('.' in cond.column and 
+                    isinstance(cond.value, str) and 
+                    '.' in cond.value and 
+                    cond.operator == '='):  # 只处理等值连接
+                    current_join_conditions.append(cond)
+        return current_join_conditions
+
+    def _plan_select(self, stmt: SelectStatement) -> SelectPlan:
+        """生成SELECT语句的执行计划（与 _execute_select 的执行路径一致）"""
+        for table_name in stmt.tables:
+            if self._find_table(table_name) is None:
+                raise SQLError(f"表 {table_name} 不存在")
+
+        if stmt.columns[0] == ('*', '*'):
+            columns = '*'
+        else:
+            columns = ', '.join(f"{t}.{c}" if t else c for t, c in stmt.columns)
+        project = PlanNode('Project', {'columns': columns})
+        plan = SelectPlan(project, project=project)
+
+        if len(stmt.tables) == 1:
+            # 单表查询：过滤条件在扫描时直接计算
+            table_name = stmt.tables[0]
+            scan = PlanNode('SeqScan', {'table': table_name})
+            if stmt.conditions:
+                scan.detail['filter'] = format_conditions(stmt.conditions)
+            stats = self.db_manager.table_stats.get(table_name)
+            if stats is not None:
+                scan.detail['est_rows'] = stats.estimate_rows(stmt.conditions)
+                project.detail['est_rows'] = scan.detail['est_rows']
+            plan.scans[table_name] = scan
+            project.children.append(scan)
+            return plan
+
+        # 多表查询：按FROM顺序左深嵌套循环连接，过滤条件在连接完成后计算
+        join_conditions, filter_conditions = self._classify_conditions(stmt)
+        all_stats = {t: self.db_manager.table_stats.get(t) for t in stmt.tables}
+        estimated = all(s is not None for s in all_stats.values())
+
+        first_table = stmt.tables[0]
+        current = PlanNode('SeqScan', {'table': first_table})
+        if estimated:
+            current.detail['est_rows'] = all_stats[first_table].row_count
+        plan.scans[first_table] = current
+        for table_name in stmt.tables[1:]:
+            scan = PlanNode('SeqScan', {'table': table_name})
+            plan.scans[table_name] = scan
+            conds = self._join_conditions_for(table_name, join_conditions)
+            join = PlanNode('NestedLoopJoin', {
+                'table': table_name,
+                'condition': ' AND '.join(f"{c.column} = {c.value}" for c in conds) or 'none'
+            }, [current, scan])
+            if estimated:
+                # 等值连接的结果行数估计：|L| * |R| / max(左右连接列的去重值个数)
+                scan.detail['est_rows'] = all_stats[table_name].row_count
+                rows = current.detail['est_rows'] * scan.detail['est_rows']
+                for c in conds:
+                    ndv = max(self._column_distinct(all_stats, c.column),
+                              self._column_distinct(all_stats, c.value))
+                    rows /= max(ndv, 1)
+                join.detail['est_rows'] = int(round(rows))
+            plan.joins[table_name] = join
+            current = join
+
+        if filter_conditions:
+            plan.filter = PlanNode('Filter', {
+                'condition': ' AND '.join(f"{c.column} {c.operator} {c.value}" for c in filter_conditions)
+            }, [current])
+            if estimated:
+                rows = current.detail['est_rows']
+                for c in filter_conditions:
+                    table_name = c.column.split('.')[0]
+                    stats = all_stats.get(table_name)
+                    if stats is not None and stats.row_count:
+                        rows *= stats.estimate_rows([c]) / stats.row_count
+                plan.filter.detail['est_rows'] = int(round(rows))
+            current = plan.filter
+        if estimated:
+            project.detail['est_rows'] = current.detail['est_rows']
+        project.children.append(current)
+        return plan
+
+    @staticmethod
+    def _column_distinct(all_stats, qualified_column: str) -> int:
+        """获取 表.列 的去重值个数估计，没有统计信息时返回1"""
+        if '.' not in qualified_column:
+            return 1
+        table_name, col_name = qualified_column.split('.', 1)
+        stats = all_stats.get(table_name)
+        if stats is None or col_name not in stats.columns:
+            return 1
+        return stats.columns[col_name].n_distinct
+
+    def _execute_analyze(self, stmt: AnalyzeStatement) -> str:
+        """执行ANALYZE语句，收集统计信息并保存到表目录"""
+        if stmt.table_name:
+            if self._find_table(stmt.table_name) is None:
+                raise SQLError(f"表 {stmt.table_name} 不存在")
+            tables = [stmt.table_name]
+        else:
+            tables = sorted(name for name in os.listdir(self.data_dir)
+                            if os.path.exists(self.get_schema_file(name)))
+
+        result_msg = ""
+        for table_name in tables:
+            try:
+                _, rows = self._read_rows(table_name)
+                stats = analyze_table(table_name, rows, self._load_schema(table_name))
+                self.db_manager.table_stats.put(table_name, stats)
+            except Exception as e:
+                raise SQLError(f"分析表 {table_name} 时出错: {str(e)}")
+
+            result_msg += f"表 {table_name} 分析完成: {stats.row_count} 行\n"
+            for col in stats.columns.values():
+                result_msg += (f"  {col.name}: 去重值约 {col.n_distinct} 个, "
+                               f"空值比例 {col.null_frac:.2%}, "
+                               f"范围 [{col.min_value}, {col.max_value}]\n")
+        return result_msg.rstrip('\n')
+
+    def _execute_transaction(self, stmt: TransactionStatement) -> str:
+        """执行 BEGIN / COMMIT / ROLLBACK，事务跨越同一执行器上的多条语句"""
+        if stmt.action == 'BEGIN':
+            if self.transaction is not None:
+                raise SQLError("已有活动事务")
+            self.transaction = self.db_manager.start_transaction()
+            self._transaction_modifications = {}
+            return f"事务 {self.transaction.txid} 已开始"
+
+        if self.transaction is None:
+            raise SQLError("没有活动事务")
+        transaction, self.transaction = self.transaction, None
+        tables, self._transaction_tables = self._transaction_tables, set()
+        modifications, self._transaction_modifications = self._transaction_modifications, {}
+        if stmt.action == 'COMMIT':
+            transaction.commit()
+            # 事务期间其他会话可能按旧数据填充了缓存，提交后修改才可见
+            for table_name in tables:
+                self._invalidate_cache(table_name)
+            for table_name, counts in modifications.items():
+                self._apply_modifications(table_name, *counts)
+            return f"事务 {transaction.txid} 已提交"
+        transaction.rollback()
+        return f"事务 {transaction.txid} 已回滚"
+
+    def _abort_transaction(self):
+        """显式事务被选为死锁牺牲者时回滚并释放它的锁，环路中的其他事务可以继续；之后的语句不再属于该事务"""
+        if self.transaction is None:
+            return
+        transaction, self.transaction = self.transaction, None
+        self._transaction_tables = set()
+        self._transaction_modifications = {}
+        if transaction.active:
+            transaction.rollback()
+
+    def _execute_vacuum(self, stmt: VacuumStatement) -> str:
+        """执行VACUUM语句，清理不再被任何事务需要的旧行版本"""
+        if self.transaction is not None:
+            raise SQLError("VACUUM 不能在事务中执行")
+        if stmt.compression and stmt.compression != NO_COMPRESSION:
+            try:
+                get_codec(stmt.compression)
+            except BlockFormatError as e:
+                raise SQLError(str(e))
+        if stmt.table_name:
+            if self._find_table(stmt.table_name) is None:
+                raise SQLError(f"表 {stmt.table_name} 不存在")
+            tables = [stmt.table_name]
+        else:
+            tables = sorted(name for name in os.listdir(self.data_dir)
+                            if os.path.exists(self.get_schema_file(name)))
+
+        result_msg = ""
+        for table_name in tables:
+            try:
+                removed, frozen = self._vacuum_table(table_name, stmt.compression)
+            except Exception as e:
+                raise SQLError(f"清理表 {table_name} 时出错: {str(e)}")
+            result_msg += f"表 {table_name} 清理完成: 移除 {removed} 个旧版本, 冻结 {frozen} 个行版本"
+            if stmt.compression:
+                result_msg += f", 存储格式已转换为 {stmt.compression}"
+            result_msg += "\n"
+        return result_msg.rstrip('\n')
+
+    def _vacuum_table(self, table_name: str, compression: Optional[str] = None) -> Tuple[int, int]:
+        """
+        清理一张表，返回 (移除的版本数, 冻结的版本数)
+        - 已中止事务插入的版本、在清理边界之前已提交删除的版本被移除
+        - 已中止事务设置的删除标记被清除
+        - 在清理边界之前已提交的插入被冻结（xmin置0），读取时走快速路径
+        - 指定 compression 时转换表的存储格式；分块格式中累积的小块被合并
+        """
+        db_manager = self.db_manager
+        clog = db_manager.clog
+
+        def aborted(xid: int) -> bool:
+            # 先检查是否活动：事务提交时先写提交日志再结束
+            return not db_manager.is_active(xid) and not clog.is_committed(xid)
+
+        with db_manager.table_latch(table_name):
+            horizon = db_manager.vacuum_horizon()
+            headers, versions = read_versions(self.get_storage(table_name))
+            kept = []
+            removed = frozen = 0
+            for row in versions:
+                xmin, xmax = int(row[-2]), int(row[-1])
+                if xmin and aborted(xmin):
+                    removed += 1
+                    continue
+                if xmax:
+                    if xmax < horizon and clog.is_committed(xmax):
+                        removed += 1
+                        continue
+                    if aborted(xmax):
+                        row[-1] = '0'
+                if xmin and xmin < horizon and clog.is_committed(xmin):
+                    row[-2] = '0'
+                    frozen += 1
+                kept.append(row)
+
+            if removed or frozen or compression or self.get_storage(table_name).needs_compaction():
+                transaction = db_manager.start_transaction()
+                try:
+                    self._rewrite_table(table_name, headers + HIDDEN_COLUMNS, kept, transaction,
+                                        compression)
+                except BaseException:
+                    transaction.rollback()
+                    raise
+                transaction.commit()
+            db_manager.dead_versions[table_name] = 0
+        return removed, frozen
+
+    def _execute_explain(self, stmt: ExplainStatement) -> Dict[str, Any]:
+        """执行EXPLAIN / EXPLAIN ANALYZE语句"""
+        plan = self._plan_select(stmt.statement)
+        if not stmt.analyze:
+            return plan.to_result()
+
+        # 每个算子的耗时和行数记录到计划中，结果行读出后直接丢弃
+        start = time.perf_counter()
+        for _ in self._iter_select(stmt.statement, plan):
+            pass
+        return plan.to_result(True, (time.perf_counter() - start) * 1000)
+
     def _execute_select(self, stmt: SelectStatement) -> List[List[Tuple[str, str]]]:
+        """
+        执行SELECT语句，返回全部结果行
+        结果列表与连接的中间结果共用每条查询的内存预算，超出时抛出 SQLError（大结果应使用 stream_select）
+        """
+        budget = MemoryBudget(self.memory_limit)
+        rows = self._iter_select(stmt, budget=budget)
+        try:
+            return budget.collect(rows)
+        finally:
+            rows.close()
+
+    def stream_select(self, stmt: SelectStatement,
+                      budget: Optional[MemoryBudget] = None) -> Iterator[List[Tuple[str, str]]]:
+        """
+        流式执行SELECT语句，逐行返回结果；迭代期间持有语句快照
+        提供 budget 时多表连接使用该预算，调用方可以据此得知结果在内存中占用的大小
+        """
+        with self._measure(stmt) as stats, self._statement_snapshot():
+            for row in self._iter_select(stmt, budget=budget):
+                stats.rows_returned += 1
+                yield row
+
+    def _row_matches(self, headers: List[str], row: List[str], conditions: List[Condition]) -> bool:
+        """单表查询的条件判断（逻辑运算符按从左到右计算）"""
+        # 构建行字典用于条件检查
+        row_dict = {}
+        for i, col in enumerate(headers):
+            value = row[i]
+            # 移除字符串值的引号
+            if isinstance(value, str) and value.startswith("'") and value.endswith("'"):
+                value = value[1:-1]  # 移除首尾的引号
+            row_dict[col] = value
+        
+        # 检查条件
+        conditions_met = True  # 对于 AND 条件，初始值为 True
+        last_logic_op = None
+        
+        for condition in conditions:
+            # 获取列名（去掉表名前缀）
+            if '.' in condition.column:
+                _, col_name = condition.column.split('.')
+            else:
+                col_name = condition.column
+            
+            # 验证列名大小写
+            if col_name not in headers:
+                raise SQLError(f"列名大小写不匹配: {col_name}")
+            
+            col_val = row_dict[col_name]
+            condition_value = condition.value
+            
+            # 去除引号并转换类型
+            if isinstance(col_val, str):
+                col_val = col_val.strip("'")
+            if isinstance(condition_value, str):
+                condition_value = condition_value.strip("'")
+            
+            # 尝试转换为数字
+            try:
+                if col_val.isdigit():
+                    col_val = int(col_val)
+                elif '.' in col_val:
+                    col_val = float(col_val)
+                
+                if isinstance(condition_value, str):
+                    if condition_value.isdigit():
+                        condition_value = int(condition_value)
+                    elif '.' in condition_value:
+                        condition_value = float(condition_value)
+            except (ValueError, AttributeError):
+                pass
+            
+            # 计算当前条件的结果
+            current_result = self._compare_values(col_val, condition.operator, condition_value)
+            
+            # 处理逻辑运算符
+            if last_logic_op is None:
+                conditions_met = current_result
+            elif last_logic_op == 'AND':
+                conditions_met = conditions_met and current_result
+            elif last_logic_op == 'OR':
+                conditions_met = conditions_met or current_result
+            
+            last_logic_op = condition.logic_op
+        
+        return conditions_met
+
+    def _pushdown_filters(self, table_name: str,
+                          conditions: List[Condition]) -> Tuple[RowFilter, List[Condition]]:
+        """
+        把单表查询中必须成立的条件转换为存储层的按列过滤函数，返回 (过滤函数, 仍需逐行判断的条件)
+        逻辑运算符从左到右计算，只有其后全部以 AND 连接的条件才是必要条件；
+        所有条件都以 AND 连接时，下推的条件不再逐行判断
+        """
+        headers = self.get_storage(table_name).header()
+        if is_versioned(headers):
+            headers = headers[:-HIDDEN_COUNT]
+        columns = [c.column.split('.')[-1] for c in conditions]
+        if any(col_name not in headers for col_name in columns):
+            # 列名错误由逐行判断报告
+            return {}, conditions
+        column_types = {col['name']: col['type'] for col in self._load_schema(table_name)}
+
+        last = len(conditions) - 1
+        pushed: Dict[int, List[Condition]] = {}
+        for k, condition in enumerate(conditions):
+            if all(c.logic_op == 'AND' for c in conditions[max(k - 1, 0):last]):
+                pushed.setdefault(headers.index(columns[k]), []).append(condition)
+
+        filters = {}
+        for i, column_conditions in pushed.items():
+            col_headers = [headers[i]]
+            bounds = []
+            if column_types.get(headers[i]) in (DataType.INT, DataType.FLOAT):
+                # 与数值常量比较时（见 _row_matches 的类型转换）可以用块的最小/最大值跳过整块
+                for c in column_conditions:
+                    number = self._numeric_constant(c.value)
+                    if number is not None and c.operator in ('=', '>', '<', '>=', '<=', '<>'):
+                        bounds.append((c.operator, number))
+            filters[i] = ColumnPredicate(
+                lambda value, col_headers=col_headers, column_conditions=column_conditions:
+                    all(self._row_matches(col_headers, [value], [c]) for c in column_conditions),
+                bounds, exact=len(bounds) == len(column_conditions))
+
+        if all(c.logic_op == 'AND' for c in conditions[:last]):
+            pushed_ids = {id(c) for column_conditions in pushed.values() for c in column_conditions}
+            return filters, [c for c in conditions if id(c) not in pushed_ids]
+        return filters, conditions
+
+    @staticmethod
+    def _numeric_constant(value) -> Optional[float]:
+        """条件中的常量按 _row_matches 的规则会转换为数值时返回该数值，否则返回None"""
+        if isinstance(value, bool):
+            return None
+        if isinstance(value, (int, float)):
+            return float(value)
+        if isinstance(value, str):
+            value = value.strip("'")
+            try:
+                if value.isdigit() or '.' in value:
+                    return float(value)
+            except ValueError:
+                pass
+        return None
+
+    def describe(self, stmt: SelectStatement) -> List[Tuple[str, Optional[str]]]:
+        """返回SELECT结果列的 [(列名, 类型名), ...]，无法确定类型的列类型为None"""
+        schemas = {}
+        for table_name in stmt.tables:
+            actual_table_name = self._find_table(table_name)
+            if actual_table_name is None:
+                raise SQLError(f"表 {table_name} 不存在")
+            schemas[table_name] = self._load_schema(actual_table_name)
+
+        if stmt.columns[0] == ('*', '*'):
+            return [(col['name'], col['type'].name)
+                    for schema in schemas.values() for col in schema]
+
+        columns = []
+        for table_name, col_name in stmt.columns:
+            candidates = [schemas[table_name]] if table_name in schemas else schemas.values()
+            data_type = next((col['type'].name for schema in candidates for col in schema
+                              if col['name'] == col_name), None)
+            columns.append((col_name, data_type))
+        return columns
+
+    def plan_text(self, stmt: Any) -> Optional[str]:
+        """SELECT（或 EXPLAIN 中的SELECT）语句的执行计划文本，其他语句返回None"""
+        if isinstance(stmt, ExplainStatement):
+            stmt = stmt.statement
+        if not isinstance(stmt, SelectStatement):
+            return None
+        return '\n'.join(self._plan_select(stmt).root.format())
+
+    def _projector(self, stmt: SelectStatement, headers: List[str]):
+        """返回把数据行转换为结果行 [(列名, 值), ...] 的函数"""
+        if stmt.columns[0] == ('*', '*'):
+            # 添加所有列
+            return lambda row: list(zip(headers, row))
+
+        # 添加指定列
+        indexes = []
+        for table_name, col_name in stmt.columns:
+            if col_name not in headers:
+                raise SQLError(f"列名大小写不匹配: {col_name}")
+            indexes.append((col_name, headers.index(col_name)))
+        return lambda row: [(col_name, row[i]) for col_name, i in indexes]
+
+    def _iter_select(self, stmt: SelectStatement, plan: Optional[SelectPlan] = None,
+                     budget: Optional[MemoryBudget] = None) -> Iterator[List[Tuple[str, str]]]:
+        """
+        逐行产生SELECT语句的结果
+        单表查询不记录统计时边读边返回；多表连接先完成连接再逐行返回，
+        各步的中间结果受每条查询的内存预算（未提供 budget 时新建）限制，超出时写入临时文件
+        """
         try:
             if len(stmt.tables) == 1:
                 # 单表查询
@@ -193,109 +1075,55 @@ class SQLExecutor:
                 if actual_table_name is None:
                     raise SQLError(f"表 {table_name} 不存在")
                 
-                data_file = self.get_table_file(actual_table_name)
-                
-                # 读取数据
-                with open(data_file, 'r', encoding='utf-8', newline='') as f:
-                    reader = csv.reader(f)
-                    headers = next(reader)
-                    rows = list(reader)
+                storage = self.get_storage(actual_table_name)
                 
+                # 读取数据（不需要记录算子统计时逐行流式读取、过滤和投影，
+                # 必须成立的条件下推到存储层按列过滤）
+                stage_start = time.perf_counter()
+                conditions = stmt.conditions
+                filters = None
+                if plan is None and conditions:
+                    filters, conditions = self._pushdown_filters(actual_table_name, conditions)
+                headers, rows = self._read_rows(actual_table_name, stream=plan is None, filters=filters)
+                project = self._projector(stmt, headers)
+                if self.trace is not None and self.trace.enabled(DEBUG):
+                    self.trace.event(DEBUG, '读取表', table=table_name, headers=headers,
+                                     pushed_down=len(filters or ()),
+                                     filter=format_conditions(conditions or []))
+
+                if plan is None:
+                    stats = self.stats
+                    for row in rows:
+                        stats.rows_scanned += 1
+                        if not conditions or self._row_matches(headers, row, conditions):
+                            yield project(row)
+                    return
+
                 # 过滤数据
-                filtered_rows = []
-                for row in rows:
-                    # 构建行字典用于条件检查
-                    row_dict = {}
-                    for i, col in enumerate(headers):
-                        value = row[i]
-                        # 移除字符串值的引号
-                        if isinstance(value, str) and value.startswith("'") and value.endswith("'"):
-                            value = value[1:-1]  # 移除首尾的引号
-                        row_dict[col] = value
-                    
-                    # 如果没有条件，添加所有行
-                    if not stmt.conditions:
-                        filtered_rows.append(row)
-                        continue
-                    
-                    # 检查条件
-                    conditions_met = True  # 对于 AND 条件，初始值为 True
-                    last_logic_op = None
-                    
-                    for condition in stmt.conditions:
-                        # 获取列名（去掉表名前缀）
-                        if '.' in condition.column:
-                            _, col_name = condition.column.split('.')
-                        else:
-                            col_name = condition.column
-                        
-                        # 验证列名大小写
-                        if col_name not in headers:
-                            raise SQLError(f"列名大小写不匹配: {col_name}")
-                        
-                        col_val = row_dict[col_name]
-                        condition_value = condition.value
-                        
-                        # 去除引号并转换类型
-                        if isinstance(col_val, str):
-                            col_val = col_val.strip("'")
-                        if isinstance(condition_value, str):
-                            condition_value = condition_value.strip("'")
-                        
-                        # 尝试转换为数字
-                        try:
-                            if col_val.isdigit():
-                                col_val = int(col_val)
-                            elif '.' in col_val:
-                                col_val = float(col_val)
-                        
-                            if isinstance(condition_value, str):
-                                if condition_value.isdigit():
-                                    condition_value = int(condition_value)
-                                elif '.' in condition_value:
-                                    condition_value = float(condition_value)
-                        except (ValueError, AttributeError):
-                            pass
-                        
-                        # 计算当前条件的结果
-                        current_result = self._compare_values(col_val, condition.operator, condition_value)
-                        
-                        # 处理逻辑运算符
-                        if last_logic_op is None:
-                            conditions_met = current_result
-                        elif last_logic_op == 'AND':
-                            conditions_met = conditions_met and current_result
-                        elif last_logic_op == 'OR':
-                            conditions_met = conditions_met or current_result
-                        
-                        last_logic_op = condition.logic_op
-                    
-                    if conditions_met:
-                        filtered_rows.append(row)
-                
+                filtered_rows = [row for row in rows
+                                 if not conditions or self._row_matches(headers, row, conditions)]
+
+                plan.scans[table_name].record(time.perf_counter() - stage_start,
+                                              len(rows), len(filtered_rows),
+                                              storage.size())
+                stage_start = time.perf_counter()
+
                 # 构建结果
-                result = []
-                for row in filtered_rows:
-                    row_data = []
-                    if stmt.columns[0] == ('*', '*'):
-                        # 添加所有列
-                        for i, header in enumerate(headers):
-                            row_data.append((header, row[i]))
-                    else:
-                        # 添加指定列
-                        for table_name, col_name in stmt.columns:
-                            if col_name not in headers:
-                                raise SQLError(f"列名大小写不匹配: {col_name}")
-                            col_index = headers.index(col_name)
-                            row_data.append((col_name, row[col_index]))
-                    result.append(row_data)
-                
-                return result
+                result = [project(row) for row in filtered_rows]
+                plan.project.record(time.perf_counter() - stage_start,
+                                    len(filtered_rows), len(result))
+
+                yield from result
+                return
                 
             else:
                 # 多表连接查询
                 tables_data = {}
                 tables_headers = {}
+                # 跟踪级别在循环外判断，关闭跟踪时逐行循环中只有一次局部变量判断
+                trace = self.trace
+                debug = trace is not None and trace.enabled(DEBUG)
+                detail = trace is not None and trace.enabled(TRACE)
                 
                 # 首先验证表名是否存在（区分大小写）
                 for table_name in stmt.tables:
@@ -308,45 +1136,48 @@ class SQLExecutor:
                     if actual_table_name is None:
                         raise SQLError(f"表 {table_name} 不存在或大小写不匹配")
                     
-                    file_path = self.get_table_file(actual_table_name)
-                    with open(file_path, 'r', encoding='utf-8', newline='') as f:
-                        reader = csv.reader(f)
-                        headers = next(reader)
-                        tables_headers[actual_table_name] = headers
-                        tables_data[actual_table_name] = list(reader)
-                    print(f"读取表 {table_name} 的数据:")  # 调试输出
-                    print(f"表头: {headers}")
-                    print(f"数据: {tables_data[actual_table_name]}")
+                    storage = self.get_storage(actual_table_name)
+                    stage_start = time.perf_counter()
+                    headers, rows = self._read_rows(actual_table_name)
+                    tables_headers[actual_table_name] = headers
+                    tables_data[actual_table_name] = rows
+                    if plan is not None:
+                        plan.scans[table_name].record(time.perf_counter() - stage_start, 0,
+                                                      len(tables_data[actual_table_name]),
+                                                      storage.size())
+                    if debug:
+                        trace.event(DEBUG, '读取表', table=table_name, headers=headers, rows=len(rows))
+                    if detail:
+                        trace.event(TRACE, '表数据', table=table_name, data=rows)
+
+                # 各表数据在内存中完成连接，直接计入预算；中间结果超出预算时写入临时文件
+                if budget is None:
+                    budget = MemoryBudget(self.memory_limit)
+                input_bytes = sum(estimate_rows_size(rows) for rows in tables_data.values())
+                budget.charge(input_bytes)
 
                 # 找到所有连接条件和过滤条件
-                join_conditions = []
-                filter_conditions = []
-                for condition in stmt.conditions:
-                    if (isinstance(condition.value, str) and 
-                        '.' in condition.value and 
-                        any(table in condition.value for table in stmt.tables)):
-                        # 这是一个连接条件（值中包含表名）
-                        join_conditions.append(condition)
-                    else:
-                        # 这是一个过滤条件
-                        if '.' in condition.column:
-                            table_name, col_name = condition.column.split('.')
-                            if table_name not in tables_data:
-                                raise SQLError(f"表名大小写不匹配: {table_name}")
-                            if col_name not in tables_headers[table_name]:
-                                raise SQLError(f"列名大小写不匹配: {table_name}.{col_name}")
-                        filter_conditions.append(condition)
-
-                print(f"连接条件: {join_conditions}")  # 调试输出
-                print(f"过滤条件: {filter_conditions}")  # 调试输出
+                join_conditions, filter_conditions = self._classify_conditions(stmt)
+                for condition in filter_conditions:
+                    if '.' in condition.column:
+                        table_name, col_name = condition.column.split('.')
+                        if table_name not in tables_data:
+                            raise SQLError(f"表名大小写不匹配: {table_name}")
+                        if col_name not in tables_headers[table_name]:
+                            raise SQLError(f"列名大小写不匹配: {table_name}.{col_name}")
+
+                if debug:
+                    trace.event(DEBUG, '条件分类', join=format_conditions(join_conditions),
+                                filter=format_conditions(filter_conditions))
 
                 if not join_conditions:
                     raise SQLError("未找到有效的连接条件")
 
                 # 执行连接
                 # 从第一个表开始，逐步与其他表连接
-                result_rows = []
                 first_table = stmt.tables[0]
+                result_rows = budget.buffer(first_table)
+                stage_start = time.perf_counter()
                 
                 # 初始化结果集
                 for row in tables_data[first_table]:
@@ -373,24 +1204,17 @@ class SQLExecutor:
                     row_dict = {f"{first_table}.{header}": value 
                                for header, value in zip(tables_headers[first_table], processed_row)}
                     result_rows.append(row_dict)
+                if plan is not None:
+                    plan.scans[first_table].record(time.perf_counter() - stage_start)
 
                 # 与其他表逐个连接
                 for i in range(1, len(stmt.tables)):
                     current_table = stmt.tables[i]
-                    new_result_rows = []
+                    new_result_rows = budget.buffer(current_table)
+                    stage_start = time.perf_counter()
 
                     # 找到与当前表相关的连接条件
-                    current_join_conditions = []
-                    for cond in join_conditions:
-                        # 检查条件是否涉及当前表
-                        if (current_table in cond.column or 
-                            (isinstance(cond.value, str) and current_table in cond.value)):
-                            # 确这是一个连接条件（两个表之间的等值条件）
-                            if ('.' in cond.column and 
-                                isinstance(cond.value, str) and 
-                                '.' in cond.value and 
-                                cond.operator == '='):  # 只处理等值连接
-                                current_join_conditions.append(cond)
+                    current_join_conditions = self._join_conditions_for(current_table, join_conditions)
 
                     # 对每个现有的结果行，尝试与当前表的行连接
                     for result_row in result_rows:
@@ -445,9 +1269,11 @@ class SQLExecutor:
                                 except (ValueError, AttributeError):
                                     pass
                                 
-                                print(f"连接条件比较: {join_condition.column} = {join_condition.value}")
-                                print(f"值比较: {val1} ({type(val1)}) == {val2} ({type(val2)})")
-                                
+                                if detail:
+                                    trace.event(TRACE, '连接条件比较',
+                                                condition=f"{join_condition.column} = {join_condition.value}",
+                                                left=val1, right=val2, matched=val1 == val2)
+
                                 if val1 != val2:
                                     conditions_met = False
                                     break
@@ -456,18 +1282,24 @@ class SQLExecutor:
                                 new_row = result_row.copy()
                                 new_row.update(current_dict)
                                 new_result_rows.append(new_row)
-                                print(f"添加新行: {new_row}")  # 调试输出
+                                if detail:
+                                    trace.event(TRACE, '连接结果行', row=new_row)
 
+                    if plan is not None:
+                        plan.joins[current_table].record(
+                            time.perf_counter() - stage_start,
+                            len(result_rows) + len(tables_data[current_table]),
+                            len(new_result_rows))
+                    result_rows.close()
                     result_rows = new_result_rows
-
-                # 在过滤条件处理之前
-                print(f"过滤前的行数: {len(result_rows)}")  # 调试输出
-                for row in result_rows:
-                    print(f"过滤前的行: {row}")
+                    if debug:
+                        trace.event(DEBUG, '连接完成', table=current_table, rows=len(result_rows),
+                                    spilled_partitions=result_rows.partitions)
 
                 # 应用过滤条件
                 if filter_conditions:
-                    filtered_rows = []
+                    stage_start = time.perf_counter()
+                    filtered_rows = budget.buffer('filter')
                     for row in result_rows:
                         conditions_met = True
                         for condition in filter_conditions:
@@ -502,9 +1334,6 @@ class SQLExecutor:
                             except ValueError:
                                 pass
 
-                            print(f"过滤条件: {condition.column} {condition.operator} {condition.value}")
-                            print(f"比较值: {val1} ({type(val1)}) {condition.operator} {val2} ({type(val2)})")
-                            
                             # 确保数值比较时类型一致
                             if isinstance(val1, (int, float)) or isinstance(val2, (int, float)):
                                 try:
@@ -514,7 +1343,10 @@ class SQLExecutor:
                                     pass
                             
                             compare_result = self._compare_values(val1, condition.operator, val2)
-                            print(f"比较结果: {compare_result}")
+                            if detail:
+                                trace.event(TRACE, '过滤条件比较',
+                                            condition=f"{condition.column} {condition.operator} {condition.value}",
+                                            left=val1, right=val2, matched=compare_result)
                             
                             if not compare_result:
                                 conditions_met = False
@@ -522,14 +1354,19 @@ class SQLExecutor:
                         
                         if conditions_met:
                             filtered_rows.append(row)
-                            print(f"添加过滤后的行: {row}")
-                    
+
+                    if plan is not None:
+                        plan.filter.record(time.perf_counter() - stage_start,
+                                           len(result_rows), len(filtered_rows))
+                    result_rows.close()
                     result_rows = filtered_rows
 
-                print(f"最终结果行数: {len(result_rows)}")  # 调试输出
+                if debug:
+                    trace.event(DEBUG, '过滤完成', rows=len(result_rows))
 
                 # 构建最终结果
-                result = []
+                stage_start = time.perf_counter()
+                result = budget.buffer('project')
                 for row in result_rows:
                     row_data = []
                     for table_name, col_name in stmt.columns:
@@ -547,13 +1384,30 @@ class SQLExecutor:
                         row_data.append((col_name, val))
                     result.append(row_data)
 
-                return result
+                if plan is not None:
+                    plan.project.record(time.perf_counter() - stage_start,
+                                        len(result_rows), len(result))
+                result_rows.close()
+                if debug and budget.spilled_partitions:
+                    trace.event(DEBUG, '写入临时文件', partitions=budget.spilled_partitions,
+                                rows=budget.spilled_rows, bytes=budget.spilled_bytes)
+
+                # 逐行返回结果期间（如游标分批获取）不再持有输入表
+                tables_data = rows = None
+                budget.release(input_bytes)
+                yield from result
 
         except Exception as e:
             if str(e):
                 raise SQLError(f"查询数据时出错: {str(e)}")
             else:
                 raise SQLError("查询数据时出错: 未知错误")
+        finally:
+            # 查询结束、出错或结果未取完被关闭时删除临时文件
+            if budget is not None:
+                budget.close()
+                self.stats.track_memory(budget.peak)
+                self.stats.spilled_bytes += budget.spilled_bytes
 
     def _perform_join(self, tables_data: Dict[str, List[Dict]], conditions: List[Condition]) -> List[Dict]:
         """执行连接操作"""
@@ -682,7 +1536,7 @@ class SQLExecutor:
             
             # 获取文件路径
             schema_file = self.get_schema_file(actual_table_name)
-            data_file = self.get_table_file(actual_table_name)
+            storage = self.get_storage(actual_table_name)
             
             # 读取表结构
             schema = []
@@ -708,122 +1562,148 @@ class SQLExecutor:
                 if update_col_schema['type'] not in (DataType.INT, DataType.FLOAT):
                     raise SQLError(f"列 {stmt.value.column} 不是数值类型")
             
-            # 读取数据
-            with open(data_file, 'r', encoding='utf-8', newline='') as f:
-                reader = csv.reader(f)
-                headers = next(reader)
-                rows = list(reader)
+            while True:
+                try:
+                    with self._table_write(actual_table_name) as transaction:
+                        # 读取所有行版本（快照在持有写闩后创建，能看到之前所有已提交的修改）
+                        snapshot = self.db_manager.snapshot(transaction)
+                        headers, versions = read_versions(storage)
+                        self.stats.rows_scanned += len(versions)
+                        self.stats.bytes_read += storage.size()
+                        self.stats.track_memory(estimate_rows_size(versions))
+                        txid = str(transaction.txid)
             
-            # 找到要更新的列引
-            try:
-                col_index = headers.index(stmt.column)
-            except ValueError:
-                raise SQLError(f"列 {stmt.column} 不存在")
+                        # 找到要更新的列引
+                        try:
+                            col_index = headers.index(stmt.column)
+                        except ValueError:
+                            raise SQLError(f"列 {stmt.column} 不存在")
             
-            # 更新数据
-            update_count = 0
-            updated_rows = []  # 存储更新的行信息
+                        # 更新数据
+                        update_count = 0
+                        updated_rows = []  # 存储更新的行信息
+                        new_versions = []  # 更新产生的新行版本
+                        old_versions = []  # 被标记删除的旧行版本
             
-            for row in rows:
-                # 构建行字典用于件查
-                row_dict = {headers[i]: val for i, val in enumerate(row)}
+                        for row in versions:
+                            # 只处理对快照可见的行版本
+                            if not snapshot.is_visible(row[-2], row[-1]):
+                                continue
+
+                            # 构建行字典用于件查（不含隐藏列）
+                            row_dict = dict(zip(headers, row))
                 
-                # 检查条件
-                conditions_met = True
-                if stmt.conditions:
-                    for condition in stmt.conditions:
-                        # 获取列名（去掉表名前缀）
-                        if '.' in condition.column:
-                            _, col_name = condition.column.split('.')
-                        else:
-                            col_name = condition.column
+                            # 检查条件
+                            conditions_met = True
+                            if stmt.conditions:
+                                for condition in stmt.conditions:
+                                    # 获取列名（去掉表名前缀）
+                                    if '.' in condition.column:
+                                        _, col_name = condition.column.split('.')
+                                    else:
+                                        col_name = condition.column
                         
-                        # 验证列名大小写
-                        if col_name not in headers:
-                            raise SQLError(f"列名大小写不匹配: {col_name}")
+                                    # 验证列名大小写
+                                    if col_name not in headers:
+                                        raise SQLError(f"列名大小写不匹配: {col_name}")
                         
-                        val = row_dict[col_name]
-                        condition_value = condition.value
+                                    val = row_dict[col_name]
+                                    condition_value = condition.value
                         
-                        # 去除引号并转换类型
-                        if isinstance(val, str):
-                            val = val.strip("'")
-                        if isinstance(condition_value, str):
-                            condition_value = condition_value.strip("'")
+                                    # 去除引号并转换类型
+                                    if isinstance(val, str):
+                                        val = val.strip("'")
+                                    if isinstance(condition_value, str):
+                                        condition_value = condition_value.strip("'")
                         
-                        # 尝试转换为数字
-                        try:
-                            if isinstance(val, str):
-                                if val.isdigit():
-                                    val = int(val)
-                                elif '.' in val:
-                                    val = float(val)
-                            if isinstance(condition_value, str):
-                                if condition_value.isdigit():
-                                    condition_value = int(condition_value)
-                                elif '.' in condition_value:
-                                    condition_value = float(condition_value)
-                        except (ValueError, AttributeError):
-                            pass
+                                    # 尝试转换为数字
+                                    try:
+                                        if isinstance(val, str):
+                                            if val.isdigit():
+                                                val = int(val)
+                                            elif '.' in val:
+                                                val = float(val)
+                                        if isinstance(condition_value, str):
+                                            if condition_value.isdigit():
+                                                condition_value = int(condition_value)
+                                            elif '.' in condition_value:
+                                                condition_value = float(condition_value)
+                                    except (ValueError, AttributeError):
+                                        pass
                         
-                        if not self._compare_values(val, condition.operator, condition_value):
-                            conditions_met = False
-                            break
+                                    if not self._compare_values(val, condition.operator, condition_value):
+                                        conditions_met = False
+                                        break
                 
-                # 如果满足条件更新值
-                if conditions_met:
-                    old_value = row[col_index]
+                            # 如果满足条件更新值
+                            if conditions_met:
+                                old_value = row[col_index]
                     
-                    if isinstance(stmt.value, UpdateValue):
-                        # 获取当前列的值
-                        current_val = row_dict[stmt.value.column]
-                        if isinstance(current_val, str):
-                            current_val = current_val.strip("'")
+                                if isinstance(stmt.value, UpdateValue):
+                                    # 获取当前列的值
+                                    current_val = row_dict[stmt.value.column]
+                                    if isinstance(current_val, str):
+                                        current_val = current_val.strip("'")
                         
-                        # 转为数字
-                        if '.' in current_val:
-                            current_val = float(current_val)
-                        else:
-                            current_val = int(current_val)
+                                    # 转为数字
+                                    if '.' in current_val:
+                                        current_val = float(current_val)
+                                    else:
+                                        current_val = int(current_val)
                         
-                        # 执行算术运算
-                        update_val = float(stmt.value.value)
-                        if stmt.value.operator == '+':
-                            result = current_val + update_val
-                        elif stmt.value.operator == '-':
-                            result = current_val - update_val
-                        elif stmt.value.operator == '*':
-                            result = current_val * update_val
-                        elif stmt.value.operator == '/':
-                            result = current_val / update_val
+                                    # 执行算术运算
+                                    update_val = float(stmt.value.value)
+                                    if stmt.value.operator == '+':
+                                        result = current_val + update_val
+                                    elif stmt.value.operator == '-':
+                                        result = current_val - update_val
+                                    elif stmt.value.operator == '*':
+                                        result = current_val * update_val
+                                    elif stmt.value.operator == '/':
+                                        result = current_val / update_val
                         
-                        # 格式化结果
-                        if col_schema['type'] == DataType.INT:
-                            formatted_value = str(int(result))
-                        else:
-                            formatted_value = str(float(result))
-                    else:
-                        # 处理普通值
-                        formatted_value = str(stmt.value)
+                                    # 格式化结果
+                                    if col_schema['type'] == DataType.INT:
+                                        formatted_value = str(int(result))
+                                    else:
+                                        formatted_value = str(float(result))
+                                else:
+                                    # 处理普通值
+                                    formatted_value = str(stmt.value)
                     
-                    # 只有当新值与旧值不同时才更新
-                    if formatted_value != old_value:
-                        # 保存更新信息
-                        updated_rows.append({
-                            'row': dict(zip(headers, row)),
-                            'column': stmt.column,
-                            'old_value': old_value,
-                            'new_value': formatted_value
-                        })
+                                # 只有当新值与旧值不同时才更新
+                                if formatted_value != old_value:
+                                    self._lock_row(transaction, actual_table_name, row)
+                                    self._check_write_conflict(row, transaction, self.db_manager)
+
+                                    # 保存更新信息
+                                    updated_rows.append({
+                                        'row': row_dict,
+                                        'column': stmt.column,
+                                        'old_value': old_value,
+                                        'new_value': formatted_value
+                                    })
                         
-                        row[col_index] = formatted_value
-                        update_count += 1
+                                    # 旧版本标记为被当前事务删除，追加新版本（行ID不变）
+                                    new_row = row[:len(headers)]
+                                    new_row[col_index] = formatted_value
+                                    new_versions.append(new_row + [row[-HIDDEN_COUNT], txid, '0'])
+                                    row[-1] = txid
+                                    old_versions.append(row)
+                                    update_count += 1
             
-            # 写回文件
-            with open(data_file, 'w', encoding='utf-8', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
-                writer.writerows(rows)
+                        # 写回文件
+                        if update_count:
+                            self._modify_table(actual_table_name, headers + HIDDEN_COLUMNS, versions,
+                                               old_versions, new_versions, transaction)
+                    break
+                except LockConflict as conflict:
+                    # 行被其他事务锁定：释放表写闩后等待，再重新扫描
+                    self._wait_for_lock(conflict)
+            self.stats.rows_written += update_count
+            self._invalidate_cache(actual_table_name)
+            self._record_modifications(actual_table_name, updated=update_count)
+            self._maybe_vacuum(actual_table_name, update_count)
             
             # 构建更新结果消息
             result_msg = f"更新了 {update_count} 行数据\n"
@@ -870,76 +1750,93 @@ class SQLExecutor:
                 raise SQLError(f"表 {table_name} 不存在")
             
             # 获取文件路径
-            data_file = self.get_table_file(actual_table_name)
-            
-            # 读取数据
-            with open(data_file, 'r', encoding='utf-8', newline='') as f:
-                reader = csv.reader(f)
-                headers = next(reader)
-                rows = list(reader)
-            
-            # 存储删除的行信息
-            deleted_rows = []
-            remaining_rows = []
-            
-            # 处理每一行
-            for row in rows:
-                # 构建行字典用于条件检查
-                row_dict = {headers[i]: val for i, val in enumerate(row)}
+            storage = self.get_storage(actual_table_name)
+            
+            while True:
+                try:
+                    with self._table_write(actual_table_name) as transaction:
+                        # 读取所有行版本（快照在持有写闩后创建）
+                        snapshot = self.db_manager.snapshot(transaction)
+                        headers, versions = read_versions(storage)
+                        self.stats.rows_scanned += len(versions)
+                        self.stats.bytes_read += storage.size()
+                        self.stats.track_memory(estimate_rows_size(versions))
+                        txid = str(transaction.txid)
+            
+                        # 存储删除的行信息
+                        deleted_rows = []
+                        deleted_versions = []
+            
+                        # 处理每一个可见的行版本
+                        for row in versions:
+                            if not snapshot.is_visible(row[-2], row[-1]):
+                                continue
+
+                            # 构建行字典用于条件检查（不含隐藏列）
+                            row_dict = dict(zip(headers, row))
                 
-                # 检查条件
-                conditions_met = True
-                if stmt.conditions:
-                    for condition in stmt.conditions:
-                        # 获取列名（去掉表名前缀）
-                        if '.' in condition.column:
-                            _, col_name = condition.column.split('.')
-                        else:
-                            col_name = condition.column
+                            # 检查条件
+                            conditions_met = True
+                            if stmt.conditions:
+                                for condition in stmt.conditions:
+                                    # 获取列名（去掉表名前缀）
+                                    if '.' in condition.column:
+                                        _, col_name = condition.column.split('.')
+                                    else:
+                                        col_name = condition.column
                         
-                        # 验证列名大小写
-                        if col_name not in headers:
-                            raise SQLError(f"列名大小写不匹配: {col_name}")
+                                    # 验证列名大小写
+                                    if col_name not in headers:
+                                        raise SQLError(f"列名大小写不匹配: {col_name}")
                         
-                        val = row_dict[col_name]
-                        condition_value = condition.value
+                                    val = row_dict[col_name]
+                                    condition_value = condition.value
                         
-                        # 去除引号并转换类型
-                        if isinstance(val, str):
-                            val = val.strip("'")
-                        if isinstance(condition_value, str):
-                            condition_value = condition_value.strip("'")
+                                    # 去除引号并转换类型
+                                    if isinstance(val, str):
+                                        val = val.strip("'")
+                                    if isinstance(condition_value, str):
+                                        condition_value = condition_value.strip("'")
                         
-                        # 尝试转换为数字
-                        try:
-                            if isinstance(val, str):
-                                if val.isdigit():
-                                    val = int(val)
-                                elif '.' in val:
-                                    val = float(val)
-                            if isinstance(condition_value, str):
-                                if condition_value.isdigit():
-                                    condition_value = int(condition_value)
-                                elif '.' in condition_value:
-                                    condition_value = float(condition_value)
-                        except (ValueError, AttributeError):
-                            pass
+                                    # 尝试转换为数字
+                                    try:
+                                        if isinstance(val, str):
+                                            if val.isdigit():
+                                                val = int(val)
+                                            elif '.' in val:
+                                                val = float(val)
+                                        if isinstance(condition_value, str):
+                                            if condition_value.isdigit():
+                                                condition_value = int(condition_value)
+                                            elif '.' in condition_value:
+                                                condition_value = float(condition_value)
+                                    except (ValueError, AttributeError):
+                                        pass
                         
-                        if not self._compare_values(val, condition.operator, condition_value):
-                            conditions_met = False
-                            break
+                                    if not self._compare_values(val, condition.operator, condition_value):
+                                        conditions_met = False
+                                        break
                 
-                # 如果满足条件，添加到删除列表；否则保留
-                if conditions_met:
-                    deleted_rows.append(row_dict)
-                else:
-                    remaining_rows.append(row)
-            
-            # 写回文件
-            with open(data_file, 'w', encoding='utf-8', newline='') as f:
-                writer = csv.writer(f)
-                writer.writerow(headers)
-                writer.writerows(remaining_rows)
+                            # 如果满足条件，标记行版本被当前事务删除（VACUUM时才物理删除）
+                            if conditions_met:
+                                self._lock_row(transaction, actual_table_name, row)
+                                self._check_write_conflict(row, transaction, self.db_manager)
+                                deleted_rows.append(row_dict)
+                                row[-1] = txid
+                                deleted_versions.append(row)
+            
+                        # 写回文件
+                        if deleted_rows:
+                            self._modify_table(actual_table_name, headers + HIDDEN_COLUMNS, versions,
+                                               deleted_versions, [], transaction)
+                    break
+                except LockConflict as conflict:
+                    # 行被其他事务锁定：释放表写闩后等待，再重新扫描
+                    self._wait_for_lock(conflict)
+            self.stats.rows_written += len(deleted_rows)
+            self._invalidate_cache(actual_table_name)
+            self._record_modifications(actual_table_name, deleted=len(deleted_rows))
+            self._maybe_vacuum(actual_table_name, len(deleted_rows))
             
             # 构建删除结果消息
             result_msg = f"删除了 {len(deleted_rows)} 行数据\n"
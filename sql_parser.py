@@ -1,10 +1,15 @@
-from sly import Lexer, Parser
+from sly import Lexer
 import os
 import csv
 from typing import List, Tuple, Any, Optional
 from dataclasses import dataclass
 from enum import Enum, auto
 
+from parser_tables import CachedParser
+
+# 默认数据目录
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
 # 自定义异常类
 class SQLError(Exception):
     """SQL错误的基类"""
@@ -65,11 +70,18 @@ class SQLStatement:
 @dataclass
 class CreateTableStatement(SQLStatement):
     table: Table
+    compression: Optional[str] = None  # 分块压缩格式使用的压缩算法，为空时使用CSV格式
 
 @dataclass
 class InsertStatement(SQLStatement):
     table_name: str
-    values: List[Any]
+    rows: List[List[Any]]  # 每个元素为一个 VALUES (...) 元组
+
+@dataclass
+class CopyStatement(SQLStatement):
+    """COPY 表名 FROM '文件路径'，批量导入CSV文件"""
+    table_name: str
+    file_path: str
 
 @dataclass
 class SelectStatement(SQLStatement):
@@ -96,6 +108,39 @@ class DeleteStatement(SQLStatement):
     table_name: str
     conditions: List[Condition]
 
+@dataclass
+class ExplainStatement(SQLStatement):
+    statement: SelectStatement
+    analyze: bool = False  # EXPLAIN ANALYZE 会实际执行查询并统计每个算子
+
+@dataclass
+class AnalyzeStatement(SQLStatement):
+    table_name: Optional[str] = None  # 为空时分析所有表
+
+@dataclass
+class VacuumStatement(SQLStatement):
+    table_name: Optional[str] = None  # 为空时清理所有表
+    compression: Optional[str] = None  # 指定时把表转换为该压缩格式（'none' 为CSV格式）
+
+@dataclass
+class TransactionStatement(SQLStatement):
+    action: str  # BEGIN / COMMIT / ROLLBACK
+
+@dataclass
+class Placeholder:
+    """预编译语句中的参数占位符 ?"""
+    index: int  # 从0开始，按出现顺序编号
+
+@dataclass
+class PrepareStatement(SQLStatement):
+    name: str
+    statement: SQLStatement
+
+@dataclass
+class ExecuteStatement(SQLStatement):
+    name: str
+    params: List[Any]
+
 class SQLLexer(Lexer):
     tokens = {
         'IDENTIFIER',
@@ -134,6 +179,18 @@ class SQLLexer(Lexer):
         'DIVIDE',    # 除号
         'DOT',       # 添加 DOT token
         'PLUS',      # 添加 PLUS token
+        'PREPARE',
+        'EXECUTE',
+        'AS',
+        'QMARK',     # 参数占位符
+        'EXPLAIN',
+        'ANALYZE',
+        'COPY',
+        'VACUUM',
+        'BEGIN',
+        'COMMIT',
+        'ROLLBACK',
+        'COMPRESSION',
     }
     
     # 字符规则（支持单引号和双引号）
@@ -153,6 +210,7 @@ class SQLLexer(Lexer):
     LPAREN = r'\('
     RPAREN = r'\)'
     DOT = r'\.'
+    QMARK = r'\?'
     
     # 算术运算符
     PLUS = r'\+'
@@ -189,6 +247,17 @@ class SQLLexer(Lexer):
         'char': 'CHAR',
         'int': 'INT_TYPE',
         'float': 'FLOAT_TYPE',
+        'prepare': 'PREPARE',
+        'execute': 'EXECUTE',
+        'as': 'AS',
+        'explain': 'EXPLAIN',
+        'analyze': 'ANALYZE',
+        'copy': 'COPY',
+        'vacuum': 'VACUUM',
+        'begin': 'BEGIN',
+        'commit': 'COMMIT',
+        'rollback': 'ROLLBACK',
+        'compression': 'COMPRESSION',
     }
     
     # 修改 STAR 和 TIMES 的定义
@@ -216,16 +285,15 @@ class SQLLexer(Lexer):
     # 添加减号规则
     MINUS = r'-'
 
-class SQLParser(Parser):
+class SQLParser(CachedParser):
+    """SQL语法分析器（LALR分析表缓存在磁盘上，见 parser_tables.py）"""
     tokens = SQLLexer.tokens
     
     def __init__(self):
         self.names = {}
-        # 确保数据目录存在
-        current_dir = os.path.dirname(os.path.abspath(__file__))
-        self.data_dir = os.path.join(current_dir, 'data')
-        if not os.path.exists(self.data_dir):
-            os.makedirs(self.data_dir)
+        self.placeholder_count = 0
+        # 只在 get_table_schema 中使用，不在这里访问文件系统
+        self.data_dir = DATA_DIR
         
     def validate_value_type(self, value, expected_type):
         """验证值的类型是否匹配"""
@@ -280,6 +348,11 @@ class SQLParser(Parser):
         except Exception as e:
             raise SQLError(f"读取表 {table_name} 结构时出错: {str(e)}")
 
+    def parse(self, tokens):
+        # 每条语句的占位符从0开始编号
+        self.placeholder_count = 0
+        return super().parse(tokens)
+
     @_('statement')
     def statements(self, p):
         return p.statement
@@ -292,16 +365,83 @@ class SQLParser(Parser):
        'insert_stmt',
        'select_stmt',
        'update_stmt',
-       'delete_stmt')
+       'delete_stmt',
+       'prepare_stmt',
+       'execute_stmt',
+       'explain_stmt',
+       'analyze_stmt',
+       'copy_stmt',
+       'vacuum_stmt',
+       'transaction_stmt')
     def statement(self, p):
         return p[0]
 
+    @_('BEGIN',
+       'COMMIT',
+       'ROLLBACK')
+    def transaction_stmt(self, p):
+        return TransactionStatement(p[0].upper())
+
+    @_('ANALYZE IDENTIFIER')
+    def analyze_stmt(self, p):
+        return AnalyzeStatement(p.IDENTIFIER)
+
+    @_('ANALYZE')
+    def analyze_stmt(self, p):
+        return AnalyzeStatement(None)
+
+    @_('VACUUM IDENTIFIER')
+    def vacuum_stmt(self, p):
+        return VacuumStatement(p.IDENTIFIER)
+
+    @_('VACUUM IDENTIFIER COMPRESSION IDENTIFIER')
+    def vacuum_stmt(self, p):
+        return VacuumStatement(p.IDENTIFIER0, p.IDENTIFIER1.lower())
+
+    @_('VACUUM')
+    def vacuum_stmt(self, p):
+        return VacuumStatement(None)
+
+    @_('EXPLAIN select_stmt')
+    def explain_stmt(self, p):
+        return ExplainStatement(p.select_stmt, False)
+
+    @_('EXPLAIN ANALYZE select_stmt')
+    def explain_stmt(self, p):
+        return ExplainStatement(p.select_stmt, True)
+
+    @_('PREPARE IDENTIFIER AS preparable_stmt')
+    def prepare_stmt(self, p):
+        return PrepareStatement(p.IDENTIFIER, p.preparable_stmt)
+
+    @_('insert_stmt',
+       'select_stmt',
+       'update_stmt',
+       'delete_stmt')
+    def preparable_stmt(self, p):
+        return p[0]
+
+    @_('EXECUTE IDENTIFIER LPAREN value_list RPAREN')
+    def execute_stmt(self, p):
+        return ExecuteStatement(p.IDENTIFIER, p.value_list)
+
+    @_('EXECUTE IDENTIFIER')
+    def execute_stmt(self, p):
+        return ExecuteStatement(p.IDENTIFIER, [])
+
     @_('CREATE TABLE IDENTIFIER LPAREN column_defs RPAREN')
     def create_table_stmt(self, p):
         return CreateTableStatement(
             Table(p.IDENTIFIER, p.column_defs)
         )
 
+    @_('CREATE TABLE IDENTIFIER LPAREN column_defs RPAREN COMPRESSION IDENTIFIER')
+    def create_table_stmt(self, p):
+        return CreateTableStatement(
+            Table(p.IDENTIFIER0, p.column_defs),
+            p.IDENTIFIER1.lower()
+        )
+
     @_('column_def')
     def column_defs(self, p):
         return [p.column_def]
@@ -318,24 +458,24 @@ class SQLParser(Parser):
     def type(self, p):
         return p[0]
 
-    @_('INSERT INTO IDENTIFIER VALUES LPAREN value_list RPAREN')
+    @_('INSERT INTO IDENTIFIER VALUES row_list')
     def insert_stmt(self, p):
-        # 获取表结构
-        schema = self.get_table_schema(p.IDENTIFIER)
-        values = p.value_list
-        
-        # 检查值的数量是否匹配
-        if len(values) != len(schema):
-            raise SQLError(f"列数不匹配：期望 {len(schema)} 列，实际提供 {len(values)} 列")
-        
-        # 验证每个值的类型
-        for i, (value, column) in enumerate(zip(values, schema)):
-            try:
-                self.validate_value_type(value, column['type'])
-            except SQLTypeError as e:
-                raise SQLTypeError(f"第 {i+1} 列 '{column['name']}' {str(e)}")
-        
-        return InsertStatement(p.IDENTIFIER, values)
+        # 列数和类型由执行器按表结构统一验证，每条语句只读取一次表结构
+        return InsertStatement(p.IDENTIFIER, p.row_list)
+
+    @_('LPAREN value_list RPAREN')
+    def row_list(self, p):
+        return [p.value_list]
+
+    @_('row_list COMMA LPAREN value_list RPAREN')
+    def row_list(self, p):
+        # 左递归，多行插入时避免列表反复拼接
+        p.row_list.append(p.value_list)
+        return p.row_list
+
+    @_('COPY IDENTIFIER FROM STRING')
+    def copy_stmt(self, p):
+        return CopyStatement(p.IDENTIFIER, p.STRING[1:-1])
 
     @_('value')
     def value_list(self, p):
@@ -354,6 +494,13 @@ class SQLParser(Parser):
             return None
         return p[0]
 
+    @_('QMARK')
+    def value(self, p):
+        """解析参数占位符"""
+        placeholder = Placeholder(self.placeholder_count)
+        self.placeholder_count += 1
+        return placeholder
+
     @_('SELECT select_cols FROM table_list where_clause')
     def select_stmt(self, p):
         return SelectStatement(p.table_list, p.select_cols, p.where_clause)
@@ -0,0 +1,160 @@
+import re
+from dataclasses import dataclass
+from typing import Iterator, List, Optional
+
+from sly.lex import Token, LexError
+
+from sql_parser import SQLLexer
+
+# 手写的词法规则，与 SQLLexer 的规则等价（修改 SQLLexer 的规则时需要同步修改这里）。
+# SLY 把规则按定义顺序组合成一个正则表达式，顺序只在开头字符相同的规则之间起作用：
+# DOT 在 FLOAT 之前，所以 '.5' 是 DOT 和 INT，FLOAT 实际上只匹配 \d+\.\d+；LE、GE 在 LT、GT 之前。
+# 每次匹配得到 (空白, 标识符, 其他词法单元)，其他词法单元按取值和开头字符确定类型；
+# 任何非空白字符都能匹配（非法字符单独作为一个词法单元），所以扫描不会在中途停下
+_TOKEN_PATTERN = r'''([ \t\n\r]*)(?:
+    ([a-zA-Z_][a-zA-Z0-9_]*)                    # 标识符和关键字
+    |(\d+(?:\.\d+)?                             # INT、FLOAT
+    |'[^']*'|"[^"]*"                            # STRING
+    |<=|>=|!=
+    |{comment}
+    |{unclosed}
+    |[^ \t\n\r])                                # 单字符运算符、分隔符和非法字符
+)'''
+
+# 分割语句时（换行符已替换为空格）注释一直延伸到语句结尾：引号外的分号，或者没有闭合的引号
+# （之后的文本都属于这条语句）；没有闭合的引号是非法字符，之后的文本同样属于这条语句
+_SCRIPT_RE = re.compile(_TOKEN_PATTERN.format(
+    comment=r'''\#[^;'"]*(?:(?:'[^']*'|"[^"]*")[^;'"]*)*(?:['"].*)?''',
+    unclosed=r'''['"].*'''), re.VERBOSE)
+
+# 单条语句：注释到行尾（与 SQLLexer 的 \#.* 相同），在第一个非法字符处结束
+_STATEMENT_RE = re.compile(_TOKEN_PATTERN.format(comment=r'\#.*', unclosed=r"['\"]"), re.VERBOSE)
+
+_OPERATORS = {
+    '<=': 'LE', '>=': 'GE', '!=': 'NE', '<': 'LT', '>': 'GT', '=': 'EQUALS', ';': 'SEMI', ',': 'COMMA',
+    '(': 'LPAREN', ')': 'RPAREN', '.': 'DOT', '?': 'QMARK', '+': 'PLUS', '/': 'DIVIDE', '*': 'STAR',
+    '-': 'MINUS',
+}
+
+_KEYWORDS = SQLLexer.keywords
+_QUOTES = ('\'', '"')
+
+
+@dataclass
+class ScannedStatement:
+    """一条语句的文本和词法单元；词法错误推迟到取词法单元时抛出，与 SQLLexer.tokenize 一致"""
+    text: str
+    tokens: List[Token]
+    error: Optional[LexError] = None  # 第一个非法字符，tokens 只包含它之前的词法单元
+
+    def iter_tokens(self) -> Iterator[Token]:
+        yield from self.tokens
+        if self.error is not None:
+            raise self.error
+
+
+def _statement(text: str, base: int, end: int, tokens: List[Token], errors: List[int],
+               strip: bool) -> ScannedStatement:
+    """结束一条语句：分割出的语句去掉结尾的空白，找出语句范围内的第一个非法字符"""
+    stmt = text[base:end]
+    if strip:
+        stmt = stmt.rstrip()
+    limit = base + len(stmt)
+    for position in errors:
+        if position >= limit:
+            # 结尾处的空白字符（如全角空格）被去掉了，不是非法字符
+            break
+        index = position - base
+        error = LexError(f'Illegal character {text[position]!r} at index {index}', stmt[index:], index)
+        return ScannedStatement(stmt, [tok for tok in tokens if tok.index < index], error)
+    return ScannedStatement(stmt, tokens)
+
+
+def _scan(text: str, split: bool) -> Iterator[ScannedStatement]:
+    """
+    一次扫描完成分割和词法分析
+    split 为True时按引号外的分号分割（与原来的逐字符分割相同：每条语句去掉首尾空白，
+    注释延伸到语句结尾），词法单元的位置相对于所在语句；否则整个文本作为一条语句
+    """
+    tokens: List[Token] = []
+    errors: List[int] = []       # 当前语句中非法字符的位置
+    base = None if split else 0  # 当前语句去掉开头空白后的起始位置
+    last_type = None
+    position = 0
+    operators, keywords = _OPERATORS, _KEYWORDS
+    for m in (_SCRIPT_RE if split else _STATEMENT_RE).finditer(text):
+        space, identifier, value = m.groups()
+        start = position + len(space)
+        if identifier is not None:
+            value = identifier
+            kind = keywords.get(identifier.lower(), 'IDENTIFIER')
+        else:
+            kind = operators.get(value)
+            if kind is None:
+                first = value[0]
+                if first in _QUOTES and len(value) > 1 and value[-1] == first:
+                    kind = 'STRING'
+                elif first.isdecimal():
+                    kind = 'FLOAT' if '.' in value else 'INT'
+                elif first == '#':
+                    # 注释不产生词法单元
+                    if base is None:
+                        base = start
+                    position = start + len(value)
+                    continue
+                else:
+                    if base is None:
+                        if first.isspace():
+                            # 语句开头的其他空白字符（如全角空格）会被去掉
+                            position = start + 1
+                            continue
+                        base = start
+                    errors.append(start)
+                    if not split:
+                        break
+                    position = start + len(value)
+                    continue
+            elif kind == 'SEMI' and split:
+                if base is not None:
+                    yield _statement(text, base, start, tokens, errors, True)
+                    tokens, errors, base, last_type = [], [], None, None
+                position = start + 1
+                continue
+            elif kind == 'STAR' and last_type != 'SELECT':
+                kind = 'TIMES'
+        if base is None:
+            base = start
+        position = start + len(value)
+        tok = Token()
+        tok.type = kind
+        tok.value = value
+        tok.lineno = 1
+        tok.index = start - base
+        tok.end = position - base
+        tokens.append(tok)
+        last_type = kind
+
+    if base is not None:
+        yield _statement(text, base, len(text), tokens, errors, split)
+
+
+def scan_script(sql: str) -> Iterator[ScannedStatement]:
+    """
+    分割以分号分隔的多条语句并完成词法分析，语句文本与 server.split_sql_statements 原来的结果相同，
+    每条语句的词法单元与 SQLLexer().tokenize(语句文本) 相同
+    逐条产生语句，同一时刻只有一条语句的词法单元在内存中
+    """
+    # 与原来的分割方式一致，换行符替换为空格
+    sql = sql.replace('\n', ' ').replace('\r', ' ')
+    empty = True
+    for statement in _scan(sql, True):
+        empty = False
+        yield statement
+    # 只有分号和空白时整个文本作为一条语句
+    if empty and sql.strip():
+        yield scan_statement(sql.strip())
+
+
+def scan_statement(text: str) -> ScannedStatement:
+    """单条语句的词法分析，结果与 SQLLexer().tokenize(text) 相同"""
+    return next(_scan(text, False))
@@ -0,0 +1,146 @@
+import math
+import hashlib
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+from dataclasses import fields, is_dataclass, replace
+from typing import Any, Dict, List, Optional
+
+from sql_parser import SQLError, SQLStatement, Placeholder
+from query_cache import normalize_sql
+
+
+def to_literal(value: Any) -> str:
+    """将客户端传入的参数值转换为SQL字面量（与词法分析器产生的值格式一致）"""
+    if isinstance(value, bool) or value is None:
+        raise SQLError(f"不支持的参数值: {value!r}")
+    if isinstance(value, int):
+        return str(value)
+    if isinstance(value, float):
+        return format_float(value)
+    if isinstance(value, str):
+        return f"'{value}'"
+    raise SQLError(f"不支持的参数类型: {type(value).__name__}")
+
+
+def format_float(value: float) -> str:
+    """
+    浮点数按词法分析器的 FLOAT 格式输出：定点表示且必须带小数点
+    （repr 对很小或很大的数使用科学计数法，如 1e-05，不能通过FLOAT类型检查）
+    """
+    if not math.isfinite(value):
+        raise SQLError(f"不支持的参数值: {value!r}")
+    text = format(Decimal(repr(value)), 'f')
+    return text if '.' in text else text + '.0'
+
+
+def count_placeholders(node: Any) -> int:
+    """统计语句中的占位符数量"""
+    if isinstance(node, Placeholder):
+        return 1
+    if isinstance(node, (list, tuple)):
+        return sum(count_placeholders(item) for item in node)
+    if is_dataclass(node) and not isinstance(node, type):
+        return sum(count_placeholders(getattr(node, f.name)) for f in fields(node))
+    return 0
+
+
+def _bind(node: Any, params: List[Any]) -> Any:
+    """递归替换占位符，未包含占位符的子树原样共享"""
+    if isinstance(node, Placeholder):
+        return params[node.index]
+    if isinstance(node, list):
+        return [_bind(item, params) for item in node]
+    if isinstance(node, tuple):
+        return tuple(_bind(item, params) for item in node)
+    if is_dataclass(node) and not isinstance(node, type):
+        changes = {}
+        for f in fields(node):
+            old = getattr(node, f.name)
+            new = _bind(old, params)
+            if new is not old:
+                changes[f.name] = new
+        return replace(node, **changes) if changes else node
+    return node
+
+
+class PreparedStatement:
+    """已解析的预编译语句"""
+    def __init__(self, statement_id: str, statement: SQLStatement):
+        self.statement_id = statement_id
+        self.statement = statement
+        self.param_count = count_placeholders(statement)
+
+    def bind(self, params: List[Any]) -> SQLStatement:
+        """绑定参数（params 为SQL字面量），返回可直接执行的语句"""
+        if len(params) != self.param_count:
+            raise SQLError(f"参数数量不匹配：期望 {self.param_count} 个，实际提供 {len(params)} 个")
+        if not self.param_count:
+            return self.statement
+        return _bind(self.statement, params)
+
+
+class PreparedStatements:
+    """
+    一个会话（连接）的预编译语句：语句名/语句ID -> PreparedStatement
+    每个会话各自持有，其他客户端不能执行或覆盖；达到上限时拒绝新的语句而不是淘汰旧的，
+    语句只在会话结束时随会话一起释放
+    """
+    def __init__(self, max_prepared: int = 1024):
+        self.max_prepared = max_prepared
+        self._prepared: Dict[str, PreparedStatement] = {}
+
+    def prepare(self, name: str, stmt: SQLStatement) -> PreparedStatement:
+        """注册预编译语句（同名语句会被替换）"""
+        if name not in self._prepared and len(self._prepared) >= self.max_prepared:
+            raise SQLError(f"预编译语句数已达上限 {self.max_prepared}，请复用已有的语句或使用新的会话")
+        prepared = self._prepared[name] = PreparedStatement(name, stmt)
+        return prepared
+
+    def get(self, name: str) -> PreparedStatement:
+        """获取预编译语句"""
+        prepared = self._prepared.get(name)
+        if prepared is None:
+            raise SQLError(f"预编译语句 {name} 不存在")
+        return prepared
+
+    def __len__(self):
+        return len(self._prepared)
+
+
+class StatementCache:
+    """
+    解析缓存：规范化语句文本 -> 语法树（LRU，所有会话共享）
+    缓存中的语法树在执行时只读，绑定参数会生成新的语法树；预编译语句属于各个会话，见 PreparedStatements
+    """
+    def __init__(self, max_parsed: int = 256):
+        self.max_parsed = max_parsed
+        self._parsed: 'OrderedDict[str, SQLStatement]' = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_parsed(self, key: str) -> Optional[SQLStatement]:
+        """查找已解析的语法树"""
+        with self._lock:
+            stmt = self._parsed.get(key)
+            if stmt is None:
+                self.misses += 1
+                return None
+            self._parsed.move_to_end(key)
+            self.hits += 1
+            return stmt
+
+    def put_parsed(self, key: str, stmt: SQLStatement):
+        """缓存解析结果"""
+        with self._lock:
+            self._parsed[key] = stmt
+            self._parsed.move_to_end(key)
+            while len(self._parsed) > self.max_parsed:
+                self._parsed.popitem(last=False)
+
+    @staticmethod
+    def statement_id(sql: str) -> str:
+        """根据规范化后的语句文本生成稳定的语句ID"""
+        digest = hashlib.sha1(normalize_sql(sql).encode('utf-8')).hexdigest()
+        return f"stmt_{digest[:16]}"
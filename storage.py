@@ -0,0 +1,641 @@
+import os
+import sys
+import csv
+import secrets
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from block_format import (BLOCK_FILE, BLOCK_ROWS, NO_COMPRESSION, BlockFormatError, BlockInfo,
+                          get_codec, encode_file_header, encode_blocks, read_file_header, read_frames,
+                          read_block, block_rows, may_match)
+
+# 数据文件和表结构文件名（位于表目录下）
+DATA_FILE = 'data.csv'
+SCHEMA_FILE = 'schema.csv'
+
+# 批量写入时的文件缓冲区大小
+WRITE_BUFFER_SIZE = 1024 * 1024
+
+# 字典编码：数据文件表头中编码列的列名带 ":dict" 后缀，列值为字典中的编号；
+# 字典条目以 ['#dict', 列序号, 原始值, '.'] 行的形式写在首次使用它的数据行之前，
+# 编号为条目在该列字典中的序号。末尾的 '.' 用于识别写到一半的条目。
+# 追加写入时不同值超出上限的列写出 ['#plain', 列序号, '.'] 行，之后的数据行中该列为原始值
+DICT_SUFFIX = ':dict'
+DICT_MARKER = '#dict'
+PLAIN_MARKER = '#plain'
+DICT_ENTRY_END = '.'
+
+# 不同值个数不超过上限且不超过行数的一定比例的CHAR列才使用字典编码；
+# 追加写入时行数达到 DICT_SAMPLE_ROWS 之后才按比例判断（之前只受条目数上限限制）
+DICT_MAX_ENTRIES = 4096
+DICT_MAX_FRACTION = 0.5
+DICT_SAMPLE_ROWS = 1024
+
+# 分块格式的表中小块（行数不到 BLOCK_ROWS 的四分之一）超过 max(最小值, 比例 * 块数) 时需要整理
+COMPACT_MIN_BLOCKS = 16
+COMPACT_FRACTION = 0.25
+
+# 崩溃恢复时从CSV数据文件末尾向前查找最后一个完整行，每次读取的字节数
+TAIL_READ_SIZE = 64 * 1024
+
+# 数值比较时视为相等的误差（与执行器的比较规则一致）
+EPSILON = 1e-10
+
+
+def _holds(operator: str, value: float, constant: float) -> bool:
+    """数值比较（与执行器的比较规则一致）"""
+    if operator == '=':
+        return abs(value - constant) < EPSILON
+    if operator == '>':
+        return value > constant
+    if operator == '<':
+        return value < constant
+    if operator == '>=':
+        return value >= constant or abs(value - constant) < EPSILON
+    if operator == '<=':
+        return value <= constant or abs(value - constant) < EPSILON
+    if operator == '<>':
+        return abs(value - constant) >= EPSILON
+    return False
+
+
+class ColumnPredicate:
+    """
+    下推到扫描中的单列过滤条件
+    test 对列的原始值（CHAR值带引号）判断；bounds 为与数值常量的比较 [(运算符, 值), ...]，
+    分块格式据此用块内的最小/最大值跳过整块；exact 表示 bounds 包含了该列上的全部条件，
+    这时可以直接对数值判断，并且一段值的两端都满足条件时中间的值也都满足（<> 除外）
+    """
+    def __init__(self, test: Callable[[str], bool], bounds: Sequence[Tuple[str, float]] = (),
+                 exact: bool = False):
+        self.test = test
+        self.bounds = list(bounds)
+        self.exact = exact and bool(self.bounds)
+
+    def __call__(self, value: str) -> bool:
+        return self.test(value)
+
+    def test_number(self, value: float) -> bool:
+        """exact 为True时对数值判断，不需要转换为文本"""
+        value = float(value)
+        return all(_holds(operator, value, constant) for operator, constant in self.bounds)
+
+    def may_match(self, low: float, high: float) -> bool:
+        """值都在 [low, high] 中的一组行里是否可能有满足条件的行"""
+        for operator, value in self.bounds:
+            if operator == '=' and not (low - EPSILON < value < high + EPSILON):
+                return False
+            if operator == '>' and not high > value:
+                return False
+            if operator == '<' and not low < value:
+                return False
+            if operator == '>=' and not high > value - EPSILON:
+                return False
+            if operator == '<=' and not low < value + EPSILON:
+                return False
+            if operator == '<>' and high - low < EPSILON and abs(low - value) < EPSILON:
+                return False
+        return True
+
+    def all_match(self, low: float, high: float) -> bool:
+        """值都在 [low, high] 中的一组行是否全部满足条件（只在 exact 为True时能确定）"""
+        if not self.exact:
+            return False
+        for operator, value in self.bounds:
+            if operator == '<>':
+                if low - EPSILON < value < high + EPSILON:
+                    return False
+            elif not (_holds(operator, low, value) and _holds(operator, high, value)):
+                return False
+        return True
+
+
+# 按列序号下推到扫描中的过滤条件
+RowFilter = Dict[int, Callable[[str], bool]]
+
+
+def _parse_header(raw_header: List[str]) -> Tuple[List[str], Set[int]]:
+    """解析数据文件表头，返回 (列名, 字典编码列的序号)"""
+    header = []
+    encoded = set()
+    for i, name in enumerate(raw_header):
+        if name.endswith(DICT_SUFFIX):
+            name = name[:-len(DICT_SUFFIX)]
+            encoded.add(i)
+        header.append(name)
+    return header, encoded
+
+
+def _format_header(header: List[str], encoded: Set[int]) -> List[str]:
+    return [name + DICT_SUFFIX if i in encoded else name for i, name in enumerate(header)]
+
+
+class _DictState:
+    """追加写入的字典编码状态：仍在编码的列、各列的字典 {原始值: 编号} 和数据行数"""
+    def __init__(self, encoded: Set[int], codes: Dict[int, Dict[str, str]], rows: int):
+        self.encoded = encoded
+        self.codes = codes
+        self.rows = rows
+
+
+class _Appender:
+    """
+    追加写入：为字典编码列中的新值先写出字典条目
+    列的不同值超出上限（DICT_MAX_ENTRIES，或行数达到 DICT_SAMPLE_ROWS 后超过 DICT_MAX_FRACTION）时
+    该列停止编码，之后写原始值，字典不再增长
+    """
+    def __init__(self, f, state: _DictState):
+        self._file = f
+        self._writer = csv.writer(f)
+        self._state = state
+        self.offset = f.tell()
+
+    def _stop_encoding(self, rows: List[List[str]]) -> List[List[str]]:
+        """加上这批行后不同值超出上限的列停止编码，返回需要写在这批行之前的 #plain 行"""
+        state = self._state
+        total = state.rows + len(rows)
+        markers = []
+        for i in sorted(state.encoded):
+            codes = state.codes[i]
+            count = len(codes) + len({row[i] for row in rows if row[i] not in codes})
+            if count > DICT_MAX_ENTRIES or (total >= DICT_SAMPLE_ROWS and count > total * DICT_MAX_FRACTION):
+                state.encoded.discard(i)
+                del state.codes[i]
+                markers.append([PLAIN_MARKER, str(i), DICT_ENTRY_END])
+        return markers
+
+    def write(self, rows: List[List[str]]):
+        """写入一批行并刷新到文件，写入后 offset 为文件末尾位置"""
+        state = self._state
+        count = len(rows)
+        if state.encoded:
+            out = self._stop_encoding(rows)
+            columns = sorted(state.encoded)
+            for row in rows:
+                row = list(row)
+                for i in columns:
+                    codes = state.codes[i]
+                    value = row[i]
+                    code = codes.get(value)
+                    if code is None:
+                        code = codes[value] = str(len(codes))
+                        out.append([DICT_MARKER, str(i), value, DICT_ENTRY_END])
+                    row[i] = code
+                out.append(row)
+            rows = out
+        state.rows += count
+        self._writer.writerows(rows)
+        self._file.flush()
+        self.offset = self._file.tell()
+
+
+class _BlockAppender:
+    """分块格式的追加写入：每次写入的行编码为新的数据块"""
+    def __init__(self, f, column_types: List[str], compress: Callable[[bytes], bytes]):
+        self._file = f
+        self._column_types = column_types
+        self._compress = compress
+        self.offset = f.tell()
+
+    def write(self, rows: List[List[str]]):
+        self._file.write(encode_blocks(rows, self._column_types, self._compress))
+        self._file.flush()
+        self.offset = self._file.tell()
+
+
+def fsync_directory(path: str):
+    """将目录项落盘（创建、替换文件之后），不支持打开目录的平台上忽略"""
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+class TableStorage:
+    """
+    表数据文件的读写
+    执行器的所有数据文件读写都经过这里，上层看到的始终是解码后的列名和行；
+    写操作由调用方持有表写闩串行执行，读操作可以与写操作并发
+    表有两种格式：CSV（data.csv）和分块压缩格式（data.blk，见 block_format.py），
+    两个文件同时存在时（格式转换中途退出）以分块格式为准
+    """
+    def __init__(self, table_dir: str):
+        self.table_dir = table_dir
+        self.data_file = os.path.join(table_dir, DATA_FILE)
+        self.block_file = os.path.join(table_dir, BLOCK_FILE)
+        self._lock = threading.Lock()
+        # 追加写入使用的编码状态：(文件标识, 编码状态)
+        self._encoder: Optional[Tuple[tuple, _DictState]] = None
+        # 分块格式的块索引：(文件ID, 已读取到的位置, 文件头, 块索引)，追加写入后增量读取
+        self._index: Optional[Tuple[str, int, dict, List[BlockInfo]]] = None
+        self._index_lock = threading.Lock()
+
+    def _column_types(self, header: List[str]) -> List[str]:
+        """数据文件各列的类型名（表结构中没有的是隐藏的版本列，为整数）"""
+        with open(os.path.join(self.table_dir, SCHEMA_FILE), 'r', encoding='utf-8', newline='') as f:
+            types = {row['column_name']: row['data_type'] for row in csv.DictReader(f)}
+        return [types.get(name, 'INT') for name in header]
+
+    def _file_key(self) -> tuple:
+        st = os.stat(self.data_file)
+        return (st.st_ino, st.st_size, st.st_mtime_ns)
+
+    @property
+    def compression(self) -> str:
+        """表使用的压缩算法，CSV格式为 'none'"""
+        if not os.path.exists(self.block_file):
+            return NO_COMPRESSION
+        with open(self.block_file, 'rb') as f:
+            return read_file_header(f)[0]['codec']
+
+    def size(self) -> int:
+        if os.path.exists(self.block_file):
+            return os.path.getsize(self.block_file)
+        return os.path.getsize(self.data_file)
+
+    def header(self) -> List[str]:
+        """数据文件中的列名（包括隐藏的版本列），文件为空时返回空列表"""
+        if os.path.exists(self.block_file):
+            with open(self.block_file, 'rb') as f:
+                return list(read_file_header(f)[0]['columns'])
+        with open(self.data_file, 'r', encoding='utf-8', newline='') as f:
+            return _parse_header(next(csv.reader(f), []))[0]
+
+    def create(self, header: List[str], codec: str = NO_COMPRESSION):
+        """
+        创建没有数据的表文件，指定 codec 时使用分块压缩格式
+        CSV格式的CHAR列先使用字典编码，追加写入时不同值超出上限的列停止编码
+        """
+        if codec != NO_COMPRESSION:
+            get_codec(codec)
+            self._write_blocks(header, [], codec)
+            return
+        column_types = self._column_types(header)
+        encoded = {i for i, type_name in enumerate(column_types) if type_name == 'CHAR'}
+        with self._lock:
+            with open(self.data_file, 'w', encoding='utf-8', newline='') as f:
+                csv.writer(f).writerow(_format_header(header, encoded))
+            self._encoder = (self._file_key(), _DictState(encoded, {i: {} for i in encoded}, 0))
+
+    def scan(self, filters: Optional[RowFilter] = None) -> Tuple[List[str], Iterator[List[str]]]:
+        """
+        逐行读取数据文件：返回 (列名, 行迭代器)，数据文件在迭代结束（或迭代器被关闭）时关闭
+        filters 中的过滤函数不成立的行被跳过；字典编码列上的过滤函数对每个编号只计算一次，
+        之后按编号过滤而不再比较字符串。解码后的字符串经过驻留，相同的值共享同一个对象；
+        分块格式按块内的最小/最大值跳过整块，块中只解压需要的列；
+        列数不符的行（写到一半的行）原样返回，由调用方跳过
+        """
+        try:
+            f = open(self.block_file, 'rb')
+        except FileNotFoundError:
+            return self._scan_csv(filters)
+        try:
+            header_meta, blocks = self._block_index(f)
+            decompress = get_codec(header_meta['codec'])[1]
+        except BaseException:
+            f.close()
+            raise
+        header = list(header_meta['columns'])
+        width = len(header)
+        filters = filters or {}
+
+        def rows():
+            with f:
+                for info in blocks:
+                    if filters and not may_match(info, filters):
+                        continue
+                    block = read_block(f, info, decompress)
+                    if block is not None:
+                        yield from block_rows(block, width, filters)
+
+        return header, rows()
+
+    def _block_index(self, f) -> Tuple[dict, List[BlockInfo]]:
+        """读取（或增量更新）打开的分块文件的块索引"""
+        size = os.fstat(f.fileno()).st_size
+        header_meta, header_end = read_file_header(f)
+        with self._index_lock:
+            cached = self._index
+            if cached is not None and cached[0] == header_meta['id'] and cached[1] <= size:
+                _, end, _, blocks = cached
+                if end < size:
+                    more, end = read_frames(f, end, size)
+                    blocks = blocks + more
+            else:
+                blocks, end = read_frames(f, header_end, size)
+            self._index = (header_meta['id'], end, header_meta, blocks)
+            return header_meta, blocks
+
+    def needs_compaction(self) -> bool:
+        """分块格式的表中小块（每次追加写入少量行时产生）是否多到需要重写整理"""
+        try:
+            f = open(self.block_file, 'rb')
+        except FileNotFoundError:
+            return False
+        with f:
+            _, blocks = self._block_index(f)
+        small = sum(1 for info in blocks if info.rows < BLOCK_ROWS // 4)
+        return small > max(COMPACT_MIN_BLOCKS, COMPACT_FRACTION * len(blocks))
+
+    def _scan_csv(self, filters: Optional[RowFilter]) -> Tuple[List[str], Iterator[List[str]]]:
+        f = open(self.data_file, 'r', encoding='utf-8', newline='')
+        try:
+            reader = csv.reader(f)
+            header, encoded = _parse_header(next(reader))
+        except BaseException:
+            f.close()
+            raise
+        filters = filters or {}
+        width = len(header)
+
+        def rows():
+            with f:
+                if not encoded and not filters:
+                    yield from reader
+                    return
+                values = {i: {} for i in encoded}
+                intern = sys.intern
+
+                def plan():
+                    decode = [(i, values[i]) for i in sorted(values)]
+                    code_filters = [(i, values[i], pred, {}) for i, pred in filters.items() if i in values]
+                    plain_filters = [(i, pred) for i, pred in filters.items() if i not in values]
+                    return decode, code_filters, plain_filters
+
+                decode, code_filters, plain_filters = plan()
+                for row in reader:
+                    if len(row) != width or row[0] in (DICT_MARKER, PLAIN_MARKER):
+                        if row and row[0] == DICT_MARKER:
+                            if len(row) == 4 and row[3] == DICT_ENTRY_END:
+                                entries = values.get(int(row[1]))
+                                if entries is not None:
+                                    entries[str(len(entries))] = intern(row[2])
+                        elif row and row[0] == PLAIN_MARKER:
+                            # 该列停止编码，之后的行中为原始值
+                            if len(row) == 3 and row[2] == DICT_ENTRY_END and values.pop(int(row[1]), None) is not None:
+                                decode, code_filters, plain_filters = plan()
+                        else:
+                            yield row
+                        continue
+                    try:
+                        if code_filters and not self._codes_match(row, code_filters):
+                            continue
+                        for i, entries in decode:
+                            row[i] = entries[row[i]]
+                    except KeyError:
+                        # 编号没有对应的字典条目：写到一半的行
+                        continue
+                    if plain_filters and not all(pred(row[i]) for i, pred in plain_filters):
+                        continue
+                    yield row
+
+        return header, rows()
+
+    @staticmethod
+    def _codes_match(row: List[str], code_filters: list) -> bool:
+        """按编号判断字典编码列上的过滤条件，每个编号的结果只计算一次"""
+        for i, entries, pred, results in code_filters:
+            code = row[i]
+            matched = results.get(code)
+            if matched is None:
+                matched = results[code] = pred(entries[code])
+            if not matched:
+                return False
+        return True
+
+    def read_all(self, filters: Optional[RowFilter] = None) -> Tuple[List[str], List[List[str]]]:
+        header, rows = self.scan(filters)
+        return header, list(rows)
+
+    def _load_encoder(self) -> _DictState:
+        """取得追加写入的编码状态；文件在别处被修改过时重新读取字典"""
+        key = self._file_key()
+        if self._encoder is not None and self._encoder[0] == key:
+            return self._encoder[1]
+        with open(self.data_file, 'r', encoding='utf-8', newline='') as f:
+            reader = csv.reader(f)
+            header, encoded = _parse_header(next(reader))
+            codes = {i: {} for i in encoded}
+            rows = 0
+            if encoded:
+                width = len(header)
+                for row in reader:
+                    if not row:
+                        continue
+                    if row[0] == DICT_MARKER:
+                        if len(row) == 4 and row[3] == DICT_ENTRY_END:
+                            entries = codes.get(int(row[1]))
+                            if entries is not None:
+                                entries[row[2]] = str(len(entries))
+                    elif row[0] == PLAIN_MARKER:
+                        if len(row) == 3 and row[2] == DICT_ENTRY_END:
+                            codes.pop(int(row[1]), None)
+                    elif len(row) == width:
+                        rows += 1
+        state = _DictState(set(codes), codes, rows)
+        self._encoder = (key, state)
+        return state
+
+    @contextmanager
+    def appender(self):
+        """
+        追加写入（调用方需持有表写闩），返回的对象用 write(rows) 分批写入
+        出现异常时截断回写入前的大小
+        """
+        if os.path.exists(self.block_file):
+            with self._append_blocks() as appender:
+                yield appender
+            return
+        with self._lock:
+            original_size = self.size()
+            state = self._load_encoder()
+            f = open(self.data_file, 'a', encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE)
+            try:
+                yield _Appender(f, state)
+                f.close()
+                self._encoder = (self._file_key(), state)
+            except BaseException:
+                f.close()
+                self._encoder = None
+                with open(self.data_file, 'r+b') as f:
+                    f.truncate(original_size)
+                raise
+
+    @contextmanager
+    def _append_blocks(self):
+        with self._lock:
+            f = open(self.block_file, 'r+b')
+            try:
+                header_meta, blocks = self._block_index(f)
+                # 丢弃上次异常退出时留下的不完整的帧
+                original_size = self._index[1]
+                f.truncate(original_size)
+                f.seek(original_size)
+                appender = _BlockAppender(f, self._column_types(header_meta['columns']),
+                                          get_codec(header_meta['codec'])[0])
+            except BaseException:
+                f.close()
+                raise
+            try:
+                yield appender
+                f.close()
+            except BaseException:
+                f.truncate(original_size)
+                f.close()
+                raise
+
+    def rewrite(self, header: List[str], rows: List[List[str]], codec: Optional[str] = None):
+        """
+        重写整个数据文件（调用方需持有表写闩）
+        数据先写入临时文件并落盘再原子替换，替换后将目录落盘：UPDATE/DELETE 的日志只记录变化的行版本，
+        恢复时以替换后的文件为基础，系统崩溃也不能留下截断的数据文件；
+        codec 为None时保持表原来的格式，否则转换为指定的格式（'none' 为CSV格式）；
+        CSV格式中不同值较少的CHAR列重新选择使用字典编码
+        """
+        if codec is None:
+            codec = self.compression
+        if codec != NO_COMPRESSION:
+            get_codec(codec)
+            self._write_blocks(header, rows, codec)
+            if os.path.exists(self.data_file):
+                os.remove(self.data_file)
+                fsync_directory(self.table_dir)
+            return
+
+        column_types = self._column_types(header)
+        limit = min(DICT_MAX_ENTRIES, max(1, int(len(rows) * DICT_MAX_FRACTION)))
+        codes: Dict[int, Dict[str, str]] = {}
+        for i, type_name in enumerate(column_types):
+            if type_name != 'CHAR':
+                continue
+            entries: Dict[str, str] = {}
+            for row in rows:
+                if row[i] not in entries:
+                    if len(entries) >= limit:
+                        break
+                    entries[row[i]] = str(len(entries))
+            else:
+                codes[i] = entries
+
+        encoded = set(codes)
+        tmp_file = self.data_file + '.tmp'
+        with self._lock:
+            with open(tmp_file, 'w', encoding='utf-8', newline='', buffering=WRITE_BUFFER_SIZE) as f:
+                writer = csv.writer(f)
+                writer.writerow(_format_header(header, encoded))
+                for i in sorted(encoded):
+                    writer.writerows([DICT_MARKER, str(i), value, DICT_ENTRY_END] for value in codes[i])
+                if encoded:
+                    columns = sorted(encoded)
+                    for row in rows:
+                        row = list(row)
+                        for i in columns:
+                            row[i] = codes[i][row[i]]
+                        writer.writerow(row)
+                else:
+                    writer.writerows(rows)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.data_file)
+            fsync_directory(self.table_dir)
+            self._encoder = (self._file_key(), _DictState(encoded, codes, len(rows)))
+            if os.path.exists(self.block_file):
+                os.remove(self.block_file)
+                fsync_directory(self.table_dir)
+
+    def sync(self):
+        """将表结构、数据文件和表目录落盘（检查点调用，调用方需持有表写闩）"""
+        for path in (os.path.join(self.table_dir, SCHEMA_FILE), self.data_file, self.block_file):
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            with f:
+                os.fsync(f.fileno())
+        fsync_directory(self.table_dir)
+
+    def discard_torn_tail(self):
+        """截掉数据文件末尾写到一半的行或块（崩溃恢复时调用，调用方需持有表写闩）"""
+        if os.path.exists(self.block_file):
+            with self._lock, open(self.block_file, 'r+b') as f:
+                self._block_index(f)
+                f.truncate(self._index[1])
+            return
+        with self._lock, open(self.data_file, 'r+b') as f:
+            pos = f.seek(0, os.SEEK_END)
+            while pos > 0:
+                step = min(TAIL_READ_SIZE, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step)
+                cut = data.rfind(b'\n')
+                if cut >= 0:
+                    f.truncate(pos + cut + 1)
+                    return
+
+    def reverse_scan(self) -> Iterator[List[str]]:
+        """
+        从文件末尾开始逆序读取完整的数据行（崩溃恢复时调用）
+        CSV格式中字典编码列的值为编号，没有解码
+        """
+        if os.path.exists(self.block_file):
+            with open(self.block_file, 'rb') as f:
+                header_meta, blocks = self._block_index(f)
+                decompress = get_codec(header_meta['codec'])[1]
+                for info in reversed(blocks):
+                    block = read_block(f, info, decompress)
+                    if block is not None:
+                        yield from reversed(block_rows(block, len(header_meta['columns']), {}))
+            return
+
+        width = len(self.header())
+        with open(self.data_file, 'rb') as f:
+            pos = f.seek(0, os.SEEK_END)
+            data = b''
+            while pos > 0:
+                step = min(TAIL_READ_SIZE, pos)
+                pos -= step
+                f.seek(pos)
+                data = f.read(step) + data
+                lines = data.split(b'\n')
+                # 未读到文件开头时第一段可能不完整，留到下一次；读到开头时第一行是表头
+                for line in reversed(lines[1:]):
+                    row = next(csv.reader([line.decode('utf-8')]), [])
+                    if len(row) == width and row[0] not in (DICT_MARKER, PLAIN_MARKER):
+                        yield row
+                data = lines[0]
+
+    def _write_blocks(self, header: List[str], rows: List[List[str]], codec: str):
+        """写出分块格式的数据文件（先写临时文件并落盘再原子替换，替换后将目录落盘）"""
+        compress = get_codec(codec)[0]
+        column_types = self._column_types(header)
+        tmp_file = self.block_file + '.tmp'
+        with self._lock:
+            with open(tmp_file, 'wb') as f:
+                f.write(encode_file_header(codec, header, secrets.token_hex(8)))
+                f.write(encode_blocks(rows, column_types, compress))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.block_file)
+            fsync_directory(self.table_dir)
+
+
+_storages: Dict[str, TableStorage] = {}
+_storages_lock = threading.Lock()
+
+
+def get_storage(table_dir: str) -> TableStorage:
+    """获取表目录对应的存储对象（同一目录在进程内共享，追加写入的编码状态可以复用）"""
+    key = os.path.abspath(table_dir)
+    with _storages_lock:
+        storage = _storages.get(key)
+        if storage is None:
+            storage = _storages[key] = TableStorage(key)
+        return storage
@@ -0,0 +1,313 @@
+import os
+import json
+import heapq
+import random
+import hashlib
+import tempfile
+import threading
+import time
+from dataclasses import dataclass, field, asdict
+from typing import List, Dict, Any, Optional, Iterable, Set
+
+from sql_parser import DataType
+
+# 统计信息文件名，与 schema.csv 放在同一目录
+STATS_FILE = 'stats.json'
+
+# 直方图桶数、每列采样行数和去重估计使用的最小哈希个数
+HISTOGRAM_BUCKETS = 10
+SAMPLE_SIZE = 10000
+KMV_SIZE = 1024
+
+# 自动重新分析阈值：修改行数超过 max(最小值, 比例 * 行数)
+AUTO_ANALYZE_MIN_ROWS = 50
+AUTO_ANALYZE_FRACTION = 0.2
+
+
+def parse_value(raw: str, data_type: DataType) -> Any:
+    """将数据文件中的原始文本转换为可比较的值，空值返回None"""
+    if raw == '':
+        return None
+    if data_type == DataType.CHAR:
+        if len(raw) >= 2 and raw[0] == raw[-1] and raw[0] in ("'", '"'):
+            return raw[1:-1]
+        return raw
+    try:
+        if data_type == DataType.INT and '.' not in raw:
+            return int(raw)
+        return float(raw)
+    except ValueError:
+        return None
+
+
+class DistinctEstimator:
+    """基于KMV（k个最小哈希值）的去重计数估计，内存固定"""
+    def __init__(self, k: int = KMV_SIZE):
+        self.k = k
+        self._heap: List[int] = []   # 保存取负后的哈希值，堆顶为当前第k小的哈希值
+        self._members = set()
+
+    def add(self, value: str):
+        h = int.from_bytes(hashlib.blake2b(value.encode('utf-8'), digest_size=8).digest(), 'big')
+        if h in self._members:
+            return
+        if len(self._heap) < self.k:
+            heapq.heappush(self._heap, -h)
+            self._members.add(h)
+        elif h < -self._heap[0]:
+            removed = -heapq.heappushpop(self._heap, -h)
+            self._members.discard(removed)
+            self._members.add(h)
+
+    def estimate(self) -> int:
+        if len(self._heap) < self.k:
+            return len(self._heap)
+        kth = -self._heap[0]
+        return int((self.k - 1) * (2 ** 64) / (kth + 1))
+
+
+@dataclass
+class ColumnStats:
+    """列统计信息"""
+    name: str
+    data_type: str
+    null_frac: float = 0.0
+    n_distinct: int = 0
+    min_value: Any = None
+    max_value: Any = None
+    histogram: List[Any] = field(default_factory=list)  # 等深直方图的桶边界
+
+    def selectivity(self, operator: str, value: Any) -> float:
+        """估计 列 operator value 的选择率"""
+        non_null = 1.0 - self.null_frac
+        if operator == '=':
+            return non_null / self.n_distinct if self.n_distinct else 0.0
+        if operator in ('!=', '<>'):
+            return non_null - (non_null / self.n_distinct if self.n_distinct else 0.0)
+        if operator in ('<', '<=', '>', '>='):
+            fraction = self._fraction_below(value)
+            if fraction is None:
+                return non_null / 3
+            if operator in ('<', '<='):
+                return non_null * fraction
+            return non_null * (1.0 - fraction)
+        return 1.0
+
+    def _fraction_below(self, value: Any) -> Optional[float]:
+        """根据直方图估计小于 value 的非空值比例"""
+        bounds = self.histogram
+        if len(bounds) < 2:
+            return None
+        try:
+            if value <= bounds[0]:
+                return 0.0
+            if value >= bounds[-1]:
+                return 1.0
+            buckets = len(bounds) - 1
+            for i in range(buckets):
+                low, high = bounds[i], bounds[i + 1]
+                if value < high:
+                    # 桶内按线性插值估计
+                    if isinstance(value, (int, float)) and high != low:
+                        within = (value - low) / (high - low)
+                    else:
+                        within = 0.5
+                    return (i + within) / buckets
+            return 1.0
+        except TypeError:
+            return None
+
+
+@dataclass
+class TableStats:
+    """表统计信息"""
+    table_name: str
+    row_count: int = 0
+    columns: Dict[str, ColumnStats] = field(default_factory=dict)
+    modifications: int = 0   # 上次分析以来修改过的行数
+    analyzed_at: float = 0.0
+
+    def needs_analyze(self) -> bool:
+        """修改累积到一定程度后需要重新分析"""
+        threshold = max(AUTO_ANALYZE_MIN_ROWS, AUTO_ANALYZE_FRACTION * self.row_count)
+        return self.modifications > threshold
+
+    def estimate_rows(self, conditions, strip_table: bool = True) -> int:
+        """估计满足条件列表的行数（条件的逻辑运算符按从左到右计算）"""
+        if not conditions:
+            return self.row_count
+        fraction = None
+        last_logic_op = None
+        for cond in conditions:
+            col_name = cond.column.split('.')[-1] if strip_table else cond.column
+            col = self.columns.get(col_name)
+            if col is None:
+                sel = 1.0
+            else:
+                sel = col.selectivity(cond.operator, parse_value(str(cond.value), DataType[col.data_type]))
+            if last_logic_op is None:
+                fraction = sel
+            elif last_logic_op == 'OR':
+                fraction = fraction + sel - fraction * sel
+            else:
+                fraction = fraction * sel
+            last_logic_op = cond.logic_op
+        return int(round(self.row_count * fraction))
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = asdict(self)
+        data['columns'] = [asdict(col) for col in self.columns.values()]
+        return data
+
+    @staticmethod
+    def from_dict(data: Dict[str, Any]) -> 'TableStats':
+        columns = {col['name']: ColumnStats(**col) for col in data.get('columns', [])}
+        return TableStats(data['table_name'], data.get('row_count', 0), columns,
+                          data.get('modifications', 0), data.get('analyzed_at', 0.0))
+
+
+def analyze_table(table_name: str, rows: Iterable[List[str]], schema: List[Dict[str, Any]]) -> TableStats:
+    """
+    单次流式扫描表中可见的行，收集每列的行数、空值比例、去重计数估计和等深直方图
+    直方图基于蓄水池采样，内存占用与表大小无关
+    """
+    names = [col['name'] for col in schema]
+    types = [col['type'] for col in schema]
+    ncols = len(schema)
+    null_counts = [0] * ncols
+    distinct = [DistinctEstimator() for _ in range(ncols)]
+    samples: List[List[Any]] = [[] for _ in range(ncols)]
+    minimums: List[Any] = [None] * ncols
+    maximums: List[Any] = [None] * ncols
+    rng = random.Random(0)  # 固定种子，结果可重现
+    row_count = 0
+
+    for row in rows:
+        row_count += 1
+        # 蓄水池采样：所有列共用同一个采样位置
+        if row_count <= SAMPLE_SIZE:
+            slot = row_count - 1
+        else:
+            slot = rng.randrange(row_count)
+            if slot >= SAMPLE_SIZE:
+                slot = None
+
+        for i in range(ncols):
+            raw = row[i] if i < len(row) else ''
+            value = parse_value(raw, types[i])
+            if value is None:
+                null_counts[i] += 1
+                continue
+            distinct[i].add(raw)
+            if minimums[i] is None or value < minimums[i]:
+                minimums[i] = value
+            if maximums[i] is None or value > maximums[i]:
+                maximums[i] = value
+            if slot is not None:
+                if slot < len(samples[i]):
+                    samples[i][slot] = value
+                else:
+                    samples[i].append(value)
+
+    columns = {}
+    for i, name in enumerate(names):
+        sample = sorted(samples[i])
+        histogram = []
+        if sample:
+            buckets = min(HISTOGRAM_BUCKETS, len(sample))
+            histogram = [sample[min(len(sample) - 1, (len(sample) - 1) * b // buckets)]
+                         for b in range(buckets + 1)]
+        columns[name] = ColumnStats(
+            name=name,
+            data_type=types[i].name,
+            null_frac=null_counts[i] / row_count if row_count else 0.0,
+            n_distinct=distinct[i].estimate(),
+            min_value=minimums[i],
+            max_value=maximums[i],
+            histogram=histogram
+        )
+
+    return TableStats(table_name, row_count, columns, 0, time.time())
+
+
+def load_stats(table_dir: str) -> Optional[TableStats]:
+    """读取表统计信息，未分析过的表返回None"""
+    stats_file = os.path.join(table_dir, STATS_FILE)
+    if not os.path.exists(stats_file):
+        return None
+    try:
+        with open(stats_file, 'r', encoding='utf-8') as f:
+            return TableStats.from_dict(json.load(f))
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def save_stats(table_dir: str, stats: TableStats):
+    """写入表统计信息（先写唯一命名的临时文件再替换，避免写到一半的文件和并发写入互相覆盖临时文件）"""
+    stats_file = os.path.join(table_dir, STATS_FILE)
+    fd, tmp_file = tempfile.mkstemp(prefix=STATS_FILE + '.', suffix='.tmp', dir=table_dir)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(stats.to_dict(), f, ensure_ascii=False)
+        os.replace(tmp_file, stats_file)
+    except BaseException:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+        raise
+
+
+class TableStatsCache:
+    """
+    一个数据目录中各表统计信息的内存缓存（由数据库管理器持有，同一进程的所有执行器共享）
+    第一次使用时从 stats.json 读取；写操作提交后只在内存中调整行数和修改数，
+    由检查点（或重新分析）写回文件，不在每条写语句上读写JSON。所有修改都持有锁
+    """
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._stats: Dict[str, Optional[TableStats]] = {}
+        self._dirty: Set[str] = set()
+
+    def _load(self, table_name: str) -> Optional[TableStats]:
+        if table_name not in self._stats:
+            self._stats[table_name] = load_stats(os.path.join(self.db_path, table_name))
+        return self._stats[table_name]
+
+    def get(self, table_name: str) -> Optional[TableStats]:
+        """表的统计信息，未分析过的表返回None（返回的对象只读）"""
+        with self._lock:
+            return self._load(table_name)
+
+    def put(self, table_name: str, stats: TableStats):
+        """保存（重新）分析得到的统计信息并立即写入文件"""
+        with self._lock:
+            save_stats(os.path.join(self.db_path, table_name), stats)
+            self._stats[table_name] = stats
+            self._dirty.discard(table_name)
+
+    def forget(self, table_name: str):
+        """新建的表没有统计信息（同名的表可能被删除后重建）"""
+        with self._lock:
+            self._stats.pop(table_name, None)
+            self._dirty.discard(table_name)
+
+    def record(self, table_name: str, inserted: int = 0, updated: int = 0, deleted: int = 0) -> bool:
+        """已提交的修改计入统计信息（未分析过的表忽略），返回是否需要重新分析"""
+        with self._lock:
+            stats = self._load(table_name)
+            if stats is None:
+                return False
+            stats.row_count = max(0, stats.row_count + inserted - deleted)
+            stats.modifications += inserted + updated + deleted
+            self._dirty.add(table_name)
+            return stats.needs_analyze()
+
+    def flush(self):
+        """把内存中调整过的统计信息写回文件（检查点和进程退出时调用）"""
+        with self._lock:
+            for table_name in sorted(self._dirty):
+                stats = self._stats.get(table_name)
+                table_dir = os.path.join(self.db_path, table_name)
+                if stats is not None and os.path.isdir(table_dir):
+                    save_stats(table_dir, stats)
+            self._dirty.clear()
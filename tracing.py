@@ -0,0 +1,163 @@
+import os
+import time
+import random
+import secrets
+import threading
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Union
+
+# 跟踪级别，数值越小越详细
+TRACE = 5     # 逐行、逐次比较
+DEBUG = 10    # 词法分析结果、各算子的中间结果
+INFO = 20     # 请求和语句的开始与结束
+ERROR = 40    # 执行过程中的异常
+OFF = 100
+
+LEVELS = {'trace': TRACE, 'debug': DEBUG, 'info': INFO, 'error': ERROR, 'off': OFF}
+LEVEL_NAMES = {value: name for name, value in LEVELS.items()}
+
+# 全局跟踪级别、采样比例（0~1）和环形缓冲区保留的跟踪个数
+TRACE_LEVEL = os.environ.get('SQL_TRACE_LEVEL', 'info')
+TRACE_SAMPLE_RATE = float(os.environ.get('SQL_TRACE_SAMPLE', 0))
+TRACE_BUFFER_SIZE = int(os.environ.get('SQL_TRACE_BUFFER', 256))
+
+# 一个跟踪最多保留的事件数，大连接打开逐行跟踪时超出的事件只计数
+MAX_TRACE_EVENTS = 10000
+
+
+def parse_level(level: Union[str, int]) -> int:
+    """级别名称（trace/debug/info/error/off，不区分大小写）或数值"""
+    if isinstance(level, int):
+        return level
+    value = LEVELS.get(str(level).lower())
+    if value is None:
+        raise ValueError(f"未知的跟踪级别: {level}，可选 {', '.join(LEVELS)}")
+    return value
+
+
+@dataclass
+class TraceEvent:
+    """跟踪中的一个事件"""
+    time_ms: float              # 相对于跟踪开始的时间
+    level: int
+    message: str
+    fields: Dict[str, Any]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'time_ms': round(self.time_ms, 3), 'level': LEVEL_NAMES.get(self.level, self.level),
+                'message': self.message, **self.fields}
+
+
+class Trace:
+    """
+    一次请求（一条或多条语句）的跟踪
+    低于 level 的事件直接丢弃；热循环在循环外用 enabled() 判断一次，关闭时循环中没有额外调用
+    """
+    def __init__(self, trace_id: str, level: int, sampled: bool):
+        self.trace_id = trace_id
+        self.level = level
+        self.sampled = sampled      # 被采样或单独打开时记录所有不低于 level 的事件，否则只记录错误
+        self.started_at = time.time()
+        self.duration_ms: Optional[float] = None
+        self.events: List[TraceEvent] = []
+        self.dropped = 0
+        self._start = time.perf_counter()
+
+    def enabled(self, level: int) -> bool:
+        return level >= self.level
+
+    def event(self, level: int, message: str, **fields: Any):
+        if level < self.level:
+            return
+        if len(self.events) >= MAX_TRACE_EVENTS:
+            self.dropped += 1
+            return
+        self.events.append(TraceEvent((time.perf_counter() - self._start) * 1000, level, message, fields))
+
+    def finish(self):
+        self.duration_ms = (time.perf_counter() - self._start) * 1000
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            'trace_id': self.trace_id,
+            'level': LEVEL_NAMES.get(self.level, self.level),
+            'sampled': self.sampled,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration_ms, 3) if self.duration_ms is not None else None,
+            'events': len(self.events),
+            'dropped': self.dropped
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return dict(self.summary(), events=[event.to_dict() for event in self.events])
+
+
+class Tracer:
+    """
+    跟踪器
+    每个请求开始一个跟踪：请求单独指定级别时按该级别记录（一次只对一条查询打开详细跟踪）；
+    否则按 sample_rate 采样，采样到的按全局级别记录，未采样的只记录错误。
+    结束的跟踪（有事件时）放入环形缓冲区，只保留最近 buffer_size 个
+    """
+    def __init__(self, level: Union[str, int] = TRACE_LEVEL, sample_rate: float = TRACE_SAMPLE_RATE,
+                 buffer_size: int = TRACE_BUFFER_SIZE):
+        self.level = parse_level(level)
+        self.sample_rate = sample_rate
+        self._buffer: 'deque[Trace]' = deque(maxlen=buffer_size)
+        self._lock = threading.Lock()
+        # 统计信息
+        self.started = 0
+        self.sampled = 0
+
+    def configure(self, level: Optional[Union[str, int]] = None, sample_rate: Optional[float] = None):
+        if level is not None:
+            self.level = parse_level(level)
+        if sample_rate is not None:
+            self.sample_rate = sample_rate
+
+    def start(self, level: Optional[Union[str, int]] = None) -> Trace:
+        """开始一个跟踪，level 为该请求单独指定的级别；级别无效时抛出 ValueError"""
+        if level is not None:
+            trace_level, sampled = parse_level(level), True
+        elif self.sample_rate > 0 and random.random() < self.sample_rate:
+            trace_level, sampled = self.level, True
+        else:
+            trace_level, sampled = ERROR, False
+        self.started += 1
+        if sampled:
+            self.sampled += 1
+        return Trace(secrets.token_hex(8), trace_level, sampled)
+
+    def finish(self, trace: Trace):
+        trace.finish()
+        if trace.sampled or trace.events:
+            with self._lock:
+                self._buffer.append(trace)
+
+    def get(self, trace_id: str) -> Optional[Trace]:
+        with self._lock:
+            for trace in self._buffer:
+                if trace.trace_id == trace_id:
+                    return trace
+        return None
+
+    def recent(self, limit: Optional[int] = None) -> List[Trace]:
+        """最近结束的跟踪，新的在前"""
+        with self._lock:
+            traces = list(self._buffer)
+        traces.reverse()
+        return traces[:limit] if limit is not None else traces
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            'level': LEVEL_NAMES.get(self.level, self.level),
+            'sample_rate': self.sample_rate,
+            'started': self.started,
+            'sampled': self.sampled,
+            'buffered': len(self._buffer)
+        }
+
+
+# 进程内共享的跟踪器
+tracer = Tracer()
@@ -0,0 +1,169 @@
+import socket
+from dataclasses import dataclass, field
+from typing import Any, List, Optional, Sequence, Tuple
+
+from wire_protocol import (FRAME_HEADER, MSG_QUERY, MSG_PREPARE, MSG_TERMINATE, MSG_COLUMNS,
+                           MSG_ROWS, MSG_COMPLETE, MSG_ERROR, MSG_PREPARED, MSG_READY,
+                           ProtocolError, encode_frame, encode_text, encode_execute,
+                           decode_columns, decode_rows, decode_json, decode_text, decode_prepared)
+
+DEFAULT_PORT = 5433
+
+
+class WireError(Exception):
+    """服务器返回的错误"""
+    pass
+
+
+@dataclass
+class StatementResult:
+    """一条语句的执行结果：SELECT 有列和行，其他语句只有 result"""
+    columns: Optional[List[Tuple[str, int]]] = None   # [(列名, 类型编码), ...]
+    rows: List[tuple] = field(default_factory=list)
+    result: Any = None
+
+    @property
+    def column_names(self) -> List[str]:
+        return [name for name, _ in self.columns or []]
+
+
+@dataclass
+class PreparedHandle:
+    """预编译语句"""
+    statement_id: str
+    param_count: int
+
+
+class WireClient:
+    """
+    二进制协议客户端
+    query / execute 发送请求并等待结果；send_query / send_execute 只发送请求，
+    之后按发送顺序调用 read_response 读取结果，可以把多个请求流水线发送以减少往返次数
+    """
+    def __init__(self, host: str = '127.0.0.1', port: int = DEFAULT_PORT,
+                 unix_path: Optional[str] = None, timeout: Optional[float] = None):
+        if unix_path:
+            self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self._sock.settimeout(timeout)
+            self._sock.connect(unix_path)
+        else:
+            self._sock = socket.create_connection((host, port), timeout)
+            self._sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._reader = self._sock.makefile('rb')
+        self._pending = 0
+
+    # ------------------------------------------------------------------
+    # 发送请求
+    # ------------------------------------------------------------------
+
+    def send_query(self, sql: str):
+        self._sock.sendall(encode_frame(MSG_QUERY, encode_text(sql)))
+        self._pending += 1
+
+    def send_prepare(self, sql: str):
+        self._sock.sendall(encode_frame(MSG_PREPARE, encode_text(sql)))
+        self._pending += 1
+
+    def send_execute(self, statement: PreparedHandle, params: Sequence[Any] = ()):
+        self._sock.sendall(encode_execute(statement.statement_id, list(params)))
+        self._pending += 1
+
+    # ------------------------------------------------------------------
+    # 读取结果
+    # ------------------------------------------------------------------
+
+    def _read_frame(self) -> Tuple[int, bytes]:
+        header = self._reader.read(FRAME_HEADER.size)
+        if len(header) < FRAME_HEADER.size:
+            raise ConnectionError("服务器已关闭连接")
+        length, msg_type = FRAME_HEADER.unpack(header)
+        payload = self._reader.read(length) if length else b''
+        if len(payload) < length:
+            raise ConnectionError("服务器已关闭连接")
+        return msg_type, payload
+
+    def read_response(self) -> Any:
+        """
+        读取下一个请求的结果：SQL请求返回每条语句的 StatementResult 列表，
+        预编译请求返回 PreparedHandle；出错时读完整个响应后抛出 WireError
+        """
+        if not self._pending:
+            raise WireError("没有等待结果的请求")
+        results: List[StatementResult] = []
+        prepared = None
+        error = None
+        current = None
+        while True:
+            msg_type, payload = self._read_frame()
+            if msg_type == MSG_COLUMNS:
+                current = StatementResult(columns=decode_columns(payload))
+            elif msg_type == MSG_ROWS:
+                current.rows.extend(decode_rows(payload, [code for _, code in current.columns]))
+            elif msg_type == MSG_COMPLETE:
+                if current is None:
+                    current = StatementResult(result=decode_json(payload))
+                results.append(current)
+                current = None
+            elif msg_type == MSG_PREPARED:
+                prepared = PreparedHandle(*decode_prepared(payload))
+            elif msg_type == MSG_ERROR:
+                error = decode_text(payload)
+            elif msg_type == MSG_READY:
+                self._pending -= 1
+                if error is not None:
+                    raise WireError(error)
+                return prepared if prepared is not None else results
+            else:
+                raise ProtocolError(f"未知的消息类型: {msg_type}")
+
+    # ------------------------------------------------------------------
+    # 便捷接口
+    # ------------------------------------------------------------------
+
+    def query(self, sql: str) -> List[StatementResult]:
+        """执行SQL（可以包含多条语句），返回每条语句的结果"""
+        self.send_query(sql)
+        return self.read_response()
+
+    def prepare(self, sql: str) -> PreparedHandle:
+        self.send_prepare(sql)
+        return self.read_response()
+
+    def execute(self, statement: PreparedHandle, params: Sequence[Any] = ()) -> StatementResult:
+        """绑定参数执行预编译语句"""
+        self.send_execute(statement, params)
+        return self.read_response()[0]
+
+    def pipeline(self, sqls: Sequence[str]) -> List[Any]:
+        """
+        连续发送多个请求后再依次读取结果，只需要一次往返
+        出错的请求在返回列表中对应位置为 WireError 对象，不影响后面的请求
+        """
+        for sql in sqls:
+            self.send_query(sql)
+        responses = []
+        for _ in sqls:
+            try:
+                responses.append(self.read_response())
+            except WireError as e:
+                responses.append(e)
+        return responses
+
+    def close(self):
+        try:
+            self._sock.sendall(encode_frame(MSG_TERMINATE))
+        except OSError:
+            pass
+        self._reader.close()
+        self._sock.close()
+
+    def __enter__(self) -> 'WireClient':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+
+def connect(host: str = '127.0.0.1', port: int = DEFAULT_PORT, unix_path: Optional[str] = None,
+            timeout: Optional[float] = None) -> WireClient:
+    return WireClient(host, port, unix_path, timeout)
@@ -0,0 +1,261 @@
+import json
+import struct
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+# 二进制协议：每一帧为 4字节负载长度（大端）+ 1字节消息类型 + 负载
+#
+# 客户端 -> 服务器
+#   'Q' 执行SQL         负载为UTF-8文本（可以包含多条以分号分隔的语句）
+#   'P' 预编译语句      负载为UTF-8文本，返回 'I'
+#   'B' 执行预编译语句  语句ID（u16长度 + UTF-8）+ 参数个数 u16 + 带类型标记的参数值
+#   'X' 关闭连接
+#
+# 服务器 -> 客户端（按请求顺序返回，客户端可以不等待响应连续发送多个请求）
+#   'H' 结果列头        列数 u16，每列为 名称（u16长度 + UTF-8）+ 类型 u8，每个结果只发送一次
+#   'D' 数据行          行数 u32，每行为 空值位图 + 非空列的值（按列类型编码）
+#   'C' 语句完成        JSON文本：SELECT为返回的行数，其他语句为执行结果
+#   'E' 错误            UTF-8文本，请求中剩余的语句不再执行
+#   'I' 预编译完成      语句ID（u16长度 + UTF-8）+ 参数个数 u16
+#   'Z' 请求结束        u8，1表示所有语句都执行成功
+FRAME_HEADER = struct.Struct('>IB')
+MAX_FRAME_SIZE = 64 * 1024 * 1024
+
+MSG_QUERY = ord('Q')
+MSG_PREPARE = ord('P')
+MSG_EXECUTE = ord('B')
+MSG_TERMINATE = ord('X')
+
+MSG_COLUMNS = ord('H')
+MSG_ROWS = ord('D')
+MSG_COMPLETE = ord('C')
+MSG_ERROR = ord('E')
+MSG_PREPARED = ord('I')
+MSG_READY = ord('Z')
+
+# 列类型编码：INT为8字节有符号整数，FLOAT为8字节双精度浮点数，CHAR和TEXT为 u32长度 + UTF-8
+TYPE_TEXT = 0   # 无法确定类型的列，按原始文本传输
+TYPE_INT = 1
+TYPE_FLOAT = 2
+TYPE_CHAR = 3
+
+TYPE_CODES = {'INT': TYPE_INT, 'FLOAT': TYPE_FLOAT, 'CHAR': TYPE_CHAR}
+
+_U16 = struct.Struct('>H')
+_U32 = struct.Struct('>I')
+_I64 = struct.Struct('>q')
+_F64 = struct.Struct('>d')
+
+
+class ProtocolError(Exception):
+    """收到格式错误的帧"""
+    pass
+
+
+def encode_frame(msg_type: int, payload: bytes = b'') -> bytes:
+    return FRAME_HEADER.pack(len(payload), msg_type) + payload
+
+
+def _encode_str(text: str, length: struct.Struct = _U16) -> bytes:
+    data = text.encode('utf-8')
+    return length.pack(len(data)) + data
+
+
+def _decode_str(payload: bytes, offset: int, length: struct.Struct = _U16) -> Tuple[str, int]:
+    (size,) = length.unpack_from(payload, offset)
+    offset += length.size
+    return payload[offset:offset + size].decode('utf-8'), offset + size
+
+
+def encode_text(text: str) -> bytes:
+    return text.encode('utf-8')
+
+
+def decode_text(payload: bytes) -> str:
+    return payload.decode('utf-8')
+
+
+def encode_json(value: Any) -> bytes:
+    return json.dumps(value, ensure_ascii=False).encode('utf-8')
+
+
+def decode_json(payload: bytes) -> Any:
+    return json.loads(payload.decode('utf-8'))
+
+
+def encode_ready(success: bool) -> bytes:
+    return encode_frame(MSG_READY, b'\x01' if success else b'\x00')
+
+
+def encode_prepared(statement_id: str, param_count: int) -> bytes:
+    return encode_frame(MSG_PREPARED, _encode_str(statement_id) + _U16.pack(param_count))
+
+
+def decode_prepared(payload: bytes) -> Tuple[str, int]:
+    statement_id, offset = _decode_str(payload, 0)
+    (param_count,) = _U16.unpack_from(payload, offset)
+    return statement_id, param_count
+
+
+# ---------------------------------------------------------------------------
+# 结果列头和数据行
+# ---------------------------------------------------------------------------
+
+def encode_columns(columns: Sequence[Tuple[str, Optional[str]]]) -> bytes:
+    """columns 为 [(列名, 类型名), ...]，类型名为None的列按文本传输"""
+    payload = [_U16.pack(len(columns))]
+    for name, type_name in columns:
+        payload.append(_encode_str(name))
+        payload.append(bytes((TYPE_CODES.get(type_name, TYPE_TEXT),)))
+    return encode_frame(MSG_COLUMNS, b''.join(payload))
+
+
+def decode_columns(payload: bytes) -> List[Tuple[str, int]]:
+    (count,) = _U16.unpack_from(payload, 0)
+    offset = _U16.size
+    columns = []
+    for _ in range(count):
+        name, offset = _decode_str(payload, offset)
+        columns.append((name, payload[offset]))
+        offset += 1
+    return columns
+
+
+def _to_int(value: Any) -> Optional[int]:
+    if isinstance(value, int):
+        return value
+    if value == '':
+        return None
+    if '.' in value:
+        return int(float(value))
+    return int(value)
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if isinstance(value, (int, float)):
+        return float(value)
+    if value == '':
+        return None
+    return float(value)
+
+
+def _to_char(value: Any) -> Optional[str]:
+    """数据文件中的CHAR值带引号，传输时去掉"""
+    if not isinstance(value, str):
+        return str(value)
+    if len(value) >= 2 and value[0] == value[-1] and value[0] in ("'", '"'):
+        return value[1:-1]
+    return None if value == '' else value
+
+
+def _to_text(value: Any) -> Optional[str]:
+    return None if value is None else str(value)
+
+
+_CONVERTERS = {TYPE_INT: _to_int, TYPE_FLOAT: _to_float, TYPE_CHAR: _to_char, TYPE_TEXT: _to_text}
+
+
+class RowEncoder:
+    """
+    按列类型编码结果行（服务器端使用）
+    每列的转换和打包函数在创建时确定，编码时不再按值判断类型
+    """
+    def __init__(self, type_codes: Sequence[int]):
+        self.type_codes = list(type_codes)
+        self.bitmap_size = (len(self.type_codes) + 7) // 8
+        self._converters: List[Callable[[Any], Any]] = [_CONVERTERS[code] for code in self.type_codes]
+
+    def encode(self, rows: Sequence[Sequence[Tuple[str, Any]]]) -> bytes:
+        """rows 为执行器返回的结果行 [[(列名, 值), ...], ...]"""
+        parts = [_U32.pack(len(rows))]
+        append = parts.append
+        converters = self._converters
+        codes = self.type_codes
+        for row in rows:
+            bitmap = bytearray(self.bitmap_size)
+            values = []
+            for i, (_, raw) in enumerate(row):
+                value = converters[i](raw)
+                if value is None:
+                    bitmap[i >> 3] |= 1 << (i & 7)
+                    continue
+                code = codes[i]
+                if code == TYPE_INT:
+                    values.append(_I64.pack(value))
+                elif code == TYPE_FLOAT:
+                    values.append(_F64.pack(value))
+                else:
+                    data = value.encode('utf-8')
+                    values.append(_U32.pack(len(data)) + data)
+            append(bytes(bitmap))
+            parts.extend(values)
+        return encode_frame(MSG_ROWS, b''.join(parts))
+
+
+def decode_rows(payload: bytes, type_codes: Sequence[int]) -> List[tuple]:
+    """解码数据行，返回元组列表（空值为None）"""
+    (count,) = _U32.unpack_from(payload, 0)
+    offset = _U32.size
+    ncols = len(type_codes)
+    bitmap_size = (ncols + 7) // 8
+    rows = []
+    for _ in range(count):
+        bitmap = payload[offset:offset + bitmap_size]
+        offset += bitmap_size
+        row = []
+        for i, code in enumerate(type_codes):
+            if bitmap[i >> 3] & (1 << (i & 7)):
+                row.append(None)
+            elif code == TYPE_INT:
+                row.append(_I64.unpack_from(payload, offset)[0])
+                offset += 8
+            elif code == TYPE_FLOAT:
+                row.append(_F64.unpack_from(payload, offset)[0])
+                offset += 8
+            else:
+                value, offset = _decode_str(payload, offset, _U32)
+                row.append(value)
+        rows.append(tuple(row))
+    return rows
+
+
+# ---------------------------------------------------------------------------
+# 预编译语句的参数
+# ---------------------------------------------------------------------------
+
+def encode_execute(statement_id: str, params: Sequence[Any]) -> bytes:
+    """参数值带类型标记：int -> INT，float -> FLOAT，str -> CHAR"""
+    parts = [_encode_str(statement_id), _U16.pack(len(params))]
+    for value in params:
+        if isinstance(value, bool) or value is None:
+            raise ValueError(f"不支持的参数值: {value!r}")
+        if isinstance(value, int):
+            parts.append(bytes((TYPE_INT,)) + _I64.pack(value))
+        elif isinstance(value, float):
+            parts.append(bytes((TYPE_FLOAT,)) + _F64.pack(value))
+        elif isinstance(value, str):
+            parts.append(bytes((TYPE_CHAR,)) + _encode_str(value, _U32))
+        else:
+            raise ValueError(f"不支持的参数类型: {type(value).__name__}")
+    return encode_frame(MSG_EXECUTE, b''.join(parts))
+
+
+def decode_execute(payload: bytes) -> Tuple[str, List[Any]]:
+    statement_id, offset = _decode_str(payload, 0)
+    (count,) = _U16.unpack_from(payload, offset)
+    offset += _U16.size
+    params = []
+    for _ in range(count):
+        code = payload[offset]
+        offset += 1
+        if code == TYPE_INT:
+            params.append(_I64.unpack_from(payload, offset)[0])
+            offset += 8
+        elif code == TYPE_FLOAT:
+            params.append(_F64.unpack_from(payload, offset)[0])
+            offset += 8
+        elif code == TYPE_CHAR:
+            value, offset = _decode_str(payload, offset, _U32)
+            params.append(value)
+        else:
+            raise ProtocolError(f"未知的参数类型: {code}")
+    return statement_id, params
@@ -0,0 +1,157 @@
+import os
+import sys
+import socket
+import struct
+import asyncio
+import argparse
+from typing import Iterator, Optional
+
+from async_server import WorkerPool, ServerBusy, MAX_WORKERS, MAX_QUEUE
+from server import stream_statements, stream_prepared, prepare_statement, session_manager
+from wire_protocol import (FRAME_HEADER, MAX_FRAME_SIZE, MSG_QUERY, MSG_PREPARE, MSG_EXECUTE,
+                           MSG_TERMINATE, MSG_COMPLETE, MSG_ERROR, TYPE_CODES, TYPE_TEXT,
+                           ProtocolError, RowEncoder, encode_frame, encode_columns, encode_json,
+                           encode_text, encode_ready, encode_prepared, decode_text, decode_execute)
+
+# 默认监听端口
+WIRE_PORT = int(os.environ.get('SQL_WIRE_PORT', 5433))
+
+pool = WorkerPool()
+
+
+def encode_events(events: Iterator[dict]) -> Iterator[bytes]:
+    """
+    将 stream_statements 的事件转换为协议帧
+    SELECT 先发送一次列头，之后每批结果行只包含按列类型编码的值
+    """
+    encoder = None
+    row_count = None
+    for event in events:
+        kind = event['type']
+        if kind in ('statement', 'done') and row_count is not None:
+            # 上一条SELECT结束
+            yield encode_frame(MSG_COMPLETE, encode_json(row_count))
+            encoder, row_count = None, None
+        if kind == 'columns':
+            columns = event['columns']
+            encoder = RowEncoder([TYPE_CODES.get(type_name, TYPE_TEXT) for _, type_name in columns])
+            row_count = 0
+            yield encode_columns(columns)
+        elif kind == 'rows':
+            row_count += len(event['rows'])
+            yield encoder.encode(event['rows'])
+        elif kind == 'result':
+            yield encode_frame(MSG_COMPLETE, encode_json(event['result']))
+        elif kind == 'error':
+            encoder, row_count = None, None
+            yield encode_frame(MSG_ERROR, encode_text(str(event['result'])))
+        elif kind == 'done':
+            yield encode_ready(event['success'])
+
+
+def query_frames(sql: str, session_id: str) -> Iterator[bytes]:
+    return encode_events(stream_statements(sql, session_id=session_id, describe=True))
+
+
+def execute_frames(payload: bytes, session_id: str) -> Iterator[bytes]:
+    statement_id, params = decode_execute(payload)
+    return encode_events(stream_prepared(statement_id, params, session_id, describe=True))
+
+
+def prepare_frames(sql: str, session_id: str) -> Iterator[bytes]:
+    result = prepare_statement(sql, session_id)
+    if result['success']:
+        yield encode_prepared(result['statement_id'], result['param_count'])
+    else:
+        yield encode_frame(MSG_ERROR, encode_text(result['result']))
+    yield encode_ready(result['success'])
+
+
+def _error_frames(message: str) -> bytes:
+    return encode_frame(MSG_ERROR, encode_text(message)) + encode_ready(False)
+
+
+async def _handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """
+    处理一个连接：每个连接对应一个会话（事务可以跨越多个请求），
+    请求按收到的顺序依次执行并返回，客户端可以流水线发送
+    """
+    loop = asyncio.get_running_loop()
+    sock = writer.get_extra_info('socket')
+    if sock is not None and sock.family in (socket.AF_INET, socket.AF_INET6):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    session_id = None
+    try:
+        session_id = (await loop.run_in_executor(None, session_manager.open)).session_id
+        while True:
+            header = await reader.readexactly(FRAME_HEADER.size)
+            length, msg_type = FRAME_HEADER.unpack(header)
+            if length > MAX_FRAME_SIZE:
+                writer.write(_error_frames(f"请求过大（{length} 字节）"))
+                await writer.drain()
+                return
+            payload = await reader.readexactly(length) if length else b''
+
+            if msg_type == MSG_TERMINATE:
+                return
+            try:
+                if msg_type == MSG_QUERY:
+                    frames = query_frames(decode_text(payload), session_id)
+                elif msg_type == MSG_EXECUTE:
+                    frames = execute_frames(payload, session_id)
+                elif msg_type == MSG_PREPARE:
+                    frames = prepare_frames(decode_text(payload), session_id)
+                else:
+                    raise ProtocolError(f"未知的消息类型: {msg_type}")
+            except (ProtocolError, ValueError, struct.error) as e:
+                writer.write(_error_frames(f"请求格式错误: {str(e)}"))
+                await writer.drain()
+                continue
+
+            try:
+                async for chunk in pool.stream(iter, frames):
+                    writer.write(chunk)
+                    # 客户端读取慢时形成背压
+                    await writer.drain()
+            except ServerBusy as e:
+                frames.close()
+                writer.write(_error_frames(f"服务器繁忙: {str(e)}"))
+                await writer.drain()
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+        if session_id is not None:
+            # 连接断开时回滚未提交的事务
+            await loop.run_in_executor(None, session_manager.close, session_id)
+
+
+async def serve(host: str = '127.0.0.1', port: int = WIRE_PORT, unix_path: Optional[str] = None):
+    """启动二进制协议服务器，指定 unix_path 时监听Unix域套接字"""
+    if unix_path:
+        server = await asyncio.start_unix_server(_handle_connection, unix_path, backlog=1024)
+        address = unix_path
+    else:
+        server = await asyncio.start_server(_handle_connection, host, port, backlog=1024)
+        address = f"{host}:{port}"
+    print(f"二进制协议服务器已启动: {address} "
+          f"(工作线程 {pool.max_workers}, 排队上限 {pool.max_queue})")
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    arg_parser = argparse.ArgumentParser(description='SQL执行器二进制协议服务器')
+    arg_parser.add_argument('--host', default='127.0.0.1')
+    arg_parser.add_argument('--port', type=int, default=WIRE_PORT)
+    arg_parser.add_argument('--unix', help='Unix域套接字路径')
+    arg_parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='工作线程数')
+    arg_parser.add_argument('--queue', type=int, default=MAX_QUEUE, help='排队请求数上限')
+    args = arg_parser.parse_args()
+
+    pool = WorkerPool(args.workers, args.queue)
+    try:
+        asyncio.run(serve(args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        sys.exit(0)